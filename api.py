@@ -1,177 +1,532 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, make_response, request, stream_with_context
 from flask_cors import CORS
 import sqlite3
 from pathlib import Path
 import tempfile
 import os
+import re
+import json
+import queue
+import threading
+import atexit
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import struct
+from collections import OrderedDict
+from contextvars import ContextVar
+
+import numpy as np
+
+import mixgraph
+from mixgraph.db import datetime_now
+
+# Optional: MessagePack graph payloads
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 app = Flask(__name__)
 CORS(app)
 
 DB_PATH = Path("mixgraph.db")
+BACKUP_DIR = Path("backups")
+
+
+# ============================================================================
+# LIBRARIES
+# ============================================================================
+
+# One process serves many DJ libraries, each its own SQLite file. The default
+# library is DB_PATH; named ones live in LIBRARIES_DIR. A library is picked by
+# an /api/libraries/<name>/... prefix or the X-Mixgraph-Library header.
+LIBRARIES_DIR = Path("libraries")
+DEFAULT_LIBRARY = "default"
+LIBRARY_HEADER = "X-Mixgraph-Library"
+LIBRARY_NAME_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+LIBRARY_MAX_OPEN = 32                    # libraries kept open at once
+LIBRARY_MAX_IDLE_CONNECTIONS = 4         # pooled connections per library
+LIBRARY_CACHE_KB = 2048                  # SQLite page cache per connection
+LIBRARY_MEMORY_BUDGET_KB = 128 * 1024    # page cache across all pooled connections
+
+libraries_lock = threading.Lock()
+open_libraries = OrderedDict()   # name -> Library, least recently used first
+initialized_libraries = set()    # names whose schema is set up this process
+current_library = ContextVar("current_library", default=None)
+
+
+class LibraryNotFound(Exception):
+    pass
+
+
+# Connection that goes back to its library's pool on close()
+class PooledConnection(sqlite3.Connection):
+    library = None
+    
+    def close(self):
+        if self.library is None or not self.library.release(self):
+            super().close()
+
+
+# An open library: its pooled connections and in-memory state
+class Library:
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        self.lock = threading.Lock()
+        self.idle = []
+        self.closed = False
+        
+        # DJ session state
+        self.session_lock = threading.Lock()
+        self.session_buffer = []        # pending (session_id, position, track_id, played_at)
+        self.session_flush_lock = threading.Lock()
+        self.session_positions = {}     # session_id -> last position handed out
+        self.session_subscribers = {}   # session_id -> list of queue.Queue for SSE clients
+        self.session_state = {}         # session_id -> latest now-playing payload
+        
+        # Transition play-log state
+        self.event_lock = threading.Lock()
+        self.event_buffer = []          # pending (from_track_id, to_track_id, outcome, booth, rating, occurred_at)
+        self.event_pending = {}         # (from_track_id, to_track_id) -> unflushed stats deltas
+        self.event_flush_lock = threading.Lock()
+        
+        # Background job state
+        self.job_lock = threading.Lock()
+        self.job_progress = {}          # job_id -> (done, total)
+        self.job_started = {}           # job_id -> monotonic start time
+        self.job_cancel_events = {}     # job_id -> threading.Event
+        self.job_submit_lock = threading.Lock()
+        self.reindex_lock = threading.Lock()
+    
+    @property
+    def backup_dir(self):
+        return BACKUP_DIR if self.name == DEFAULT_LIBRARY else BACKUP_DIR / self.name
+    
+    def connect(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        # Pooled connections move between request threads, one at a time
+        conn = sqlite3.connect(self.path, factory=PooledConnection, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA cache_size = -{LIBRARY_CACHE_KB}")
+        conn.library = self
+        return conn
+    
+    # Keep a closed connection for reuse if the pool and memory budget allow
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        # Pooled connections go back in their default state
+        conn.execute("PRAGMA foreign_keys = OFF")
+        
+        if pooled_connection_count() * LIBRARY_CACHE_KB >= LIBRARY_MEMORY_BUDGET_KB:
+            return False
+        with self.lock:
+            if self.closed or len(self.idle) >= LIBRARY_MAX_IDLE_CONNECTIONS:
+                return False
+            self.idle.append(conn)
+            return True
+    
+    # Libraries with live jobs, listeners or unflushed plays stay open
+    def busy(self):
+        return bool(
+            self.job_cancel_events or self.session_subscribers
+            or self.session_buffer or self.event_buffer
+        )
+    
+    def close(self):
+        flush_session_plays(self)
+        flush_transition_events(self)
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            sqlite3.Connection.close(conn)
+
+
+def pooled_connection_count():
+    return sum(len(library.idle) for library in list(open_libraries.values()))
+
+def library_path(name):
+    if name == DEFAULT_LIBRARY:
+        return DB_PATH
+    return LIBRARIES_DIR / f"{name}.db"
+
+# Every library on disk
+def list_library_names():
+    names = [DEFAULT_LIBRARY]
+    if LIBRARIES_DIR.exists():
+        names += sorted(path.stem for path in LIBRARIES_DIR.glob("*.db"))
+    return names
+
+# Open (or reuse) a library, initializing its schema on first use
+def open_library(name, create=False):
+    if not LIBRARY_NAME_RE.match(name):
+        raise LibraryNotFound(name)
+    
+    with libraries_lock:
+        library = open_libraries.get(name)
+        if library is not None:
+            open_libraries.move_to_end(name)
+            return library
+        
+        path = library_path(name)
+        if name != DEFAULT_LIBRARY and not path.exists():
+            if not create:
+                raise LibraryNotFound(name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Started with the first library, so every deployment (and only the
+        # process that serves requests, not the reloader) takes snapshots
+        start_backup_scheduler()
+        
+        library = Library(name, path)
+        if name not in initialized_libraries:
+            token = current_library.set(library)
+            try:
+                init_db()
+            finally:
+                current_library.reset(token)
+            initialized_libraries.add(name)
+        
+        open_libraries[name] = library
+        evict_libraries(keep=name)
+        return library
+
+# Close least recently used libraries beyond the handle/memory budget
+def evict_libraries(keep=None):
+    """Caller holds libraries_lock."""
+    def over_budget():
+        return (
+            len(open_libraries) > LIBRARY_MAX_OPEN
+            or pooled_connection_count() * LIBRARY_CACHE_KB > LIBRARY_MEMORY_BUDGET_KB
+        )
+    
+    for name in list(open_libraries):
+        if not over_budget():
+            break
+        library = open_libraries[name]
+        if name == keep or library.busy():
+            continue
+        del open_libraries[name]
+        library.close()
+
+# Library for the current request or job (the default library otherwise)
+def get_library():
+    return current_library.get() or open_library(DEFAULT_LIBRARY)
 
 # Set up database connection
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return get_library().connect()
+
+
+# Route /api/libraries/<name>/... to the normal /api/... handlers
+class LibraryPrefixMiddleware:
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+    
+    def __call__(self, environ, start_response):
+        match = re.match(r"^/api/libraries/([^/]+)(/.+)$", environ.get("PATH_INFO", ""))
+        if match:
+            environ["mixgraph.library"] = match.group(1)
+            environ["PATH_INFO"] = "/api" + match.group(2)
+        return self.wsgi_app(environ, start_response)
+
+
+app.wsgi_app = LibraryPrefixMiddleware(app.wsgi_app)
+
+@app.before_request
+def select_library():
+    name = request.environ.get("mixgraph.library") or request.headers.get(LIBRARY_HEADER)
+    if name is None or request.path == "/api/libraries":
+        return None
+    try:
+        library = open_library(name)
+    except LibraryNotFound:
+        return jsonify({"error": f"Library '{name}' not found"}), 404
+    g.library_token = current_library.set(library)
+
+@app.teardown_request
+def reset_library(exc):
+    token = g.pop("library_token", None)
+    if token is not None:
+        current_library.reset(token)
+
+# Absolute API URL that keeps the request's library prefix, if any
+def api_url(path):
+    name = request.environ.get("mixgraph.library")
+    return f"/api/libraries/{name}{path}" if name else f"/api{path}"
+
+# All libraries and whether each is currently open
+@app.route("/api/libraries", methods=["GET"])
+def get_libraries():
+    return jsonify([
+        {"name": name, "open": name in open_libraries}
+        for name in list_library_names()
+    ])
+
+# Create a new, empty library
+@app.route("/api/libraries", methods=["POST"])
+def create_library():
+    name = (request.json or {}).get("name", "")
+    if not LIBRARY_NAME_RE.match(name):
+        return jsonify({"error": "Library names may only use letters, digits, '-' and '_'"}), 400
+    if name == DEFAULT_LIBRARY or library_path(name).exists():
+        return jsonify({"error": "Library already exists"}), 400
+    open_library(name, create=True)
+    return jsonify({"name": name}), 201
 
 # Initialize database tables
 def init_db():
-    """Initialize database tables including folders and playlists."""
+    """Set up the library schema plus the server's own job table."""
     conn = get_db()
+    mixgraph.schema.init_db(conn)
     
-    # Folders for organizing track library
-    # Folders can contain multiple tracks, and tracks can be in multiple folders.
+    # Background jobs (imports, reindexing, model training)
     conn.execute("""
-        CREATE TABLE IF NOT EXISTS folders (
+        CREATE TABLE IF NOT EXISTS jobs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            parent_id INTEGER,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            done INTEGER NOT NULL DEFAULT 0,
+            total INTEGER,
+            result TEXT,
+            error TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (parent_id) REFERENCES folders(id) ON DELETE CASCADE
-        )
-    """)
-    
-    # Track-folder relationship (many-to-many) - for library organization
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS folder_tracks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            folder_id INTEGER NOT NULL,
-            track_id INTEGER NOT NULL,
-            position INTEGER DEFAULT 0,
-            FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE CASCADE,
-            FOREIGN KEY (track_id) REFERENCES tracks(id) ON DELETE CASCADE,
-            UNIQUE(folder_id, track_id)
-        )
-    """)
-    
-    # Playlists for DJ sets (separate from folders)
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS playlists (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
         )
     """)
     
-    # Playlist-track relationship (many-to-many) - for DJ set building
+    # Jobs can't survive a restart
     conn.execute("""
-        CREATE TABLE IF NOT EXISTS playlist_tracks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            playlist_id INTEGER NOT NULL,
-            track_id INTEGER NOT NULL,
-            position INTEGER DEFAULT 0,
-            FOREIGN KEY (playlist_id) REFERENCES playlists(id) ON DELETE CASCADE,
-            FOREIGN KEY (track_id) REFERENCES tracks(id) ON DELETE CASCADE
-        )
+        UPDATE jobs SET status = 'failed', error = 'Interrupted by server restart', finished_at = CURRENT_TIMESTAMP
+        WHERE status IN ('queued', 'running')
     """)
     
     conn.commit()
     conn.close()
 
 
-# Initialize on startup
-init_db()
+# Whether a request asked for subtree-aware results
+def is_recursive_request():
+    return request.args.get("recursive", "").lower() in ("1", "true", "yes")
+
+
+# ============================================================================
+# GRAPH PAYLOADS
+# ============================================================================
+
+GRAPH_BINARY_MAGIC = b"MXG1"
+GRAPH_BINARY_MIMETYPE = "application/vnd.mixgraph.graph"
+GRAPH_MSGPACK_MIMETYPE = "application/x-msgpack"
+
+# Column name -> dtype; strings and dictionary-encoded columns are handled apart
+GRAPH_NODE_COLUMNS = {
+    "id": "<i4",
+    "bpm": "<f4",
+    "out_degree": "<i4",
+    "in_degree": "<i4",
+    "avg_rating": "<f4",
+}
+GRAPH_EDGE_COLUMNS = {
+    "id": "<i4",
+    "from_track_id": "<i4",
+    "to_track_id": "<i4",
+    "rating": "u1",
+}
+GRAPH_DICT_COLUMNS = {"nodes": ["key"], "edges": ["transition_type"]}
+GRAPH_STRING_COLUMNS = ["title", "artist"]
+
+# Requested graph format from ?format= or the Accept header
+def requested_graph_format():
+    fmt = request.args.get("format")
+    if fmt:
+        return fmt.lower()
+    accept = request.accept_mimetypes
+    if accept.quality(GRAPH_BINARY_MIMETYPE) > accept.quality("application/json"):
+        return "binary"
+    if accept.quality(GRAPH_MSGPACK_MIMETYPE) > accept.quality("application/json"):
+        return "msgpack"
+    return "json"
+
+# Encode node/edge rows as typed columns
+def encode_graph_columns(tracks, transitions):
+    """Return (columns, dicts, strings) for the columnar graph formats.
+    
+    Nulls become NaN for floats and 0 for ratings and dictionary codes; code
+    n refers to dicts[name][n - 1].
+    """
+    columns, dicts, strings = {"nodes": {}, "edges": {}}, {}, {}
+    
+    for part, rows, numeric in (
+        ("nodes", tracks, GRAPH_NODE_COLUMNS),
+        ("edges", transitions, GRAPH_EDGE_COLUMNS),
+    ):
+        names = rows[0].keys() if rows else []
+        values = dict(zip(names, zip(*rows))) if rows else {}
+        
+        for name, dtype in numeric.items():
+            raw = values.get(name, ())
+            if dtype.endswith("f4"):
+                data = [np.nan if v is None else v for v in raw]
+            else:
+                data = [0 if v is None else v for v in raw]
+            columns[part][name] = np.array(data, dtype=dtype)
+        
+        for name in GRAPH_DICT_COLUMNS[part]:
+            raw = values.get(name, ())
+            lookup = {}
+            codes = [0 if v is None else lookup.setdefault(v, len(lookup) + 1) for v in raw]
+            columns[part][name] = np.array(codes, dtype="u1" if len(lookup) < 256 else "<u2")
+            dicts[name] = list(lookup)
+        
+        if part == "nodes":
+            for name in GRAPH_STRING_COLUMNS:
+                strings[name] = list(values.get(name, ()))
+    
+    return columns, dicts, strings
+
+# Pack columns into a single buffer: magic, header length, JSON header, 4-byte aligned arrays
+def pack_graph_binary(columns, dicts, strings):
+    layout, buffers, offset = [], [], 0
+    for part, part_columns in columns.items():
+        for name, array in part_columns.items():
+            data = array.tobytes()
+            layout.append({
+                "part": part, "name": name, "dtype": array.dtype.str,
+                "offset": offset, "length": len(array)
+            })
+            padded = data + b"\0" * (-len(data) % 4)
+            buffers.append(padded)
+            offset += len(padded)
+    
+    header = json.dumps({
+        "node_count": len(columns["nodes"]["id"]),
+        "edge_count": len(columns["edges"]["id"]),
+        "columns": layout,
+        "dicts": dicts,
+        "strings": strings
+    }, separators=(",", ":")).encode("utf-8")
+    header += b" " * (-len(header) % 4)
+    
+    return b"".join([GRAPH_BINARY_MAGIC, struct.pack("<I", len(header)), header] + buffers)
+
+# Serialize graph rows in the requested format
+def graph_response(tracks, transitions):
+    """Return nodes/edges as JSON (default) or a compact columnar payload.
+    
+    Pick with ?format=json|columnar|binary|msgpack or the Accept header.
+    """
+    fmt = requested_graph_format()
+    if fmt == "json":
+        return jsonify({
+            "nodes": [dict(row) for row in tracks],
+            "edges": [dict(row) for row in transitions]
+        })
+    
+    columns, dicts, strings = encode_graph_columns(tracks, transitions)
+    
+    if fmt == "columnar":
+        # Same columns as plain JSON arrays; NaN isn't valid JSON
+        return jsonify({
+            "nodes": {name: [None if v != v else round(v, 2) for v in array.tolist()] for name, array in columns["nodes"].items()}
+                | strings,
+            "edges": {name: array.tolist() for name, array in columns["edges"].items()},
+            "dicts": dicts
+        })
+    
+    if fmt == "binary":
+        return Response(pack_graph_binary(columns, dicts, strings), mimetype=GRAPH_BINARY_MIMETYPE)
+    
+    if fmt == "msgpack":
+        if msgpack is None:
+            return jsonify({"error": "MessagePack support requires the msgpack package"}), 406
+        payload = {
+            part: {name: {"dtype": array.dtype.str, "data": array.tobytes()} for name, array in part_columns.items()}
+            for part, part_columns in columns.items()
+        }
+        payload["nodes"].update(strings)
+        payload["dicts"] = dicts
+        return Response(msgpack.packb(payload, use_bin_type=True), mimetype=GRAPH_MSGPACK_MIMETYPE)
+    
+    return jsonify({"error": f"Unknown graph format '{fmt}'"}), 400
 
 
 # ============================================================================
 # FOLDERS/PLAYLISTS
 # ============================================================================
 
-# Return all folders with track counts
+# Return all folders with track counts and total duration
 @app.route("/api/folders", methods=["GET"])
 def get_folders():
     conn = get_db()
-    rows = conn.execute("""
-        SELECT f.*, 
-            (SELECT COUNT(*) FROM folder_tracks WHERE folder_id = f.id) as track_count
-        FROM folders f
-        ORDER BY f.name
-    """).fetchall()
+    folders = mixgraph.folders.list_folders(conn)
     conn.close()
-    return jsonify([dict(row) for row in rows])
+    return jsonify(folders)
 
 # Create a new folder
 @app.route("/api/folders", methods=["POST"])
 def create_folder():
     data = request.json
     conn = get_db()
-    cursor = conn.execute(
-        "INSERT INTO folders (name, parent_id) VALUES (?, ?)",
-        (data["name"], data.get("parent_id"))
-    )
-    folder_id = cursor.lastrowid
+    try:
+        folder_id = mixgraph.folders.create_folder(conn, data["name"], data.get("parent_id"))
+    except ValueError as e:
+        conn.close()
+        return jsonify({"error": str(e)}), 400
     conn.commit()
     conn.close()
-    return jsonify({"id": folder_id, "name": data["name"]})
+    return jsonify({"id": folder_id, "name": data["name"], "track_count": 0, "total_duration": 0})
 
-# Rename folder
+# Rename and/or move folder
 @app.route("/api/folders/<int:folder_id>", methods=["PUT"])
 def update_folder(folder_id):
     data = request.json
     conn = get_db()
-    conn.execute(
-        "UPDATE folders SET name = ? WHERE id = ?",
-        (data["name"], folder_id)
-    )
+    
+    if "parent_id" in data:
+        try:
+            mixgraph.folders.move_folder(conn, folder_id, data["parent_id"])
+        except ValueError as e:
+            conn.close()
+            return jsonify({"error": str(e)}), 400
+    
+    if "name" in data:
+        mixgraph.folders.rename_folder(conn, folder_id, data["name"])
     conn.commit()
     conn.close()
     return jsonify({"success": True})
 
-# Delete folder and its associations
+# Delete folder, its subfolders and their associations
 @app.route("/api/folders/<int:folder_id>", methods=["DELETE"])
 def delete_folder(folder_id):
     conn = get_db()
-    conn.execute("DELETE FROM folder_tracks WHERE folder_id = ?", (folder_id,))
-    conn.execute("DELETE FROM folders WHERE id = ?", (folder_id,))
+    mixgraph.folders.delete_folder(conn, folder_id)
     conn.commit()
     conn.close()
     return jsonify({"success": True})
 
-# Track list for a specific folder
+# Track list for a specific folder (add ?recursive=true to include subfolders)
 @app.route("/api/folders/<int:folder_id>/tracks", methods=["GET"])
 def get_folder_tracks(folder_id):
     conn = get_db()
-    rows = conn.execute("""
-        SELECT t.id, t.title, t.artist, t.bpm, t.key, t.duration_seconds, t.genre, ft.position
-        FROM tracks t
-        JOIN folder_tracks ft ON t.id = ft.track_id
-        WHERE ft.folder_id = ?
-        ORDER BY ft.position, t.title
-    """, (folder_id,)).fetchall()
+    tracks = mixgraph.folders.folder_tracks(conn, folder_id, is_recursive_request())
     conn.close()
-    return jsonify([dict(row) for row in rows])
+    return jsonify(tracks)
 
 # Transitions for a specific folder
 @app.route("/api/folders/<int:folder_id>/transitions", methods=["GET"])
 def get_folder_transitions(folder_id):
-    """Get all transitions where both tracks are in the folder."""
-    conn = get_db()
-    rows = conn.execute("""
-        SELECT 
-            t.id,
-            t.from_track_id,
-            t1.title as from_title,
-            t1.artist as from_artist,
-            t1.bpm as from_bpm,
-            t1.key as from_key,
-            t.to_track_id,
-            t2.title as to_title,
-            t2.artist as to_artist,
-            t2.bpm as to_bpm,
-            t2.key as to_key,
-            t.rating,
-            t.transition_type
-        FROM transitions t
-        JOIN tracks t1 ON t.from_track_id = t1.id
-        JOIN tracks t2 ON t.to_track_id = t2.id
-        WHERE t.from_track_id IN (SELECT track_id FROM folder_tracks WHERE folder_id = ?)
-          AND t.to_track_id IN (SELECT track_id FROM folder_tracks WHERE folder_id = ?)
-        ORDER BY t1.title, t.rating DESC
-    """, (folder_id, folder_id)).fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in rows])
+    """Get all transitions where both tracks are in the folder (or its subtree)."""
+    conn = get_db()
+    transitions = mixgraph.transitions.folder_transitions(conn, folder_id, is_recursive_request())
+    conn.close()
+    return jsonify(transitions)
 
 # Show graph data (nodes and edges)
 # Used for visualizing the track-transition graph
@@ -179,139 +534,48 @@ def get_folder_transitions(folder_id):
 def get_graph_data():
     """Get all tracks and transitions for graph visualization."""
     conn = get_db()
-    
-    # Get all tracks as nodes
-    tracks = conn.execute("""
-        SELECT id, title, artist, bpm, key
-        FROM tracks
-        GROUP BY title, artist
-        ORDER BY id
-    """).fetchall()
-    
-    # Get all transitions as edges
-    transitions = conn.execute("""
-        SELECT 
-            t.id,
-            t.from_track_id,
-            t.to_track_id,
-            t.rating,
-            t.transition_type
-        FROM transitions t
-        ORDER BY t.id
-    """).fetchall()
-    
+    tracks, transitions = mixgraph.graph.library_graph(conn)
     conn.close()
-    
-    return jsonify({
-        "nodes": [dict(row) for row in tracks],
-        "edges": [dict(row) for row in transitions]
-    })
+    return graph_response(tracks, transitions)
 
 # Folder graph data (nodes and edges)
 @app.route("/api/folders/<int:folder_id>/graph", methods=["GET"])
 def get_folder_graph_data(folder_id):
-    """Get tracks and transitions for a specific folder for graph visualization."""
-    conn = get_db()
-    
-    # Get folder tracks as nodes
-    tracks = conn.execute("""
-        SELECT t.id, t.title, t.artist, t.bpm, t.key
-        FROM tracks t
-        JOIN folder_tracks ft ON t.id = ft.track_id
-        WHERE ft.folder_id = ?
-        ORDER BY ft.position, t.title
-    """, (folder_id,)).fetchall()
-    
-    # Get transitions where both tracks are in folder
-    transitions = conn.execute("""
-        SELECT 
-            t.id,
-            t.from_track_id,
-            t.to_track_id,
-            t.rating,
-            t.transition_type
-        FROM transitions t
-        WHERE t.from_track_id IN (SELECT track_id FROM folder_tracks WHERE folder_id = ?)
-          AND t.to_track_id IN (SELECT track_id FROM folder_tracks WHERE folder_id = ?)
-        ORDER BY t.id
-    """, (folder_id, folder_id)).fetchall()
-    
-    conn.close()
-    
-    return jsonify({
-        "nodes": [dict(row) for row in tracks],
-        "edges": [dict(row) for row in transitions]
-    })
+    """Get tracks and transitions for a specific folder for graph visualization.
+    
+    With ?recursive=true the whole subtree under the folder is included.
+    """
+    conn = get_db()
+    tracks, transitions = mixgraph.graph.folder_graph(conn, folder_id, is_recursive_request())
+    conn.close()
+    return graph_response(tracks, transitions)
 
 # Playlist graph data (nodes and edges)
 @app.route("/api/playlists/<int:playlist_id>/graph", methods=["GET"])
 def get_playlist_graph_data(playlist_id):
     """Get tracks and transitions for a specific playlist for graph visualization."""
     conn = get_db()
-    
-    # Get playlist tracks as nodes
-    tracks = conn.execute("""
-        SELECT t.id, t.title, t.artist, t.bpm, t.key
-        FROM tracks t
-        JOIN playlist_tracks pt ON t.id = pt.track_id
-        WHERE pt.playlist_id = ?
-        ORDER BY pt.position, t.title
-    """, (playlist_id,)).fetchall()
-    
-    # Get transitions where both tracks are in playlist
-    transitions = conn.execute("""
-        SELECT 
-            t.id,
-            t.from_track_id,
-            t.to_track_id,
-            t.rating,
-            t.transition_type
-        FROM transitions t
-        WHERE t.from_track_id IN (SELECT track_id FROM playlist_tracks WHERE playlist_id = ?)
-          AND t.to_track_id IN (SELECT track_id FROM playlist_tracks WHERE playlist_id = ?)
-        ORDER BY t.id
-    """, (playlist_id, playlist_id)).fetchall()
-    
-    conn.close()
-    
-    return jsonify({
-        "nodes": [dict(row) for row in tracks],
-        "edges": [dict(row) for row in transitions]
-    })
+    tracks, transitions = mixgraph.graph.playlist_graph(conn, playlist_id)
+    conn.close()
+    return graph_response(tracks, transitions)
 
 # Add a track to a folder
 @app.route("/api/folders/<int:folder_id>/tracks", methods=["POST"])
 def add_track_to_folder(folder_id):
     data = request.json
-    track_id = data["track_id"]
     conn = get_db()
-    
-    # Get next position
-    pos = conn.execute(
-        "SELECT COALESCE(MAX(position), 0) + 1 FROM folder_tracks WHERE folder_id = ?",
-        (folder_id,)
-    ).fetchone()[0]
-    
-    try:
-        conn.execute(
-            "INSERT INTO folder_tracks (folder_id, track_id, position) VALUES (?, ?, ?)",
-            (folder_id, track_id, pos)
-        )
-        conn.commit()
-        conn.close()
-        return jsonify({"success": True})
-    except sqlite3.IntegrityError:
-        conn.close()
+    added = mixgraph.folders.add_tracks_to_folder(conn, folder_id, [data["track_id"]])
+    conn.commit()
+    conn.close()
+    if not added:
         return jsonify({"error": "Track already in folder"}), 400
+    return jsonify({"success": True})
 
 # Remove a track from a folder
 @app.route("/api/folders/<int:folder_id>/tracks/<int:track_id>", methods=["DELETE"])
 def remove_track_from_folder(folder_id, track_id):
     conn = get_db()
-    conn.execute(
-        "DELETE FROM folder_tracks WHERE folder_id = ? AND track_id = ?",
-        (folder_id, track_id)
-    )
+    mixgraph.folders.remove_tracks_from_folder(conn, folder_id, [track_id])
     conn.commit()
     conn.close()
     return jsonify({"success": True})
@@ -321,42 +585,30 @@ def remove_track_from_folder(folder_id, track_id):
 # PLAYLISTS (for DJ sets - separate from folders)
 # ============================================================================
 
-# Get all playlists with track counts
+# Get all playlists with track counts and total duration
 @app.route("/api/playlists", methods=["GET"])
 def get_playlists():
     conn = get_db()
-    rows = conn.execute("""
-        SELECT p.*, 
-            (SELECT COUNT(*) FROM playlist_tracks WHERE playlist_id = p.id) as track_count
-        FROM playlists p
-        ORDER BY p.name
-    """).fetchall()
+    playlists = mixgraph.playlists.list_playlists(conn)
     conn.close()
-    return jsonify([dict(row) for row in rows])
+    return jsonify(playlists)
 
 # Create a new playlist
 @app.route("/api/playlists", methods=["POST"])
 def create_playlist():
     data = request.json
     conn = get_db()
-    cursor = conn.execute(
-        "INSERT INTO playlists (name) VALUES (?)",
-        (data["name"],)
-    )
-    playlist_id = cursor.lastrowid
+    playlist_id = mixgraph.playlists.create_playlist(conn, data["name"])
     conn.commit()
     conn.close()
-    return jsonify({"id": playlist_id, "name": data["name"]})
+    return jsonify({"id": playlist_id, "name": data["name"], "track_count": 0, "total_duration": 0})
 
 # Rename playlist
 @app.route("/api/playlists/<int:playlist_id>", methods=["PUT"])
 def update_playlist(playlist_id):
     data = request.json
     conn = get_db()
-    conn.execute(
-        "UPDATE playlists SET name = ? WHERE id = ?",
-        (data["name"], playlist_id)
-    )
+    mixgraph.playlists.rename_playlist(conn, playlist_id, data["name"])
     conn.commit()
     conn.close()
     return jsonify({"success": True})
@@ -365,8 +617,7 @@ def update_playlist(playlist_id):
 @app.route("/api/playlists/<int:playlist_id>", methods=["DELETE"])
 def delete_playlist(playlist_id):
     conn = get_db()
-    conn.execute("DELETE FROM playlist_tracks WHERE playlist_id = ?", (playlist_id,))
-    conn.execute("DELETE FROM playlists WHERE id = ?", (playlist_id,))
+    mixgraph.playlists.delete_playlist(conn, playlist_id)
     conn.commit()
     conn.close()
     return jsonify({"success": True})
@@ -375,34 +626,17 @@ def delete_playlist(playlist_id):
 @app.route("/api/playlists/<int:playlist_id>/tracks", methods=["GET"])
 def get_playlist_tracks(playlist_id):
     conn = get_db()
-    rows = conn.execute("""
-        SELECT t.id, t.title, t.artist, t.bpm, t.key, t.duration_seconds, t.genre, pt.position
-        FROM tracks t
-        JOIN playlist_tracks pt ON t.id = pt.track_id
-        WHERE pt.playlist_id = ?
-        ORDER BY pt.position, pt.id
-    """, (playlist_id,)).fetchall()
+    tracks = mixgraph.playlists.playlist_tracks(conn, playlist_id)
     conn.close()
-    return jsonify([dict(row) for row in rows])
+    return jsonify(tracks)
 
 # Add a track to a playlist
 @app.route("/api/playlists/<int:playlist_id>/tracks", methods=["POST"])
 def add_track_to_playlist(playlist_id):
     data = request.json
-    track_id = data["track_id"]
     conn = get_db()
-    
-    # Get next position
-    pos = conn.execute(
-        "SELECT COALESCE(MAX(position), 0) + 1 FROM playlist_tracks WHERE playlist_id = ?",
-        (playlist_id,)
-    ).fetchone()[0]
-    
     # Allow duplicate tracks in playlist (unlike folders)
-    conn.execute(
-        "INSERT INTO playlist_tracks (playlist_id, track_id, position) VALUES (?, ?, ?)",
-        (playlist_id, track_id, pos)
-    )
+    mixgraph.playlists.add_tracks_to_playlist(conn, playlist_id, [data["track_id"]])
     conn.commit()
     conn.close()
     return jsonify({"success": True})
@@ -412,10 +646,7 @@ def add_track_to_playlist(playlist_id):
 def remove_track_from_playlist(playlist_id, position):
     """Remove track at specific position from playlist."""
     conn = get_db()
-    conn.execute(
-        "DELETE FROM playlist_tracks WHERE playlist_id = ? AND position = ?",
-        (playlist_id, position)
-    )
+    mixgraph.playlists.remove_playlist_position(conn, playlist_id, position)
     conn.commit()
     conn.close()
     return jsonify({"success": True})
@@ -425,33 +656,9 @@ def remove_track_from_playlist(playlist_id, position):
 def reorder_playlist_tracks(playlist_id):
     """Swap two tracks in playlist by their positions."""
     data = request.json
-    pos1 = data.get("position1")
-    pos2 = data.get("position2")
-    
     conn = get_db()
-    
-    # Get track IDs at both positions
-    track1 = conn.execute(
-        "SELECT id, track_id FROM playlist_tracks WHERE playlist_id = ? AND position = ?",
-        (playlist_id, pos1)
-    ).fetchone()
-    track2 = conn.execute(
-        "SELECT id, track_id FROM playlist_tracks WHERE playlist_id = ? AND position = ?",
-        (playlist_id, pos2)
-    ).fetchone()
-    
-    if track1 and track2:
-        # Swap positions
-        conn.execute(
-            "UPDATE playlist_tracks SET position = ? WHERE id = ?",
-            (pos2, track1["id"])
-        )
-        conn.execute(
-            "UPDATE playlist_tracks SET position = ? WHERE id = ?",
-            (pos1, track2["id"])
-        )
+    if mixgraph.playlists.swap_playlist_positions(conn, playlist_id, data.get("position1"), data.get("position2")):
         conn.commit()
-    
     conn.close()
     return jsonify({"success": True})
 
@@ -460,67 +667,6 @@ def reorder_playlist_tracks(playlist_id):
 # FILE UPLOAD / REKORDBOX IMPORT
 # ============================================================================
 
-# Parse Rekordbox .txt content
-def parse_rekordbox_txt_content(content: str) -> list[dict]:
-    """Parse Rekordbox .txt content (tab-delimited format)."""
-    lines = content.split("\n")
-    
-    if not lines:
-        return []
-    
-    # First line is headers
-    headers = [h.strip() for h in lines[0].split("\t")]
-    
-    tracks = []
-    for line in lines[1:]:
-        if not line.strip():
-            continue
-        
-        fields = line.split("\t")
-        row = {}
-        
-        for i, header in enumerate(headers):
-            value = fields[i].strip() if i < len(fields) else ""
-            row[header] = value
-        
-        # Map common Rekordbox column names to our schema
-        # Swedish and English
-        # TODO handle more fields as needed
-        track = {
-            "title": row.get("Spårtitel") or row.get("Track Title") or row.get("Title") or row.get("Name") or "",
-            "artist": row.get("Artist") or "",
-            "bpm": None,
-            "key": row.get("Tonalitet") or row.get("Key") or None,
-            "duration_seconds": None,
-            "genre": row.get("Genre") or None,
-            "location": row.get("Location") or None
-        }
-        
-        # Parse BPM
-        bpm_str = row.get("BPM") or row.get("Tempo") or ""
-        if bpm_str:
-            try:
-                track["bpm"] = float(bpm_str.replace(",", "."))
-            except ValueError:
-                pass
-        
-        # Parse duration (format: MM:SS or HH:MM:SS)
-        time_str = row.get("Tid") or row.get("Time") or row.get("Duration") or ""
-        if time_str:
-            try:
-                parts = time_str.split(":")
-                if len(parts) == 2:
-                    track["duration_seconds"] = int(parts[0]) * 60 + int(parts[1])
-                elif len(parts) == 3:
-                    track["duration_seconds"] = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
-            except (ValueError, IndexError):
-                pass
-        
-        if track["title"]:  # Only add if we have at least a title
-            tracks.append(track)
-    
-    return tracks
-
 # Import Rekordbox .txt file into a folder
 @app.route("/api/folders/<int:folder_id>/import", methods=["POST"])
 def import_rekordbox_to_folder(folder_id):
@@ -532,72 +678,34 @@ def import_rekordbox_to_folder(folder_id):
     if not file.filename.endswith(".txt"):
         return jsonify({"error": "File must be a .txt file"}), 400
     
-    # Read file content with proper encoding
-    content = None
-    raw_bytes = file.read()
-    
-    for encoding in ["utf-16-le", "utf-16", "utf-8", "cp1252"]:
-        try:
-            content = raw_bytes.decode(encoding)
-            # Remove BOM if present
-            if content.startswith('\ufeff'):
-                content = content[1:]
-            break
-        except (UnicodeDecodeError, UnicodeError):
-            continue
-    
+    content = mixgraph.rekordbox.decode_txt(file.read())
     if content is None:
         return jsonify({"error": "Could not decode file"}), 400
     
-    tracks = parse_rekordbox_txt_content(content)
+    tracks = mixgraph.rekordbox.parse_txt(content)
     
     if not tracks:
         return jsonify({"error": "No tracks found in file"}), 400
     
-    conn = get_db()
-    imported_count = 0
-    
-    for track in tracks:
-        # Check if track already exists
-        existing = conn.execute(
-            "SELECT id FROM tracks WHERE title = ? AND artist = ?",
-            (track["title"], track["artist"])
-        ).fetchone()
-        
-        if existing:
-            track_id = existing["id"]
-        else:
-            # Insert new track
-            cursor = conn.execute("""
-                INSERT INTO tracks (title, artist, bpm, key, duration_seconds, genre, location)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (track["title"], track["artist"], track["bpm"], track["key"], 
-                  track["duration_seconds"], track["genre"], track["location"]))
-            track_id = cursor.lastrowid
-        
-        # Add to folder
-        pos = conn.execute(
-            "SELECT COALESCE(MAX(position), 0) + 1 FROM folder_tracks WHERE folder_id = ?",
-            (folder_id,)
-        ).fetchone()[0]
-        
-        try:
-            conn.execute(
-                "INSERT INTO folder_tracks (folder_id, track_id, position) VALUES (?, ?, ?)",
-                (folder_id, track_id, pos)
-            )
-            imported_count += 1
-        except sqlite3.IntegrityError:
-            pass  # Track already in folder
-    
-    conn.commit()
-    conn.close()
+    job_id = submit_job("import", import_tracks_to_folder, folder_id, tracks)
+    return job_accepted(job_id)
+
+# Import job: add parsed tracks to a folder, reusing existing tracks
+def import_tracks_to_folder(job, folder_id, tracks):
+    """Runs all inserts in one transaction; a cancel rolls the whole import back."""
+    def progress(done, total):
+        if job.cancel_requested():
+            raise JobCancelled()
+        job.report(done, total)
     
-    return jsonify({
-        "success": True, 
-        "imported": imported_count,
-        "total_in_file": len(tracks)
-    })
+    conn = get_db()
+    try:
+        result = mixgraph.tracks.import_tracks(conn, folder_id, tracks, progress)
+        conn.commit()
+    finally:
+        # Returning to the pool rolls back anything uncommitted
+        conn.close()
+    return result
 
 
 # ============================================================================
@@ -608,62 +716,34 @@ def import_rekordbox_to_folder(folder_id):
 @app.route("/api/tracks", methods=["GET"])
 def get_tracks():
     conn = get_db()
-    rows = conn.execute("""
-        SELECT id, title, artist, bpm, key, duration_seconds, genre, location
-        FROM tracks
-        GROUP BY title, artist
-        ORDER BY id
-    """).fetchall()
+    tracks = mixgraph.tracks.list_tracks(conn)
     conn.close()
-    return jsonify([dict(row) for row in rows])
+    return jsonify(tracks)
 
 # Create a new track
 @app.route("/api/tracks", methods=["POST"])
 def create_track():
     """Manually create a new track."""
     data = request.json
-    
-    # Validate required fields
-    if not data.get("title") or not data.get("artist"):
-        return jsonify({"error": "Title and artist are required"}), 400
-    
-    conn = get_db()
-    cursor = conn.execute(
-        """
-        INSERT INTO tracks (title, artist, bpm, key, duration_seconds, genre, location)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
-        (
-            data["title"],
-            data["artist"],
-            data.get("bpm"),
-            data.get("key"),
-            data.get("duration_seconds"),
-            data.get("genre"),
-            data.get("location")
-        )
-    )
-    track_id = cursor.lastrowid
+    conn = get_db()
+    try:
+        track_id, = mixgraph.tracks.add_tracks(conn, [data])
+    except ValueError as e:
+        conn.close()
+        return jsonify({"error": str(e)}), 400
     conn.commit()
-    
-    # Get the created track
-    row = conn.execute(
-        "SELECT * FROM tracks WHERE id = ?", (track_id,)
-    ).fetchone()
+    track = mixgraph.tracks.get_track(conn, track_id)
     conn.close()
-    
-    return jsonify(dict(row)), 201
+    return jsonify(track), 201
 
 # Get a specific track
 @app.route("/api/tracks/<int:track_id>", methods=["GET"])
 def get_track(track_id):
     conn = get_db()
-    row = conn.execute(
-        "SELECT * FROM tracks WHERE id = ?", (track_id,)
-    ).fetchone()
+    track = mixgraph.tracks.get_track(conn, track_id)
     conn.close()
-    if row:
-        return jsonify(dict(row))
+    if track:
+        return jsonify(track)
     return jsonify({"error": "Track not found"}), 404
 
 # Update a specific track
@@ -671,78 +751,76 @@ def get_track(track_id):
 def update_track(track_id):
     data = request.json
     conn = get_db()
-    
-    # Build update query dynamically based on provided fields
-    updates = []
-    values = []
-    
-    if "title" in data:
-        updates.append("title = ?")
-        values.append(data["title"])
-    if "artist" in data:
-        updates.append("artist = ?")
-        values.append(data["artist"])
-    if "bpm" in data:
-        updates.append("bpm = ?")
-        values.append(data["bpm"])
-    if "key" in data:
-        updates.append("key = ?")
-        values.append(data["key"])
-    if "genre" in data:
-        updates.append("genre = ?")
-        values.append(data["genre"])
-    
-    if updates:
-        values.append(track_id)
-        conn.execute(
-            f"UPDATE tracks SET {', '.join(updates)} WHERE id = ?",
-            values
-        )
-        conn.commit()
-    
-    row = conn.execute(
-        "SELECT * FROM tracks WHERE id = ?", (track_id,)
-    ).fetchone()
+    found = mixgraph.tracks.update_track(conn, track_id, data)
+    conn.commit()
+    track = mixgraph.tracks.get_track(conn, track_id) if found else None
     conn.close()
-    
-    if row:
-        return jsonify(dict(row))
+    if track:
+        return jsonify(track)
     return jsonify({"error": "Track not found"}), 404
 
 # Delete a specific track
 @app.route("/api/tracks/<int:track_id>", methods=["DELETE"])
 def delete_track(track_id):
     conn = get_db()
-    
-    # Delete transitions first
-    conn.execute(
-        "DELETE FROM transitions WHERE from_track_id = ? OR to_track_id = ?",
-        (track_id, track_id)
-    )
-    # Delete track
-    conn.execute("DELETE FROM tracks WHERE id = ?", (track_id,))
+    mixgraph.tracks.delete_tracks(conn, [track_id])
     conn.commit()
     conn.close()
     
-    # Reindex
-    reindex_tracks()
-    
-    return jsonify({"success": True})
+    # Reindex in the background
+    job_id = submit_job("reindex", reindex_job)
+    return job_accepted(job_id)
 
 # Search tracks by title or artist
 @app.route("/api/tracks/search", methods=["GET"])
 def search_tracks():
-    query = request.args.get("q", "")
     conn = get_db()
-    rows = conn.execute("""
-        SELECT DISTINCT id, title, artist, bpm, key
-        FROM tracks
-        WHERE title LIKE ? OR artist LIKE ?
-        GROUP BY title, artist
-        ORDER BY id
-    """, (f"%{query}%", f"%{query}%")).fetchall()
+    tracks = mixgraph.tracks.search_tracks(conn, request.args.get("q", ""))
+    conn.close()
+    return jsonify(tracks)
+
+# Candidate duplicate groups
+@app.route("/api/tracks/duplicates", methods=["GET"])
+def get_duplicate_tracks():
+    """List groups of tracks that look like the same recording."""
+    threshold = request.args.get("threshold", 0.9, type=float)
+    conn = get_db()
+    groups = mixgraph.duplicates.find_duplicate_groups(conn, threshold)
+    conn.close()
+    return jsonify(groups)
+
+# Merge duplicate tracks
+@app.route("/api/tracks/merge", methods=["POST"])
+def merge_duplicate_tracks():
+    """Merge one or more duplicate groups.
+    
+    Body is either {"keep_id": 1, "merge_ids": [2, 3]} or a list of those, on
+    its own or under "groups". All groups are merged in one transaction.
+    """
+    data = request.json
+    if isinstance(data, dict):
+        groups = data["groups"] if "groups" in data else [data]
+    else:
+        groups = data
+    try:
+        mixgraph.duplicates.check_merge_groups(groups)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Buffered plays and events may still name the duplicates
+    flush_session_plays()
+    flush_transition_events()
+    conn = get_db()
+    try:
+        merged = mixgraph.duplicates.merge_groups(conn, groups)
+        conn.commit()
+    except (sqlite3.Error, ValueError) as e:
+        conn.rollback()
+        conn.close()
+        return jsonify({"error": str(e)}), 400
     conn.close()
-    return jsonify([dict(row) for row in rows])
+    
+    return jsonify({"success": True, "merged": merged})
 
 
 # ============================================================================
@@ -753,56 +831,17 @@ def search_tracks():
 @app.route("/api/transitions", methods=["GET"])
 def get_transitions():
     conn = get_db()
-    
-    # Ensure notes column exists
-    try:
-        conn.execute("ALTER TABLE transitions ADD COLUMN notes TEXT DEFAULT ''")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
-    rows = conn.execute("""
-        SELECT 
-            t.id,
-            t.from_track_id,
-            t1.title as from_title,
-            t1.artist as from_artist,
-            t1.bpm as from_bpm,
-            t1.key as from_key,
-            t.to_track_id,
-            t2.title as to_title,
-            t2.artist as to_artist,
-            t2.bpm as to_bpm,
-            t2.key as to_key,
-            t.rating,
-            t.transition_type,
-            COALESCE(t.notes, '') as notes
-        FROM transitions t
-        JOIN tracks t1 ON t.from_track_id = t1.id
-        JOIN tracks t2 ON t.to_track_id = t2.id
-        ORDER BY t.id
-    """).fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in rows])
+    transitions = mixgraph.transitions.list_transitions(conn)
+    conn.close()
+    return jsonify(transitions)
 
 # Create a new transition
 @app.route("/api/transitions", methods=["POST"])
 def create_transition():
     data = request.json
     conn = get_db()
-    
-    # Ensure notes column exists
-    try:
-        conn.execute("ALTER TABLE transitions ADD COLUMN notes TEXT DEFAULT ''")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    
     try:
-        conn.execute("""
-            INSERT INTO transitions (from_track_id, to_track_id, rating, transition_type, notes)
-            VALUES (?, ?, ?, ?, ?)
-        """, (data["from_track_id"], data["to_track_id"], data["rating"], data["transition_type"], data.get("notes", "")))
+        mixgraph.transitions.add_transitions(conn, [data])
         conn.commit()
         conn.close()
         return jsonify({"success": True})
@@ -814,7 +853,7 @@ def create_transition():
 @app.route("/api/transitions/<int:trans_id>", methods=["DELETE"])
 def delete_transition(trans_id):
     conn = get_db()
-    conn.execute("DELETE FROM transitions WHERE id = ?", (trans_id,))
+    mixgraph.transitions.delete_transitions(conn, [trans_id])
     conn.commit()
     conn.close()
     return jsonify({"success": True})
@@ -824,11 +863,9 @@ def delete_transition(trans_id):
 def update_transition(trans_id):
     data = request.json
     conn = get_db()
-    conn.execute("""
-        UPDATE transitions 
-        SET rating = ?, transition_type = ?, notes = ?
-        WHERE id = ?
-    """, (data.get("rating"), data.get("transition_type"), data.get("notes", ""), trans_id))
+    mixgraph.transitions.update_transition(
+        conn, trans_id, data.get("rating"), data.get("transition_type"), data.get("notes", "")
+    )
     conn.commit()
     conn.close()
     return jsonify({"success": True})
@@ -838,91 +875,786 @@ def update_transition(trans_id):
 def get_track_transitions(track_id):
     """Get all transitions from a specific track."""
     conn = get_db()
-    rows = conn.execute("""
-        SELECT 
-            t.id,
-            t.to_track_id,
-            t2.title as to_title,
-            t2.artist as to_artist,
-            t2.bpm as to_bpm,
-            t2.key as to_key,
-            t.rating,
-            t.transition_type,
-            COALESCE(t.notes, '') as notes
-        FROM transitions t
-        JOIN tracks t2 ON t.to_track_id = t2.id
-        WHERE t.from_track_id = ?
-        ORDER BY t.rating DESC
-    """, (track_id,)).fetchall()
-    conn.close()
-    return jsonify([dict(row) for row in rows])
+    transitions = mixgraph.transitions.track_transitions(conn, track_id)
+    conn.close()
+    return jsonify(transitions)
+
+# Local subgraph around a track
+@app.route("/api/tracks/<int:track_id>/neighborhood", methods=["GET"])
+def get_track_neighborhood(track_id):
+    """Bounded BFS over transitions starting at a track.
+    
+    Query args: depth (1-5), direction (out, in or both), min_rating and
+    limit (max nodes). Each BFS level is one indexed query, so the cost follows
+    the size of the neighborhood rather than the library. Accepts the same
+    ?format= options as /api/graph.
+    """
+    depth = request.args.get("depth", 1, type=int)
+    direction = request.args.get("direction", "out")
+    min_rating = request.args.get("min_rating", type=int)
+    limit = request.args.get("limit", 200, type=int)
+    
+    max_depth, max_nodes = mixgraph.graph.NEIGHBORHOOD_MAX_DEPTH, mixgraph.graph.NEIGHBORHOOD_MAX_NODES
+    if not 1 <= depth <= max_depth:
+        return jsonify({"error": f"depth must be between 1 and {max_depth}"}), 400
+    if direction not in ("out", "in", "both"):
+        return jsonify({"error": "direction must be out, in or both"}), 400
+    if not 1 <= limit <= max_nodes:
+        return jsonify({"error": f"limit must be between 1 and {max_nodes}"}), 400
+    
+    conn = get_db()
+    if mixgraph.tracks.get_track(conn, track_id) is None:
+        conn.close()
+        return jsonify({"error": "Track not found"}), 404
+    
+    node_ids, truncated = mixgraph.graph.neighborhood_track_ids(conn, track_id, depth, direction, min_rating, limit)
+    tracks, transitions = mixgraph.graph.subgraph_rows(conn, node_ids, min_rating)
+    conn.close()
+    
+    # graph_response returns a (body, status) tuple for format errors
+    response = make_response(graph_response(tracks, transitions))
+    response.headers["X-Neighborhood-Truncated"] = "true" if truncated else "false"
+    return response
+
+# Precomputed "likely good next tracks" for a track
+@app.route("/api/tracks/<int:track_id>/suggestions", methods=["GET"])
+def get_track_suggestions(track_id):
+    """Top predicted transitions from a track that haven't been rated yet.
+    
+    Read straight from track_suggestions; run `python -m mixgraph suggestions` to train.
+    """
+    limit = request.args.get("limit", mixgraph.suggestions.DEFAULT_K, type=int)
+    conn = get_db()
+    rows = mixgraph.suggestions.get_suggestions(conn, track_id, limit)
+    conn.close()
+    return jsonify(rows)
 
 
 # ============================================================================
-# UTILS
+# BACKGROUND JOBS
 # ============================================================================
 
-# Reindex tracks to have sequential IDs
-def reindex_tracks():
-    """Reindex all tracks to start from 1 with no gaps."""
+# Bounded pool so heavy work can't starve interactive requests
+JOB_WORKERS = 2
+job_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="mixgraph-job")
+
+# Live progress stays in memory on the Library; the jobs row is written on
+# state changes only, so reporting never contends with the job's own write
+# transaction
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# Handle passed to job functions for progress and cancellation
+class JobHandle:
+    def __init__(self, library, job_id):
+        self.library = library
+        self.id = job_id
+    
+    def report(self, done, total=None):
+        with self.library.job_lock:
+            self.library.job_progress[self.id] = (done, total)
+    
+    def cancel_requested(self):
+        return self.library.job_cancel_events[self.id].is_set()
+
+
+# Update a job row (each call is its own short transaction)
+def update_job(job_id, **fields):
+    assignments = ", ".join(f"{name} = ?" for name in fields)
     conn = get_db()
+    conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+    conn.commit()
+    conn.close()
+
+# Queue fn(job, *args) on the pool against the current library; returns the job id
+def submit_job(kind, fn, *args):
+    library = get_library()
+    with library.job_submit_lock:
+        conn = library.connect()
+        cursor = conn.execute("INSERT INTO jobs (kind) VALUES (?)", (kind,))
+        job_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        
+        with library.job_lock:
+            library.job_cancel_events[job_id] = threading.Event()
+    job_executor.submit(run_job, library, job_id, fn, args)
+    return job_id
+
+def run_job(library, job_id, fn, args):
+    job = JobHandle(library, job_id)
+    with library.job_lock:
+        if library.job_cancel_events[job_id].is_set():
+            # Cancelled while queued; cancel_job already recorded it
+            library.job_cancel_events.pop(job_id)
+            return
+        library.job_started[job_id] = time.monotonic()
+    
+    token = current_library.set(library)
+    update_job(job_id, status="running", started_at=datetime_now())
     
-    tracks = conn.execute(
-        "SELECT id, title, artist, bpm, key, duration_seconds, genre, location FROM tracks ORDER BY id"
-    ).fetchall()
-    
-    if not tracks:
+    try:
+        result = fn(job, *args)
+        done, total = library.job_progress.get(job_id, (0, None))
+        update_job(
+            job_id, status="succeeded", result=json.dumps(result), done=total or done,
+            total=total, finished_at=datetime_now()
+        )
+    except JobCancelled:
+        done, total = library.job_progress.get(job_id, (0, None))
+        update_job(job_id, status="cancelled", done=done, total=total, finished_at=datetime_now())
+    except Exception as e:
+        app.logger.exception("Job %s failed", job_id)
+        update_job(job_id, status="failed", error=str(e), finished_at=datetime_now())
+    finally:
+        current_library.reset(token)
+        with library.job_lock:
+            library.job_progress.pop(job_id, None)
+            library.job_started.pop(job_id, None)
+            library.job_cancel_events.pop(job_id, None)
+
+# Job row plus live progress and ETA
+def describe_job(row):
+    job = dict(row)
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    
+    library = get_library()
+    with library.job_lock:
+        live = library.job_progress.get(job["id"])
+        started = library.job_started.get(job["id"])
+    if live:
+        job["done"], job["total"] = live
+    
+    job["progress"] = None
+    job["eta_seconds"] = None
+    if job["total"]:
+        job["progress"] = round(job["done"] / job["total"], 3)
+        if started and job["done"]:
+            elapsed = time.monotonic() - started
+            job["eta_seconds"] = round(elapsed * (job["total"] - job["done"]) / job["done"], 1)
+    return job
+
+# 202 response pointing at the job's status URL
+def job_accepted(job_id):
+    status_url = api_url(f"/jobs/{job_id}")
+    response = jsonify({"job_id": job_id, "status": "queued", "status_url": status_url})
+    response.status_code = 202
+    response.headers["Location"] = status_url
+    return response
+
+# Reindex job; reindexes must never overlap
+def reindex_job(job):
+    # Buffered plays and events may still name the old ids
+    flush_session_plays()
+    flush_transition_events()
+    with job.library.reindex_lock:
+        conn = get_db()
+        mixgraph.tracks.reindex_tracks(conn)
         conn.close()
-        return
+
+# Retrain job for the transition predictor
+def rebuild_suggestions_job(job):
+    job.report(0, 1)
+    conn = get_db()
+    count = mixgraph.suggestions.rebuild_suggestions(conn)
+    conn.close()
+    job.report(1, 1)
+    return {"tracks": count}
+
+# Recent jobs
+@app.route("/api/jobs", methods=["GET"])
+def get_jobs():
+    conn = get_db()
+    rows = conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT 50").fetchall()
+    conn.close()
+    return jsonify([describe_job(row) for row in rows])
+
+# Job status, progress and ETA
+@app.route("/api/jobs/<int:job_id>", methods=["GET"])
+def get_job(job_id):
+    conn = get_db()
+    row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+    if row:
+        return jsonify(describe_job(row))
+    return jsonify({"error": "Job not found"}), 404
+
+# Cancel a queued or running job
+@app.route("/api/jobs/<int:job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    """Queued jobs are cancelled at once; running jobs stop at their next check."""
+    library = get_library()
+    with library.job_lock:
+        event = library.job_cancel_events.get(job_id)
+        if event:
+            event.set()
+        queued = event is not None and job_id not in library.job_started
+    if queued:
+        update_job(job_id, status="cancelled", finished_at=datetime_now())
     
-    id_mapping = {row["id"]: new_id for new_id, row in enumerate(tracks, 1)}
+    conn = get_db()
+    row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    conn.close()
+    if row is None:
+        return jsonify({"error": "Job not found"}), 404
+    if event is None:
+        return jsonify({"error": "Job already finished"}), 409
+    return jsonify(describe_job(row))
+
+# Retrain the predictor and rebuild every track's suggestions
+@app.route("/api/suggestions/rebuild", methods=["POST"])
+def rebuild_track_suggestions():
+    job_id = submit_job("suggestions", rebuild_suggestions_job)
+    return job_accepted(job_id)
+
+
+# ============================================================================
+# BACKUPS
+# ============================================================================
+
+BACKUP_KEEP = 10                    # rotated snapshots to keep
+BACKUP_PAGES_PER_STEP = 1024        # pages copied per step
+BACKUP_STEP_SLEEP = 0.01            # seconds yielded to writers between steps
+BACKUP_MAX_RESTARTS = 5             # then fall back to a single-step copy
+BACKUP_INTERVAL = 6 * 60 * 60       # seconds between scheduled snapshots
+
+backup_scheduler = None
+
+
+class BackupRestarted(Exception):
+    pass
+
+
+# Snapshot files of the current library, newest first
+def list_snapshots():
+    library = get_library()
+    if not library.backup_dir.exists():
+        return []
+    return sorted(library.backup_dir.glob(f"{library.path.stem}-*.db"), reverse=True)
+
+# Copy the live database into a new snapshot, a few pages at a time
+def create_snapshot(job=None):
+    """Online backup with the SQLite backup API.
+    
+    Each step copies BACKUP_PAGES_PER_STEP pages and then sleeps, so API writes
+    are only held off for one step at a time. SQLite restarts a backup when
+    another connection writes mid-copy; after BACKUP_MAX_RESTARTS of those the
+    copy is finished in one step instead of chasing a busy database.
+    """
+    library = get_library()
+    library.backup_dir.mkdir(parents=True, exist_ok=True)
+    name = f"{library.path.stem}-{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S-%f')}.db"
+    final_path = library.backup_dir / name
+    tmp_path = final_path.with_suffix(".tmp")
+    
+    restarts = 0
+    last_remaining = None
+    
+    def progress(status, remaining, total):
+        nonlocal last_remaining
+        if job:
+            if job.cancel_requested():
+                raise JobCancelled()
+            job.report(total - remaining, total)
+        if last_remaining is not None and remaining > last_remaining:
+            raise BackupRestarted()
+        last_remaining = remaining
+    
+    source = sqlite3.connect(library.path)
+    try:
+        while True:
+            target = sqlite3.connect(tmp_path)
+            try:
+                pages = BACKUP_PAGES_PER_STEP if restarts < BACKUP_MAX_RESTARTS else -1
+                source.backup(target, pages=pages, progress=progress, sleep=BACKUP_STEP_SLEEP)
+                break
+            except BackupRestarted:
+                restarts += 1
+                last_remaining = None
+            finally:
+                target.close()
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        source.close()
+    
+    os.replace(tmp_path, final_path)
+    
+    for old in list_snapshots()[BACKUP_KEEP:]:
+        old.unlink(missing_ok=True)
+    
+    return {"name": name, "size": final_path.stat().st_size, "restarts": restarts}
+
+# Backup job
+def backup_job(job):
+    return create_snapshot(job)
+
+# Back up every library each BACKUP_INTERVAL seconds
+def start_backup_scheduler():
+    """Caller holds libraries_lock; the scheduler starts once per process."""
+    global backup_scheduler
+    if backup_scheduler is not None:
+        return
     
-    conn.execute("PRAGMA foreign_keys = OFF")
+    def loop():
+        while True:
+            time.sleep(BACKUP_INTERVAL)
+            run_scheduled_backups()
     
-    conn.execute("""
-        CREATE TABLE tracks_new (
-            id INTEGER PRIMARY KEY,
-            title TEXT NOT NULL,
-            artist TEXT NOT NULL,
-            bpm REAL,
-            key TEXT,
-            duration_seconds INTEGER,
-            genre TEXT,
-            location TEXT
+    backup_scheduler = threading.Thread(target=loop, daemon=True)
+    backup_scheduler.start()
+
+# Whether a library's file was written after its newest snapshot
+def changed_since_snapshot(library):
+    snapshots = list_snapshots()
+    return not snapshots or library.path.stat().st_mtime > snapshots[0].stat().st_mtime
+
+# One round of scheduled snapshots
+def run_scheduled_backups():
+    """Open libraries get a backup job. A closed library is only written to
+    by offline tools, so it is copied directly, and only if it changed since
+    its last snapshot, without opening it and evicting a live one."""
+    for name in list_library_names():
+        with libraries_lock:
+            library = open_libraries.get(name)
+        is_open = library is not None
+        if not is_open:
+            library = Library(name, library_path(name))
+            if not library.path.exists():
+                continue
+        
+        token = current_library.set(library)
+        try:
+            if is_open:
+                submit_job("backup", backup_job)
+            elif changed_since_snapshot(library):
+                create_snapshot()
+        except (sqlite3.Error, OSError):
+            app.logger.exception("Scheduled backup failed for library %s", name)
+        finally:
+            current_library.reset(token)
+
+# Take a snapshot now
+@app.route("/api/admin/backup", methods=["POST"])
+def backup_database():
+    job_id = submit_job("backup", backup_job)
+    return job_accepted(job_id)
+
+# Available snapshots
+@app.route("/api/admin/backups", methods=["GET"])
+def get_backups():
+    return jsonify([
+        {"name": path.name, "size": path.stat().st_size}
+        for path in list_snapshots()
+    ])
+
+# Put the live jobs table back after a restore
+def restore_jobs(library, jobs, seq):
+    conn = library.connect()
+    conn.execute("DELETE FROM jobs")
+    if jobs:
+        columns = jobs[0].keys()
+        conn.executemany(
+            f"INSERT INTO jobs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [tuple(row) for row in jobs]
         )
-    """)
+    # New jobs mustn't reuse ids that still have live handles
+    conn.execute("DELETE FROM sqlite_sequence WHERE name = 'jobs'")
+    conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('jobs', ?)", (seq,))
+    
+    # A job that finished while the copy ran may have lost its final update
+    with library.job_lock:
+        live = list(library.job_cancel_events)
+    conn.execute(f"""
+        UPDATE jobs SET status = 'failed', error = 'Interrupted by restore', finished_at = CURRENT_TIMESTAMP
+        WHERE status IN ('queued', 'running') AND id NOT IN ({', '.join('?' * len(live))})
+    """, live)
+    conn.commit()
+    conn.close()
+
+# Replace the live database with a snapshot
+@app.route("/api/admin/restore", methods=["POST"])
+def restore_database():
+    """Restore a snapshot in a single backup step into the live database.
+    
+    Copying into the open database (rather than swapping files) keeps other
+    connections valid and is atomic for them.
+    """
+    data = request.json or {}
+    snapshots = {path.name: path for path in list_snapshots()}
+    path = snapshots.get(data.get("name"))
+    if path is None:
+        return jsonify({"error": "Snapshot not found"}), 404
+    
+    snapshot = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    if snapshot.execute("PRAGMA quick_check").fetchone()[0] != "ok":
+        snapshot.close()
+        return jsonify({"error": "Snapshot is corrupt"}), 400
+    
+    # Buffered plays and events belong to the state being replaced
+    library = get_library()
+    flush_session_plays(library)
+    flush_transition_events(library)
+    
+    # Jobs are the server's own bookkeeping, not library data: the live rows
+    # survive the restore, and no new job can be submitted in between
+    with library.job_submit_lock:
+        conn = library.connect()
+        jobs = conn.execute("SELECT * FROM jobs").fetchall()
+        jobs_seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'jobs'").fetchone()
+        conn.close()
+        
+        target = sqlite3.connect(library.path)
+        try:
+            snapshot.backup(target)
+        finally:
+            target.close()
+            snapshot.close()
+        
+        restore_jobs(library, jobs, jobs_seq[0] if jobs_seq else 0)
     
-    for row in tracks:
-        new_id = id_mapping[row["id"]]
-        conn.execute(
-            "INSERT INTO tracks_new VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-            (new_id, row["title"], row["artist"], row["bpm"], row["key"], 
-             row["duration_seconds"], row["genre"], row["location"])
-        )
+    with library.session_lock:
+        library.session_positions.clear()
+        library.session_state.clear()
     
-    transitions = conn.execute(
-        "SELECT id, from_track_id, to_track_id, rating, transition_type FROM transitions"
-    ).fetchall()
+    return jsonify({"success": True, "restored": path.name})
+
+
+# ============================================================================
+# DJ SESSIONS
+# ============================================================================
+
+# Plays and transition events are acknowledged from memory and written
+# behind in batches
+WRITE_BEHIND_INTERVAL = 1.0  # seconds
+SESSION_FLUSH_BATCH = 100
+
+# Per-library buffers live on the Library; one writer thread serves them all
+write_behind_wakeup = threading.Event()
+write_behind_writer = None
+write_behind_lock = threading.Lock()
+
+# Write every buffered play of a library in one transaction
+def flush_session_plays(library=None):
+    """Holding session_flush_lock for the write means a history read after a
+    flush sees every play acknowledged before it."""
+    library = library or get_library()
+    with library.session_flush_lock:
+        with library.session_lock:
+            pending, library.session_buffer = library.session_buffer, []
+        if not pending:
+            return
+        
+        conn = library.connect()
+        try:
+            mixgraph.sessions.write_plays(conn, pending)
+            conn.commit()
+        except sqlite3.Error:
+            # Put the batch back so the next flush retries it
+            conn.rollback()
+            with library.session_lock:
+                library.session_buffer[:0] = pending
+            raise
+        finally:
+            conn.close()
+
+# Background writer: flush on a timer or when a buffer fills up
+def write_behind_loop():
+    while True:
+        write_behind_wakeup.wait(WRITE_BEHIND_INTERVAL)
+        write_behind_wakeup.clear()
+        flush_write_behind()
+
+def flush_write_behind():
+    # A failing library or buffer mustn't hold up the others
+    for library in list(open_libraries.values()):
+        for flush in (flush_session_plays, flush_transition_events):
+            try:
+                flush(library)
+            except sqlite3.Error:
+                app.logger.exception("Write-behind flush failed for library %s", library.name)
+
+def ensure_write_behind():
+    global write_behind_writer
+    with write_behind_lock:
+        if write_behind_writer is None:
+            write_behind_writer = threading.Thread(target=write_behind_loop, daemon=True)
+            write_behind_writer.start()
+            atexit.register(flush_write_behind)
+
+# Next position in a session's log, seeded from the database on first use
+def next_session_position(conn, session_id):
+    library = get_library()
+    with library.session_lock:
+        if session_id not in library.session_positions:
+            last = mixgraph.sessions.last_position(conn, session_id)
+            pending = [p[1] for p in library.session_buffer if p[0] == session_id]
+            library.session_positions[session_id] = max([last] + pending)
+        library.session_positions[session_id] += 1
+        return library.session_positions[session_id]
+
+# Now-playing payload with suggested next tracks not yet played this session
+def build_now_playing(conn, session_id, track_id, position):
+    track = conn.execute(
+        "SELECT id, title, artist, bpm, key, duration_seconds, genre FROM tracks WHERE id = ?",
+        (track_id,)
+    ).fetchone()
     
-    conn.execute("DELETE FROM transitions")
+    library = get_library()
+    with library.session_lock:
+        pending = [p[2] for p in library.session_buffer if p[0] == session_id]
+    played = mixgraph.sessions.played_track_ids(conn, session_id) | set(pending)
+    next_tracks = mixgraph.sessions.next_tracks(conn, track_id, exclude=played)
+    
+    return {
+        "session_id": session_id,
+        "position": position,
+        "now_playing": dict(track) if track else None,
+        "next": next_tracks
+    }
+
+# Push an event to every screen listening on a session
+def publish_session_event(session_id, payload):
+    library = get_library()
+    with library.session_lock:
+        library.session_state[session_id] = payload
+        subscribers = list(library.session_subscribers.get(session_id, []))
+    for subscriber in subscribers:
+        subscriber.put(payload)
+
+# Start a new session
+@app.route("/api/sessions", methods=["POST"])
+def create_session():
+    data = request.json or {}
+    conn = get_db()
+    session_id = mixgraph.sessions.create_session(conn, data.get("name"))
+    conn.commit()
+    conn.close()
+    return jsonify({"id": session_id, "name": data.get("name")}), 201
+
+# Session info and its full play history
+@app.route("/api/sessions/<int:session_id>", methods=["GET"])
+def get_session(session_id):
+    flush_session_plays()
+    conn = get_db()
+    session = mixgraph.sessions.get_session(conn, session_id)
+    if session is None:
+        conn.close()
+        return jsonify({"error": "Session not found"}), 404
     
-    for t in transitions:
-        if t["from_track_id"] in id_mapping and t["to_track_id"] in id_mapping:
-            conn.execute(
-                "INSERT INTO transitions (from_track_id, to_track_id, rating, transition_type) VALUES (?, ?, ?, ?)",
-                (id_mapping[t["from_track_id"]], id_mapping[t["to_track_id"]], t["rating"], t["transition_type"])
-            )
+    session["history"] = mixgraph.sessions.session_history(conn, session_id)
+    conn.close()
+    return jsonify(session)
+
+# Log a played track
+@app.route("/api/sessions/<int:session_id>/play", methods=["POST"])
+def play_in_session(session_id):
+    """Append a track to the session log and notify listeners.
+    
+    The play is buffered and committed by the background writer, so this
+    returns without waiting on a database write.
+    """
+    data = request.json
+    try:
+        track_id = int(data["track_id"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "track_id is required"}), 400
+    conn = get_db()
+    if mixgraph.sessions.get_session(conn, session_id) is None:
+        conn.close()
+        return jsonify({"error": "Session not found"}), 404
+    if not mixgraph.tracks.existing_track_ids(conn, [track_id]):
+        conn.close()
+        return jsonify({"error": "Track not found", "track_ids": [track_id]}), 404
     
-    conn.execute("DROP TABLE tracks")
-    conn.execute("ALTER TABLE tracks_new RENAME TO tracks")
-    conn.execute("DELETE FROM sqlite_sequence WHERE name='tracks'")
+    position = next_session_position(conn, session_id)
+    payload = build_now_playing(conn, session_id, track_id, position)
+    conn.close()
     
-    if len(tracks) > 0:
-        conn.execute(f"INSERT INTO sqlite_sequence (name, seq) VALUES ('tracks', {len(tracks)})")
+    ensure_write_behind()
+    library = get_library()
+    with library.session_lock:
+        library.session_buffer.append((session_id, position, track_id, datetime_now()))
+        buffer_full = len(library.session_buffer) >= SESSION_FLUSH_BATCH
+    if buffer_full:
+        write_behind_wakeup.set()
     
-    conn.execute("PRAGMA foreign_keys = ON")
+    publish_session_event(session_id, payload)
+    return jsonify({"success": True, "position": position})
+
+# Server-Sent Events stream of now-playing updates
+@app.route("/api/sessions/<int:session_id>/events", methods=["GET"])
+def stream_session_events(session_id):
+    subscriber = queue.Queue()
+    library = get_library()
+    with library.session_lock:
+        library.session_subscribers.setdefault(session_id, []).append(subscriber)
+        current = library.session_state.get(session_id)
+    
+    def events():
+        try:
+            if current:
+                yield f"event: now_playing\ndata: {json.dumps(current)}\n\n"
+            while True:
+                try:
+                    payload = subscriber.get(timeout=15)
+                    yield f"event: now_playing\ndata: {json.dumps(payload)}\n\n"
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            with library.session_lock:
+                library.session_subscribers[session_id].remove(subscriber)
+                if not library.session_subscribers[session_id]:
+                    del library.session_subscribers[session_id]
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Save a session's history as a playlist
+@app.route("/api/sessions/<int:session_id>/playlist", methods=["POST"])
+def save_session_as_playlist(session_id):
+    data = request.json or {}
+    flush_session_plays()
+    conn = get_db()
+    playlist_id = mixgraph.sessions.session_to_playlist(conn, session_id, data.get("name"))
+    if playlist_id is None:
+        conn.close()
+        return jsonify({"error": "Session not found"}), 404
     conn.commit()
+    
+    playlist = mixgraph.playlists.get_playlist(conn, playlist_id)
+    conn.close()
+    return jsonify(playlist), 201
+
+
+# ============================================================================
+# TRANSITION PLAY LOG
+# ============================================================================
+
+# Events are buffered per library and written behind with the session plays
+EVENT_FLUSH_BATCH = 500
+EVENT_MAX_BATCH = 1000
+
+# Write a library's buffered events and their aggregates in one transaction
+def flush_transition_events(library=None):
+    """Append buffered events to the log and fold them into transition_stats.
+    
+    Holding event_flush_lock for the whole write means a stats read sees each
+    event either in the database or in event_pending, never both or neither.
+    """
+    library = library or get_library()
+    with library.event_flush_lock:
+        with library.event_lock:
+            events, library.event_buffer = library.event_buffer, []
+            pending, library.event_pending = library.event_pending, {}
+        if not events:
+            return
+        
+        conn = library.connect()
+        try:
+            mixgraph.playlog.write_events(conn, events, pending)
+            conn.commit()
+        except sqlite3.Error:
+            # Put the batch back so the next flush retries it
+            conn.rollback()
+            with library.event_lock:
+                library.event_buffer[:0] = events
+                for pair, delta in library.event_pending.items():
+                    mixgraph.playlog.merge_stats(pending.setdefault(pair, mixgraph.playlog.empty_stats()), delta)
+                library.event_pending = pending
+            raise
+        finally:
+            conn.close()
+
+# Aggregates for one (from, to) pair: a primary key lookup plus unflushed events
+def read_transition_stats(conn, from_id, to_id):
+    library = get_library()
+    with library.event_flush_lock:
+        stats = mixgraph.playlog.read_stats(conn, from_id, to_id)
+        with library.event_lock:
+            delta = library.event_pending.get((from_id, to_id))
+            if delta:
+                mixgraph.playlog.merge_stats(stats, delta)
+    return mixgraph.playlog.describe_stats(conn, from_id, to_id, stats)
+
+# Record played, skipped or aborted transitions
+@app.route("/api/transitions/events", methods=["POST"])
+def log_transition_events():
+    """Accept one event, or a batch as a list or under "events", from a booth.
+    
+    Events are validated and buffered; the background writer appends them
+    to the log and updates transition_stats, so this never waits on a write.
+    """
+    data = request.json
+    if isinstance(data, list):
+        raw = data
+    elif isinstance(data, dict):
+        raw = data["events"] if isinstance(data.get("events"), list) else [data]
+    else:
+        return jsonify({"error": "Expected an event object or a list of events"}), 400
+    if not raw:
+        return jsonify({"error": "No events"}), 400
+    if len(raw) > EVENT_MAX_BATCH:
+        return jsonify({"error": f"At most {EVENT_MAX_BATCH} events per request"}), 400
+    
+    try:
+        events = [mixgraph.playlog.parse_event(event) for event in raw]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    track_ids = {e[0] for e in events} | {e[1] for e in events}
+    conn = get_db()
+    found = mixgraph.tracks.existing_track_ids(conn, track_ids)
+    conn.close()
+    missing = sorted(track_ids - found)
+    if missing:
+        return jsonify({"error": "Track not found", "track_ids": missing}), 404
+    
+    ensure_write_behind()
+    library = get_library()
+    with library.event_lock:
+        library.event_buffer.extend(events)
+        for from_id, to_id, outcome, _, rating, occurred_at in events:
+            stats = library.event_pending.setdefault((from_id, to_id), mixgraph.playlog.empty_stats())
+            mixgraph.playlog.apply_event(stats, outcome, rating, occurred_at)
+        buffer_full = len(library.event_buffer) >= EVENT_FLUSH_BATCH
+    if buffer_full:
+        write_behind_wakeup.set()
+    
+    return jsonify({"accepted": len(events)}), 202
+
+# Live stats for a hand-entered transition
+@app.route("/api/transitions/<int:trans_id>/stats", methods=["GET"])
+def get_transition_stats(trans_id):
+    conn = get_db()
+    row = conn.execute(
+        "SELECT from_track_id, to_track_id FROM transitions WHERE id = ?", (trans_id,)
+    ).fetchone()
+    if row is None:
+        conn.close()
+        return jsonify({"error": "Transition not found"}), 404
+    stats = read_transition_stats(conn, row["from_track_id"], row["to_track_id"])
+    conn.close()
+    return jsonify({"id": trans_id, **stats})
+
+# Live stats for any track pair, rated or not
+@app.route("/api/transitions/stats", methods=["GET"])
+def get_pair_stats():
+    from_id = request.args.get("from_track_id", type=int)
+    to_id = request.args.get("to_track_id", type=int)
+    if from_id is None or to_id is None:
+        return jsonify({"error": "from_track_id and to_track_id are required"}), 400
+    conn = get_db()
+    stats = read_transition_stats(conn, from_id, to_id)
     conn.close()
+    return jsonify(stats)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,23 @@
-const API_BASE = '/api'
+let API_BASE = '/api'
+
+// Point every call at a named library instead of the default one
+export function setLibrary(name) {
+  API_BASE = name ? `/api/libraries/${encodeURIComponent(name)}` : '/api'
+}
+
+// Heavy endpoints answer 202 with a job; poll it until it finishes
+async function waitForJob(res, intervalMs = 500) {
+  if (res.status !== 202) return res.json()
+  const { status_url } = await res.json()
+  while (true) {
+    const job = await (await fetch(status_url)).json()
+    if (job.status === 'succeeded') return { success: true, ...job.result }
+    if (job.status === 'failed' || job.status === 'cancelled') {
+      return { error: job.error || `Job ${job.status}` }
+    }
+    await new Promise(resolve => setTimeout(resolve, intervalMs))
+  }
+}
 
 // ============================================================================
 // TRACKS
@@ -16,7 +35,7 @@ export async function getTrack(id) {
 
 export async function deleteTrack(id) {
   const res = await fetch(`${API_BASE}/tracks/${id}`, { method: 'DELETE' })
-  return res.json()
+  return waitForJob(res)
 }
 
 export async function createTrack(trackData) {
@@ -42,6 +61,20 @@ export async function searchTracks(query) {
   return res.json()
 }
 
+export async function getDuplicateTracks(threshold = 0.9) {
+  const res = await fetch(`${API_BASE}/tracks/duplicates?threshold=${threshold}`)
+  return res.json()
+}
+
+export async function mergeTracks(groups) {
+  const res = await fetch(`${API_BASE}/tracks/merge`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ groups })
+  })
+  return res.json()
+}
+
 // ============================================================================
 // TRANSITIONS
 // ============================================================================
@@ -74,11 +107,36 @@ export async function updateTransition(id, data) {
   return res.json()
 }
 
+// events: [{ from_track_id, to_track_id, outcome: 'played' | 'skipped' | 'aborted', rating?, booth?, occurred_at? }]
+export async function logTransitionEvents(events) {
+  const res = await fetch(`${API_BASE}/transitions/events`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ events })
+  })
+  return res.json()
+}
+
+export async function getTransitionStats(id) {
+  const res = await fetch(`${API_BASE}/transitions/${id}/stats`)
+  return res.json()
+}
+
+export async function getTrackPairStats(fromTrackId, toTrackId) {
+  const res = await fetch(`${API_BASE}/transitions/stats?from_track_id=${fromTrackId}&to_track_id=${toTrackId}`)
+  return res.json()
+}
+
 export async function getTrackTransitions(trackId) {
   const res = await fetch(`${API_BASE}/tracks/${trackId}/transitions`)
   return res.json()
 }
 
+export async function getTrackSuggestions(trackId, limit = 10) {
+  const res = await fetch(`${API_BASE}/tracks/${trackId}/suggestions?limit=${limit}`)
+  return res.json()
+}
+
 // ============================================================================
 // FOLDERS (for track library organization)
 // ============================================================================
@@ -106,13 +164,22 @@ export async function updateFolder(id, name) {
   return res.json()
 }
 
+export async function moveFolder(id, parentId) {
+  const res = await fetch(`${API_BASE}/folders/${id}`, {
+    method: 'PUT',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ parent_id: parentId })
+  })
+  return res.json()
+}
+
 export async function deleteFolder(id) {
   const res = await fetch(`${API_BASE}/folders/${id}`, { method: 'DELETE' })
   return res.json()
 }
 
-export async function getFolderTracks(folderId) {
-  const res = await fetch(`${API_BASE}/folders/${folderId}/tracks`)
+export async function getFolderTracks(folderId, recursive = false) {
+  const res = await fetch(`${API_BASE}/folders/${folderId}/tracks${recursive ? '?recursive=true' : ''}`)
   return res.json()
 }
 
@@ -140,11 +207,11 @@ export async function importRekordboxToFolder(folderId, file) {
     method: 'POST',
     body: formData
   })
-  return res.json()
+  return waitForJob(res)
 }
 
-export async function getFolderTransitions(folderId) {
-  const res = await fetch(`${API_BASE}/folders/${folderId}/transitions`)
+export async function getFolderTransitions(folderId, recursive = false) {
+  const res = await fetch(`${API_BASE}/folders/${folderId}/transitions${recursive ? '?recursive=true' : ''}`)
   return res.json()
 }
 
@@ -214,17 +281,141 @@ export async function reorderPlaylistTracks(playlistId, position1, position2) {
 // GRAPH DATA
 // ============================================================================
 
+const GRAPH_BINARY_TYPE = 'application/vnd.mixgraph.graph'
+
+const DTYPES = {
+  '<i4': Int32Array,
+  '<f4': Float32Array,
+  '|u1': Uint8Array,
+  '<u2': Uint16Array
+}
+
+// Decode the compact binary graph payload back into { nodes, edges } objects
+export function decodeGraphBinary(buffer) {
+  const view = new DataView(buffer)
+  const headerLength = view.getUint32(4, true)
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, headerLength)))
+  const dataStart = 8 + headerLength
+
+  const columns = { nodes: {}, edges: {} }
+  for (const col of header.columns) {
+    const ArrayType = DTYPES[col.dtype]
+    columns[col.part][col.name] = new ArrayType(buffer, dataStart + col.offset, col.length)
+  }
+
+  const decodeColumn = (name, values, i) => {
+    const value = values[i]
+    if (header.dicts[name]) return value === 0 ? null : header.dicts[name][value - 1]
+    if (name === 'rating') return value === 0 ? null : value
+    return Number.isNaN(value) ? null : value
+  }
+
+  const build = (part, count, extra) => Array.from({ length: count }, (_, i) => {
+    const obj = {}
+    for (const [name, values] of Object.entries(columns[part])) {
+      obj[name] = decodeColumn(name, values, i)
+    }
+    return extra ? extra(obj, i) : obj
+  })
+
+  return {
+    nodes: build('nodes', header.node_count, (node, i) => {
+      for (const [name, values] of Object.entries(header.strings)) node[name] = values[i]
+      return node
+    }),
+    edges: build('edges', header.edge_count)
+  }
+}
+
+async function fetchGraph(url) {
+  const res = await fetch(url, { headers: { Accept: GRAPH_BINARY_TYPE } })
+  if (res.headers.get('Content-Type')?.startsWith(GRAPH_BINARY_TYPE)) {
+    return decodeGraphBinary(await res.arrayBuffer())
+  }
+  return res.json()
+}
+
 export async function getGraphData() {
-  const res = await fetch(`${API_BASE}/graph`)
+  return fetchGraph(`${API_BASE}/graph`)
+}
+
+export async function getFolderGraphData(folderId, recursive = false) {
+  return fetchGraph(`${API_BASE}/folders/${folderId}/graph${recursive ? '?recursive=true' : ''}`)
+}
+
+export async function getPlaylistGraphData(playlistId) {
+  return fetchGraph(`${API_BASE}/playlists/${playlistId}/graph`)
+}
+
+export async function getTrackNeighborhood(trackId, { depth = 1, direction = 'both', minRating = null, limit = 200 } = {}) {
+  const params = new URLSearchParams({ depth, direction, limit })
+  if (minRating !== null) params.set('min_rating', minRating)
+  return fetchGraph(`${API_BASE}/tracks/${trackId}/neighborhood?${params}`)
+}
+
+// ============================================================================
+// DJ SESSIONS
+// ============================================================================
+
+export async function createSession(name = null) {
+  const res = await fetch(`${API_BASE}/sessions`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ name })
+  })
   return res.json()
 }
 
-export async function getFolderGraphData(folderId) {
-  const res = await fetch(`${API_BASE}/folders/${folderId}/graph`)
+export async function getSession(sessionId) {
+  const res = await fetch(`${API_BASE}/sessions/${sessionId}`)
   return res.json()
 }
 
-export async function getPlaylistGraphData(playlistId) {
-  const res = await fetch(`${API_BASE}/playlists/${playlistId}/graph`)
+export async function playInSession(sessionId, trackId) {
+  const res = await fetch(`${API_BASE}/sessions/${sessionId}/play`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ track_id: trackId })
+  })
+  return res.json()
+}
+
+export async function saveSessionAsPlaylist(sessionId, name = null) {
+  const res = await fetch(`${API_BASE}/sessions/${sessionId}/playlist`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ name })
+  })
+  return res.json()
+}
+
+// Returns the EventSource; call .close() to stop listening
+export function subscribeToSession(sessionId, onNowPlaying) {
+  const source = new EventSource(`${API_BASE}/sessions/${sessionId}/events`)
+  source.addEventListener('now_playing', e => onNowPlaying(JSON.parse(e.data)))
+  return source
+}
+
+// ============================================================================
+// JOBS
+// ============================================================================
+
+export async function getJobs() {
+  const res = await fetch(`${API_BASE}/jobs`)
+  return res.json()
+}
+
+export async function getJob(id) {
+  const res = await fetch(`${API_BASE}/jobs/${id}`)
+  return res.json()
+}
+
+export async function cancelJob(id) {
+  const res = await fetch(`${API_BASE}/jobs/${id}`, { method: 'DELETE' })
+  return res.json()
+}
+
+export async function rebuildSuggestions() {
+  const res = await fetch(`${API_BASE}/suggestions/rebuild`, { method: 'POST' })
   return res.json()
 }
@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react'
-import { getTracks, getTrackTransitions, getPlaylists, getPlaylistTracks, getTransitions } from '../api'
+import { getTracks, getTrackTransitions, getPlaylists, getPlaylistTracks, getTransitions, createSession, getSession, playInSession, saveSessionAsPlaylist } from '../api'
 
 function DJMode() {
   // Mode selection
@@ -16,6 +16,8 @@ function DJMode() {
   const [history, setHistory] = useState([])
   const [search, setSearch] = useState('')
   const [showSearch, setShowSearch] = useState(true)
+  const [sessionId, setSessionId] = useState(null)
+  const [savedPlaylist, setSavedPlaylist] = useState(null)
 
   useEffect(() => {
     getPlaylists().then(setPlaylists)
@@ -27,6 +29,31 @@ function DJMode() {
     }
   }, [mode])
 
+  // Freestyle sets are logged server-side so a refresh doesn't lose them
+  useEffect(() => {
+    if (mode !== 'freestyle') return
+    const storedId = localStorage.getItem('djSessionId')
+    if (storedId) {
+      getSession(storedId).then(session => {
+        if (session.error) {
+          localStorage.removeItem('djSessionId')
+          return
+        }
+        setSessionId(session.id)
+        setHistory(session.history)
+        if (session.history.length > 0) {
+          setCurrentTrack(session.history[session.history.length - 1])
+          setShowSearch(false)
+        }
+      })
+    } else {
+      createSession().then(session => {
+        localStorage.setItem('djSessionId', session.id)
+        setSessionId(session.id)
+      })
+    }
+  }, [mode])
+
   useEffect(() => {
     if (selectedPlaylist) {
       Promise.all([
@@ -75,6 +102,9 @@ function DJMode() {
     setCurrentTrack(track)
     setCurrentIndex(index >= 0 ? index : tracks.findIndex(t => t.id === track.id))
     setHistory(prev => [...prev, track])
+    if (mode === 'freestyle' && sessionId) {
+      playInSession(sessionId, track.id)
+    }
     setShowSearch(false)
     setSearch('')
   }
@@ -115,10 +145,18 @@ function DJMode() {
     setAllTransitions([])
     setHistory([])
     setTracks([])
+    setSessionId(null)
+    setSavedPlaylist(null)
+    localStorage.removeItem('djSessionId')
     setShowSearch(true)
     setSearch('')
   }
 
+  async function saveHistoryAsPlaylist() {
+    const playlist = await saveSessionAsPlaylist(sessionId)
+    setSavedPlaylist(playlist)
+  }
+
   // Get transition between two tracks
   function getTransitionBetween(fromId, toId) {
     return allTransitions.find(t => t.from_track_id === fromId && t.to_track_id === toId)
@@ -526,6 +564,15 @@ function DJMode() {
               </span>
             ))}
           </div>
+          {mode === 'freestyle' && sessionId && (
+            savedPlaylist ? (
+              <p className="history-saved">Saved as playlist "{savedPlaylist.name}"</p>
+            ) : (
+              <button className="btn btn-primary" onClick={saveHistoryAsPlaylist}>
+                💾 Save as Playlist
+              </button>
+            )
+          )}
         </div>
       )}
     </div>
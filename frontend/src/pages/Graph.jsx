@@ -1,5 +1,5 @@
-import { useState, useEffect, useRef, useCallback } from 'react'
-import { getGraphData, getFolderGraphData, getPlaylistGraphData, getFolders, getPlaylists, getPlaylistTracks } from '../api'
+import { useState, useEffect, useRef, useCallback, useMemo } from 'react'
+import { getGraphData, getFolderGraphData, getPlaylistGraphData, getFolders, getPlaylists, getPlaylistTracks, getTrackNeighborhood } from '../api'
 
 function Graph() {
   const [folders, setFolders] = useState([])
@@ -331,11 +331,48 @@ function Graph() {
     return `M ${x} ${y} L ${x1} ${y1} L ${x2} ${y2} Z`
   }
 
-  const outgoingCount = (nodeId) => 
-    graphData.edges.filter(e => e.from_track_id === nodeId).length
+  // Degree per node. The library graph ships server-maintained counters;
+  // folder and playlist subgraphs only count the edges actually loaded, in a
+  // single pass.
+  const degrees = useMemo(() => {
+    const map = new Map()
+    if (viewType === 'all') {
+      graphData.nodes.forEach(n => map.set(n.id, { out: n.out_degree ?? 0, in: n.in_degree ?? 0 }))
+      return map
+    }
+    graphData.nodes.forEach(n => map.set(n.id, { out: 0, in: 0 }))
+    graphData.edges.forEach(e => {
+      if (map.has(e.from_track_id)) map.get(e.from_track_id).out++
+      if (map.has(e.to_track_id)) map.get(e.to_track_id).in++
+    })
+    return map
+  }, [graphData, viewType])
+
+  const outgoingCount = (nodeId) => degrees.get(nodeId)?.out ?? 0
 
-  const incomingCount = (nodeId) => 
-    graphData.edges.filter(e => e.to_track_id === nodeId).length
+  // Pull a node's direct neighbours into the current (sub)graph
+  async function expandNode(node) {
+    const hood = await getTrackNeighborhood(node.id)
+    const origin = nodePositions[node.id] || { x: 400, y: 300 }
+    const knownNodes = new Set(graphData.nodes.map(n => n.id))
+    const knownEdges = new Set(graphData.edges.map(e => e.id))
+    const newNodes = hood.nodes.filter(n => !knownNodes.has(n.id))
+
+    setNodePositions(prev => {
+      const positions = { ...prev }
+      newNodes.forEach((n, i) => {
+        const angle = (2 * Math.PI * i) / newNodes.length
+        positions[n.id] = { x: origin.x + 120 * Math.cos(angle), y: origin.y + 120 * Math.sin(angle) }
+      })
+      return positions
+    })
+    setGraphData(prev => ({
+      nodes: [...prev.nodes, ...newNodes],
+      edges: [...prev.edges, ...hood.edges.filter(e => !knownEdges.has(e.id))]
+    }))
+  }
+
+  const incomingCount = (nodeId) => degrees.get(nodeId)?.in ?? 0
 
   return (
     <div className={`graph-page${isFullscreen ? ' fullscreen' : ''}`} ref={graphPageRef}>
@@ -605,6 +642,11 @@ function Graph() {
             </div>
           )}
           
+          {viewType === 'folder' && (
+            <button className="btn btn-primary btn-small" onClick={() => expandNode(selectedNode)}>
+              Expand neighbours
+            </button>
+          )}
           <button className="btn btn-secondary btn-small" onClick={() => setSelectedNode(null)}>
             Close
           </button>
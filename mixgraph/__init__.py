@@ -0,0 +1,27 @@
+"""Mixgraph as a library: the track/transition graph without the HTTP server.
+
+    import mixgraph
+
+    conn = mixgraph.connect("mixgraph.db")
+    mixgraph.transitions.set_ratings(conn, [(1, 2, 5), (2, 3, 4)])
+    conn.commit()
+    matrix = mixgraph.graph.transition_matrix(conn)
+
+Functions take an open connection and leave committing to the caller unless
+their docstring says otherwise, so a batch of calls is one transaction. The
+Flask API (api.py) and the CLI (python -m mixgraph) are thin layers over
+these modules.
+"""
+from mixgraph import (
+    counters, db, duplicates, folders, graph, playlists, playlog, rekordbox,
+    schema, sessions, suggestions, tracks, transitions,
+)
+from mixgraph.db import open_connection
+
+
+# Open a library file, creating or migrating its schema
+def connect(path="mixgraph.db"):
+    conn = open_connection(path)
+    schema.init_db(conn)
+    conn.commit()
+    return conn
@@ -0,0 +1,3 @@
+from mixgraph.cli import main
+
+main()
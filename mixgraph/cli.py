@@ -0,0 +1,142 @@
+"""Command line access to a library file, in-process and without the server.
+
+Usage:
+    python -m mixgraph --db mixgraph.db tracks --format csv > tracks.csv
+    python -m mixgraph rate ratings.csv
+    python -m mixgraph dedupe --merge
+    python -m mixgraph matrix graph.npz
+"""
+import argparse
+import csv
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+
+import mixgraph
+from mixgraph import duplicates, graph, rekordbox, suggestions, tracks, transitions
+
+
+# Write dict rows to stdout as JSON lines or CSV
+def write_rows(rows, fmt):
+    writer = None
+    for row in rows:
+        if fmt == "jsonl":
+            sys.stdout.write(json.dumps(row) + "\n")
+            continue
+        if writer is None:
+            writer = csv.DictWriter(sys.stdout, fieldnames=list(row))
+            writer.writeheader()
+        writer.writerow(row)
+
+def cmd_tracks(conn, args):
+    write_rows(tracks.iter_tracks(conn), args.format)
+
+def cmd_transitions(conn, args):
+    write_rows(transitions.iter_transitions(conn), args.format)
+
+def cmd_import(conn, args):
+    parsed = rekordbox.read_txt(args.file)
+    if conn.execute("SELECT 1 FROM folders WHERE id = ?", (args.folder,)).fetchone() is None:
+        raise SystemExit(f"Folder {args.folder} not found")
+    result = tracks.import_tracks(conn, args.folder, parsed)
+    conn.commit()
+    print(f"Imported {result['imported']} of {result['total_in_file']} tracks")
+
+# Ratings from a CSV with from_track_id, to_track_id and rating columns
+def cmd_rate(conn, args):
+    with open(args.file, newline="") as f:
+        rows = [
+            (int(row["from_track_id"]), int(row["to_track_id"]), int(row["rating"]) if row["rating"] else None)
+            for row in csv.DictReader(f)
+        ]
+    changed = transitions.set_ratings(conn, rows)
+    conn.commit()
+    print(f"Updated {changed} of {len(rows)} transitions")
+
+# Listing shows near duplicates for review; merging takes exact ones unless --fuzzy
+def cmd_dedupe(conn, args):
+    groups = duplicates.find_duplicate_groups(conn, args.threshold, fuzzy=args.fuzzy or not args.merge)
+    if not args.merge:
+        write_rows(groups, "jsonl")
+        return
+    merged = duplicates.merge_groups(conn, [
+        {
+            "keep_id": group["keep_id"],
+            "merge_ids": [track["id"] for track in group["tracks"] if track["id"] != group["keep_id"]],
+        }
+        for group in groups
+    ])
+    conn.commit()
+    print(f"Merged {merged} tracks in {len(groups)} groups")
+
+def cmd_reindex(conn, args):
+    tracks.reindex_tracks(conn)
+    print("Reindexed tracks")
+
+# Save the transition matrix as CSR arrays in an .npz file
+def cmd_matrix(conn, args):
+    matrix = graph.transition_matrix(
+        conn, weight=None if args.unweighted else "rating", min_rating=args.min_rating
+    )
+    np.savez(args.output, **matrix._asdict())
+    print(f"Wrote {matrix.shape[0]}x{matrix.shape[1]} matrix with {len(matrix.data)} transitions to {args.output}")
+
+def cmd_suggestions(conn, args):
+    count = suggestions.rebuild_suggestions(conn, args.k, factors=args.factors, epochs=args.epochs)
+    print(f"Wrote suggestions for {count} tracks")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="mixgraph", description="Work on a Mixgraph library file directly.")
+    parser.add_argument("--db", type=Path, default=Path("mixgraph.db"))
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, fn, help_text in (
+        ("tracks", cmd_tracks, "Export all tracks"),
+        ("transitions", cmd_transitions, "Export all transitions"),
+    ):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--format", choices=["jsonl", "csv"], default="jsonl")
+        command.set_defaults(fn=fn)
+
+    command = commands.add_parser("import", help="Import a Rekordbox .txt export into a folder")
+    command.add_argument("file", type=Path)
+    command.add_argument("--folder", type=int, required=True)
+    command.set_defaults(fn=cmd_import)
+
+    command = commands.add_parser("rate", help="Set ratings from a from_track_id,to_track_id,rating CSV")
+    command.add_argument("file", type=Path)
+    command.set_defaults(fn=cmd_rate)
+
+    command = commands.add_parser("dedupe", help="List (or --merge) duplicate track groups")
+    command.add_argument("--threshold", type=float, default=0.9, help="Minimum score for near duplicates")
+    command.add_argument("--merge", action="store_true", help="Merge groups with identical match keys")
+    command.add_argument("--fuzzy", action="store_true", help="With --merge, also merge near duplicates")
+    command.set_defaults(fn=cmd_dedupe)
+
+    command = commands.add_parser("reindex", help="Renumber track ids without gaps")
+    command.set_defaults(fn=cmd_reindex)
+
+    command = commands.add_parser("matrix", help="Export the transition matrix as CSR arrays (.npz)")
+    command.add_argument("output", type=Path)
+    command.add_argument("--min-rating", type=int)
+    command.add_argument("--unweighted", action="store_true", help="1.0 per transition instead of its rating")
+    command.set_defaults(fn=cmd_matrix)
+
+    command = commands.add_parser("suggestions", help="Train the predictor and rebuild suggestions")
+    command.add_argument("--k", type=int, default=suggestions.DEFAULT_K, help="Suggestions to keep per track")
+    command.add_argument("--factors", type=int, default=16)
+    command.add_argument("--epochs", type=int, default=200)
+    command.set_defaults(fn=cmd_suggestions)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    conn = mixgraph.connect(args.db)
+    try:
+        args.fn(conn, args)
+    finally:
+        conn.close()
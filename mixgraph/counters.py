@@ -0,0 +1,115 @@
+"""Denormalized counters: folder/playlist sizes and per-track graph degrees.
+
+Triggers keep them current inside each write, so reads never aggregate.
+"""
+
+# Columns exposing track_stats on graph nodes (alias the table as ts)
+TRACK_STATS_COLUMNS = """
+    COALESCE(ts.out_degree, 0) as out_degree,
+    COALESCE(ts.in_degree, 0) as in_degree,
+    CASE WHEN ts.rated_count > 0 THEN ROUND(1.0 * ts.rating_sum / ts.rated_count, 2) END as avg_rating
+"""
+
+
+# Keep folder/playlist sizes and track degrees current inside each write
+def create_counter_triggers(conn):
+    """Create the triggers that maintain denormalized counters."""
+    for table, owner, owner_col in (
+        ("folder_tracks", "folders", "folder_id"),
+        ("playlist_tracks", "playlists", "playlist_id"),
+    ):
+        add = f"""
+            UPDATE {owner}
+            SET track_count = track_count + 1,
+                total_duration = total_duration
+                    + COALESCE((SELECT duration_seconds FROM tracks WHERE id = NEW.track_id), 0)
+            WHERE id = NEW.{owner_col};
+        """
+        remove = f"""
+            UPDATE {owner}
+            SET track_count = track_count - 1,
+                total_duration = total_duration
+                    - COALESCE((SELECT duration_seconds FROM tracks WHERE id = OLD.track_id), 0)
+            WHERE id = OLD.{owner_col};
+        """
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_count_insert
+            AFTER INSERT ON {table}
+            BEGIN {add} END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_count_delete
+            AFTER DELETE ON {table}
+            BEGIN {remove} END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_count_update
+            AFTER UPDATE OF {owner_col}, track_id ON {table}
+            BEGIN {remove} {add} END
+        """)
+    
+    add_edge = """
+        INSERT OR IGNORE INTO track_stats (track_id) VALUES (NEW.from_track_id);
+        INSERT OR IGNORE INTO track_stats (track_id) VALUES (NEW.to_track_id);
+        UPDATE track_stats
+        SET out_degree = out_degree + 1,
+            rating_sum = rating_sum + COALESCE(NEW.rating, 0),
+            rated_count = rated_count + (NEW.rating IS NOT NULL)
+        WHERE track_id = NEW.from_track_id;
+        UPDATE track_stats SET in_degree = in_degree + 1 WHERE track_id = NEW.to_track_id;
+    """
+    remove_edge = """
+        UPDATE track_stats
+        SET out_degree = out_degree - 1,
+            rating_sum = rating_sum - COALESCE(OLD.rating, 0),
+            rated_count = rated_count - (OLD.rating IS NOT NULL)
+        WHERE track_id = OLD.from_track_id;
+        UPDATE track_stats SET in_degree = in_degree - 1 WHERE track_id = OLD.to_track_id;
+    """
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS transitions_stats_insert
+        AFTER INSERT ON transitions
+        BEGIN {add_edge} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS transitions_stats_delete
+        AFTER DELETE ON transitions
+        BEGIN {remove_edge} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS transitions_stats_update
+        AFTER UPDATE OF from_track_id, to_track_id, rating ON transitions
+        BEGIN {remove_edge} {add_edge} END
+    """)
+
+# Recompute every counter from the base tables
+def rebuild_counters(conn):
+    """Reset counters to their true values (used for backfill and after bulk rewrites)."""
+    for table, owner, owner_col in (
+        ("folder_tracks", "folders", "folder_id"),
+        ("playlist_tracks", "playlists", "playlist_id"),
+    ):
+        conn.execute(f"""
+            UPDATE {owner}
+            SET track_count = (
+                    SELECT COUNT(*) FROM {table} WHERE {owner_col} = {owner}.id
+                ),
+                total_duration = (
+                    SELECT COALESCE(SUM(t.duration_seconds), 0)
+                    FROM {table} x
+                    JOIN tracks t ON t.id = x.track_id
+                    WHERE x.{owner_col} = {owner}.id
+                )
+        """)
+    
+    conn.execute("DELETE FROM track_stats")
+    conn.execute("""
+        INSERT INTO track_stats (track_id, out_degree, in_degree, rating_sum, rated_count)
+        SELECT
+            t.id,
+            (SELECT COUNT(*) FROM transitions WHERE from_track_id = t.id),
+            (SELECT COUNT(*) FROM transitions WHERE to_track_id = t.id),
+            (SELECT COALESCE(SUM(rating), 0) FROM transitions WHERE from_track_id = t.id),
+            (SELECT COUNT(rating) FROM transitions WHERE from_track_id = t.id)
+        FROM tracks t
+    """)
@@ -0,0 +1,28 @@
+"""Connection helpers shared by the library modules."""
+import sqlite3
+from datetime import datetime, timezone
+from itertools import islice
+
+# SQLite's default limit on bound parameters is 999
+SQL_BATCH_SIZE = 500
+
+
+# Open a library database with rows addressable by column name
+def open_connection(path):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+# Split any iterable into lists of at most size items
+def batched(items, size=SQL_BATCH_SIZE):
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+# "?, ?, ?" for an IN (...) clause
+def placeholders(count):
+    return ", ".join("?" * count)
+
+# Current UTC time in SQLite's CURRENT_TIMESTAMP format
+def datetime_now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,294 @@
+"""Duplicate track detection and merging.
+
+Every track carries a match_key (normalized artist|title) so exact duplicates
+are an indexed lookup; near duplicates are scored within small blocks.
+"""
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from typing import TypedDict
+
+from mixgraph.playlog import TRANSITION_STATS_UPSERT
+
+
+class DuplicateGroup(TypedDict):
+    keep_id: int
+    score: float
+    tracks: list[dict]
+
+
+# Version suffixes that don't make a recording different
+IGNORED_VERSION_TAGS = {"original mix", "original", "album version"}
+
+# Artist separators, including featured artists moved into the artist field
+ARTIST_SEPARATORS = re.compile(r"\s*(?:,|&|\band\b|\bvs\.?|(?<=\s)x(?=\s)|\bfeat\.?|\bft\.?|\bfeaturing\b)\s*")
+
+# Strip accents, lowercase and collapse punctuation/whitespace
+def fold_text(text):
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+# Split a title into its base title, folded version tag and featured artists
+def split_title(title):
+    title = title or ""
+    featured = []
+
+    # Featured artists in the title belong to the artist list
+    feat = re.search(r"[\(\[]?\s*\b(?:feat\.?|ft\.?|featuring)\s+([^\)\]\-]+)[\)\]]?", title, re.IGNORECASE)
+    if feat:
+        featured.append(feat.group(1))
+        title = title[:feat.start()] + title[feat.end():]
+
+    # Pull out the version tag whether bracketed or dash-separated
+    version = ""
+    tag = re.search(r"[\(\[]([^\)\]]*)[\)\]]\s*$", title) or re.search(r"\s+-\s+(.+)$", title)
+    if tag:
+        version = fold_text(tag.group(1))
+        title = title[:tag.start()]
+    if version in IGNORED_VERSION_TAGS:
+        version = ""
+    return title, version, featured
+
+# Build the normalized duplicate-matching key for a track
+def normalize_track_key(title, artist):
+    """Return an 'artist|title' key that is equal for trivially different copies.
+
+    Case, accents, featured artists, artist order and 'Original Mix' are
+    ignored. Remix/edit tags are kept, but '(X Remix)', '[X Remix]' and
+    '- X Remix' all normalize the same way.
+    """
+    title, version, featured = split_title(title)
+    artists = [artist or ""] + featured
+
+    names = set()
+    for part in artists:
+        for name in ARTIST_SEPARATORS.split(part.lower()):
+            name = fold_text(name)
+            if name:
+                names.add(name)
+
+    key_title = fold_text(title)
+    if version:
+        key_title += " " + version
+    return f"{' '.join(sorted(names))}|{key_title}"
+
+# Fill in match_key for tracks that don't have one yet
+def backfill_match_keys(conn):
+    rows = conn.execute(
+        "SELECT id, title, artist FROM tracks WHERE match_key IS NULL"
+    ).fetchall()
+    conn.executemany(
+        "UPDATE tracks SET match_key = ? WHERE id = ?",
+        [(normalize_track_key(row["title"], row["artist"]), row["id"]) for row in rows]
+    )
+
+# Similarity between two candidate duplicates, 0..1
+def duplicate_score(a, b):
+    """Version tags and numbers must match exactly ('Part 1' vs 'Part 2',
+    'Edit' vs 'Dub'); only the rest of the key is compared fuzzily."""
+    title_a, version_a, _ = split_title(a["title"])
+    title_b, version_b, _ = split_title(b["title"])
+    if version_a != version_b or re.findall(r"\d+", a["match_key"]) != re.findall(r"\d+", b["match_key"]):
+        return 0.0
+
+    text_a = re.sub(r"\d+", "", a["match_key"].partition("|")[0] + "|" + fold_text(title_a))
+    text_b = re.sub(r"\d+", "", b["match_key"].partition("|")[0] + "|" + fold_text(title_b))
+    score = SequenceMatcher(None, text_a, text_b).ratio()
+
+    # Different tempo or length is strong evidence of a different recording
+    if a["bpm"] and b["bpm"] and abs(a["bpm"] - b["bpm"]) > 1:
+        score -= 0.2
+    if a["duration_seconds"] and b["duration_seconds"] and abs(a["duration_seconds"] - b["duration_seconds"]) > 5:
+        score -= 0.1
+    return max(score, 0.0)
+
+# Group likely duplicate tracks
+def find_duplicate_groups(conn, threshold=0.9, fuzzy=True) -> list[DuplicateGroup]:
+    """Find candidate duplicate groups.
+
+    Tracks sharing a match_key always group together. Beyond that (unless
+    fuzzy is False), tracks are only compared within a block (same artist
+    part and title prefix) so the fuzzy pass stays far below all-pairs.
+    """
+    rows = conn.execute(
+        "SELECT id, title, artist, bpm, key, duration_seconds, genre, match_key FROM tracks ORDER BY id"
+    ).fetchall()
+
+    # Union-find over track ids
+    parent = {row["id"]: row["id"] for row in rows}
+    scores = {}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(a, b, score):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+        root = find(a)
+        scores[root] = min(scores.get(ra, 1.0), scores.get(rb, 1.0), score)
+
+    blocks = {}
+    for row in rows:
+        artist_part, _, title_part = row["match_key"].partition("|")
+        blocks.setdefault((artist_part, title_part[:4]), []).append(row)
+
+    for block in blocks.values():
+        for i, a in enumerate(block):
+            for b in block[i + 1:]:
+                if a["match_key"] == b["match_key"]:
+                    union(a["id"], b["id"], 1.0)
+                elif fuzzy:
+                    score = duplicate_score(a, b)
+                    if score >= threshold:
+                        union(a["id"], b["id"], score)
+
+    groups = {}
+    for row in rows:
+        groups.setdefault(find(row["id"]), []).append(dict(row))
+
+    return [
+        {"keep_id": root, "score": round(scores.get(root, 1.0), 3), "tracks": members}
+        for root, members in groups.items()
+        if len(members) > 1
+    ]
+
+# Fold duplicate tracks into one, re-pointing everything that references them
+def merge_tracks(conn, keep_id, merge_ids):
+    """Merge merge_ids into keep_id. Caller owns the transaction.
+
+    When both tracks had a transition to the same neighbour, the better rated
+    one survives. Transitions that would become self-loops are dropped.
+    Raises ValueError if keep_id isn't a track; merge_ids that aren't are
+    skipped. Returns how many tracks were merged away.
+    """
+    if conn.execute("SELECT 1 FROM tracks WHERE id = ?", (keep_id,)).fetchone() is None:
+        raise ValueError(f"Track {keep_id} not found")
+    merge_ids = [
+        m for m in dict.fromkeys(merge_ids)
+        if m != keep_id and conn.execute("SELECT 1 FROM tracks WHERE id = ?", (m,)).fetchone()
+    ]
+    for dup_id in merge_ids:
+        # Outgoing, then incoming transitions
+        for own_col, other_col in (("from_track_id", "to_track_id"), ("to_track_id", "from_track_id")):
+            rows = conn.execute(
+                f"SELECT id, {other_col} as other_id, rating FROM transitions WHERE {own_col} = ?",
+                (dup_id,)
+            ).fetchall()
+            for row in rows:
+                if row["other_id"] in (keep_id, dup_id):
+                    conn.execute("DELETE FROM transitions WHERE id = ?", (row["id"],))
+                    continue
+                existing = conn.execute(
+                    f"SELECT id, rating FROM transitions WHERE {own_col} = ? AND {other_col} = ?",
+                    (keep_id, row["other_id"])
+                ).fetchone()
+                if existing is None:
+                    conn.execute(
+                        f"UPDATE transitions SET {own_col} = ? WHERE id = ?",
+                        (keep_id, row["id"])
+                    )
+                elif (row["rating"] or 0) > (existing["rating"] or 0):
+                    conn.execute("DELETE FROM transitions WHERE id = ?", (existing["id"],))
+                    conn.execute(
+                        f"UPDATE transitions SET {own_col} = ? WHERE id = ?",
+                        (keep_id, row["id"])
+                    )
+                else:
+                    conn.execute("DELETE FROM transitions WHERE id = ?", (row["id"],))
+
+        # Folder memberships are unique per folder; drop the ones keep_id already has
+        conn.execute(
+            "UPDATE OR IGNORE folder_tracks SET track_id = ? WHERE track_id = ?",
+            (keep_id, dup_id)
+        )
+        conn.execute("DELETE FROM folder_tracks WHERE track_id = ?", (dup_id,))
+
+        # Playlists may repeat a track, so every entry moves over
+        conn.execute(
+            "UPDATE playlist_tracks SET track_id = ? WHERE track_id = ?",
+            (keep_id, dup_id)
+        )
+
+        # Session history keeps the plays under the surviving track
+        conn.execute(
+            "UPDATE session_plays SET track_id = ? WHERE track_id = ?",
+            (keep_id, dup_id)
+        )
+
+        # Play stats of both tracks add up; the raw log follows the survivor
+        conn.execute(f"""
+            INSERT INTO transition_stats (
+                from_track_id, to_track_id, play_count, skip_count, abort_count,
+                last_played_at, live_rating_sum, live_rating_count
+            )
+            SELECT
+                CASE from_track_id WHEN :dup THEN :keep ELSE from_track_id END,
+                CASE to_track_id WHEN :dup THEN :keep ELSE to_track_id END,
+                play_count, skip_count, abort_count,
+                last_played_at, live_rating_sum, live_rating_count
+            FROM transition_stats
+            WHERE (from_track_id = :dup AND to_track_id != :keep)
+               OR (to_track_id = :dup AND from_track_id != :keep)
+            {TRANSITION_STATS_UPSERT}
+        """, {"dup": dup_id, "keep": keep_id})
+        conn.execute(
+            "DELETE FROM transition_stats WHERE from_track_id = ? OR to_track_id = ?",
+            (dup_id, dup_id)
+        )
+        conn.execute("UPDATE transition_events SET from_track_id = ? WHERE from_track_id = ?", (keep_id, dup_id))
+        conn.execute("UPDATE transition_events SET to_track_id = ? WHERE to_track_id = ?", (keep_id, dup_id))
+        conn.execute("DELETE FROM transition_events WHERE from_track_id = ? AND to_track_id = ?", (keep_id, keep_id))
+
+        conn.execute("DELETE FROM track_stats WHERE track_id = ?", (dup_id,))
+        conn.execute(
+            "DELETE FROM track_suggestions WHERE track_id = ? OR suggested_track_id = ?",
+            (dup_id, dup_id)
+        )
+        conn.execute("DELETE FROM tracks WHERE id = ?", (dup_id,))
+    return len(merge_ids)
+
+# Merge tracks that share both title and artist exactly
+def merge_exact_duplicates(conn):
+    groups = conn.execute("""
+        SELECT MIN(id) as keep_id, GROUP_CONCAT(id) as ids
+        FROM tracks
+        GROUP BY title, artist
+        HAVING COUNT(*) > 1
+    """).fetchall()
+    for group in groups:
+        merge_ids = [int(i) for i in group["ids"].split(",")]
+        merge_tracks(conn, group["keep_id"], merge_ids)
+
+# Validate merge groups from user input; raises ValueError
+def check_merge_groups(groups):
+    """Each group needs an int keep_id and a non-empty list of int merge_ids,
+    and no track may be kept in one group and merged away in another."""
+    if not isinstance(groups, list):
+        raise ValueError("groups must be a list")
+    for group in groups:
+        if not isinstance(group, dict):
+            raise ValueError("Each group must be an object with keep_id and merge_ids")
+        merge_ids = group.get("merge_ids")
+        valid_merge_ids = isinstance(merge_ids, list) and merge_ids and all(map(is_track_id, merge_ids))
+        if not is_track_id(group.get("keep_id")) or not valid_merge_ids:
+            raise ValueError("keep_id must be a track id and merge_ids a non-empty list of track ids")
+
+    merged_away = {m for group in groups for m in group["merge_ids"] if m != group["keep_id"]}
+    for group in groups:
+        if group["keep_id"] in merged_away:
+            raise ValueError(f"Track {group['keep_id']} is kept in one group and merged in another")
+
+def is_track_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+# Merge several {"keep_id", "merge_ids"} groups; returns how many tracks went
+def merge_groups(conn, groups: list[dict]) -> int:
+    """Caller owns the transaction and rolls back on ValueError."""
+    check_merge_groups(groups)
+    return sum(merge_tracks(conn, group["keep_id"], group["merge_ids"]) for group in groups)
@@ -0,0 +1,212 @@
+"""Folder tree for organizing the track library.
+
+Folders nest via parent_id; folder_closure holds one row per (ancestor,
+descendant) pair so subtree queries are a single indexed join.
+"""
+from typing import Iterable, Optional, TypedDict
+
+from mixgraph.db import placeholders
+
+
+class Folder(TypedDict):
+    id: int
+    name: str
+    parent_id: Optional[int]
+    created_at: str
+    track_count: int
+    total_duration: int
+
+
+class FolderTrack(TypedDict):
+    id: int
+    title: str
+    artist: str
+    bpm: Optional[float]
+    key: Optional[str]
+    duration_seconds: Optional[int]
+    genre: Optional[str]
+    position: int
+
+
+# ============================================================================
+# CLOSURE TABLE
+# ============================================================================
+
+# Rebuild the closure table from folders.parent_id
+def rebuild_folder_closure(conn):
+    """Recompute folder_closure from scratch with a recursive CTE."""
+    conn.execute("DELETE FROM folder_closure")
+    conn.execute("""
+        WITH RECURSIVE tree(ancestor_id, descendant_id, depth) AS (
+            SELECT id, id, 0 FROM folders
+            UNION ALL
+            SELECT tree.ancestor_id, f.id, tree.depth + 1
+            FROM tree
+            JOIN folders f ON f.parent_id = tree.descendant_id
+        )
+        INSERT OR IGNORE INTO folder_closure (ancestor_id, descendant_id, depth)
+        SELECT ancestor_id, descendant_id, depth FROM tree
+    """)
+
+# Add closure rows for a newly created folder
+def insert_folder_closure(conn, folder_id, parent_id):
+    """Link a new folder to itself and to every ancestor of its parent."""
+    conn.execute(
+        "INSERT INTO folder_closure (ancestor_id, descendant_id, depth) VALUES (?, ?, 0)",
+        (folder_id, folder_id)
+    )
+    if parent_id is not None:
+        conn.execute("""
+            INSERT INTO folder_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, ?, depth + 1
+            FROM folder_closure
+            WHERE descendant_id = ?
+        """, (folder_id, parent_id))
+
+# Re-parent a folder and its whole subtree in the closure table
+def move_folder_closure(conn, folder_id, new_parent_id):
+    """Detach the subtree rooted at folder_id and graft it under new_parent_id."""
+    # Drop paths from the old ancestors into the subtree
+    conn.execute("""
+        DELETE FROM folder_closure
+        WHERE descendant_id IN (
+            SELECT descendant_id FROM folder_closure WHERE ancestor_id = ?
+        )
+        AND ancestor_id NOT IN (
+            SELECT descendant_id FROM folder_closure WHERE ancestor_id = ?
+        )
+    """, (folder_id, folder_id))
+
+    # Connect every new ancestor to every subtree member
+    if new_parent_id is not None:
+        conn.execute("""
+            INSERT INTO folder_closure (ancestor_id, descendant_id, depth)
+            SELECT super.ancestor_id, sub.descendant_id, super.depth + sub.depth + 1
+            FROM folder_closure super
+            CROSS JOIN folder_closure sub
+            WHERE super.descendant_id = ? AND sub.ancestor_id = ?
+        """, (new_parent_id, folder_id))
+
+# Ids of a folder and all folders beneath it
+def get_subtree_folder_ids(conn, folder_id) -> list[int]:
+    rows = conn.execute(
+        "SELECT descendant_id FROM folder_closure WHERE ancestor_id = ?",
+        (folder_id,)
+    ).fetchall()
+    return [row[0] for row in rows]
+
+# SQL selecting the track ids in a folder, or in its whole subtree when recursive
+def folder_track_ids_sql(recursive):
+    if recursive:
+        return """
+            SELECT ft.track_id
+            FROM folder_closure fc
+            JOIN folder_tracks ft ON ft.folder_id = fc.descendant_id
+            WHERE fc.ancestor_id = ?
+        """
+    return "SELECT track_id FROM folder_tracks WHERE folder_id = ?"
+
+
+# ============================================================================
+# FOLDERS
+# ============================================================================
+
+# All folders with their track counts and total duration
+def list_folders(conn) -> list[Folder]:
+    rows = conn.execute("SELECT * FROM folders ORDER BY name").fetchall()
+    return [dict(row) for row in rows]
+
+# Validate a parent folder id from user input; raises ValueError
+def check_parent_id(conn, parent_id) -> int:
+    try:
+        parent_id = int(parent_id)
+    except (TypeError, ValueError):
+        raise ValueError("parent_id must be a folder id")
+    if conn.execute("SELECT 1 FROM folders WHERE id = ?", (parent_id,)).fetchone() is None:
+        raise ValueError("Parent folder not found")
+    return parent_id
+
+def create_folder(conn, name, parent_id=None) -> int:
+    """Raises ValueError for an unknown parent."""
+    if parent_id is not None:
+        parent_id = check_parent_id(conn, parent_id)
+    cursor = conn.execute(
+        "INSERT INTO folders (name, parent_id) VALUES (?, ?)",
+        (name, parent_id)
+    )
+    folder_id = cursor.lastrowid
+    insert_folder_closure(conn, folder_id, parent_id)
+    return folder_id
+
+def rename_folder(conn, folder_id, name):
+    conn.execute("UPDATE folders SET name = ? WHERE id = ?", (name, folder_id))
+
+# Move a folder (and its subtree) under another folder, or to the top with None
+def move_folder(conn, folder_id, new_parent_id):
+    """Raises ValueError for an unknown parent or one inside the subtree."""
+    if new_parent_id is not None:
+        new_parent_id = check_parent_id(conn, new_parent_id)
+        # A folder can't be moved into itself or one of its own descendants
+        if new_parent_id in get_subtree_folder_ids(conn, folder_id):
+            raise ValueError("Cannot move a folder into its own subtree")
+    conn.execute(
+        "UPDATE folders SET parent_id = ? WHERE id = ?",
+        (new_parent_id, folder_id)
+    )
+    move_folder_closure(conn, folder_id, new_parent_id)
+
+# Delete a folder, its subfolders and their track memberships
+def delete_folder(conn, folder_id):
+    subtree_ids = get_subtree_folder_ids(conn, folder_id) or [folder_id]
+    marks = placeholders(len(subtree_ids))
+    conn.execute(f"DELETE FROM folder_tracks WHERE folder_id IN ({marks})", subtree_ids)
+    conn.execute(f"DELETE FROM folder_closure WHERE descendant_id IN ({marks})", subtree_ids)
+    conn.execute(f"DELETE FROM folders WHERE id IN ({marks})", subtree_ids)
+
+# Tracks in a folder, or in its whole subtree when recursive
+def folder_tracks(conn, folder_id, recursive=False) -> list[FolderTrack]:
+    if recursive:
+        # A track may sit in several subfolders - list it once
+        rows = conn.execute("""
+            SELECT t.id, t.title, t.artist, t.bpm, t.key, t.duration_seconds, t.genre,
+                MIN(ft.position) as position
+            FROM folder_closure fc
+            JOIN folder_tracks ft ON ft.folder_id = fc.descendant_id
+            JOIN tracks t ON t.id = ft.track_id
+            WHERE fc.ancestor_id = ?
+            GROUP BY t.id
+            ORDER BY position, t.title
+        """, (folder_id,)).fetchall()
+    else:
+        rows = conn.execute("""
+            SELECT t.id, t.title, t.artist, t.bpm, t.key, t.duration_seconds, t.genre, ft.position
+            FROM tracks t
+            JOIN folder_tracks ft ON t.id = ft.track_id
+            WHERE ft.folder_id = ?
+            ORDER BY ft.position, t.title
+        """, (folder_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+# Append tracks to a folder; returns how many were not already in it
+def add_tracks_to_folder(conn, folder_id, track_ids: Iterable[int]) -> int:
+    position = conn.execute(
+        "SELECT COALESCE(MAX(position), 0) FROM folder_tracks WHERE folder_id = ?",
+        (folder_id,)
+    ).fetchone()[0]
+
+    added = 0
+    for track_id in track_ids:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO folder_tracks (folder_id, track_id, position) VALUES (?, ?, ?)",
+            (folder_id, track_id, position + 1)
+        )
+        if cursor.rowcount:
+            position += 1
+            added += 1
+    return added
+
+def remove_tracks_from_folder(conn, folder_id, track_ids: Iterable[int]):
+    conn.executemany(
+        "DELETE FROM folder_tracks WHERE folder_id = ? AND track_id = ?",
+        [(folder_id, track_id) for track_id in track_ids]
+    )
@@ -0,0 +1,229 @@
+"""Graph views over tracks and transitions, and matrix export.
+
+Node and edge queries return sqlite3.Row lists (column order matters to the
+columnar encoders); transition_matrix returns the whole graph as CSR arrays.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from mixgraph.counters import TRACK_STATS_COLUMNS
+from mixgraph.db import SQL_BATCH_SIZE
+from mixgraph.folders import folder_track_ids_sql
+
+NEIGHBORHOOD_MAX_DEPTH = 5
+NEIGHBORHOOD_MAX_NODES = 5000
+
+EDGE_COLUMNS = "t.id, t.from_track_id, t.to_track_id, t.rating, t.transition_type"
+
+
+# ============================================================================
+# NODES AND EDGES
+# ============================================================================
+
+# Every track and transition
+def library_graph(conn):
+    tracks = conn.execute(f"""
+        SELECT t.id, t.title, t.artist, t.bpm, t.key, {TRACK_STATS_COLUMNS}
+        FROM tracks t
+        LEFT JOIN track_stats ts ON ts.track_id = t.id
+        ORDER BY t.id
+    """).fetchall()
+    transitions = conn.execute(f"""
+        SELECT {EDGE_COLUMNS}
+        FROM transitions t
+        ORDER BY t.id
+    """).fetchall()
+    return tracks, transitions
+
+# A folder's tracks (or its subtree's) and the transitions between them
+def folder_graph(conn, folder_id, recursive=False):
+    if recursive:
+        tracks = conn.execute(f"""
+            SELECT t.id, t.title, t.artist, t.bpm, t.key, {TRACK_STATS_COLUMNS}
+            FROM folder_closure fc
+            JOIN folder_tracks ft ON ft.folder_id = fc.descendant_id
+            JOIN tracks t ON t.id = ft.track_id
+            LEFT JOIN track_stats ts ON ts.track_id = t.id
+            WHERE fc.ancestor_id = ?
+            GROUP BY t.id
+            ORDER BY MIN(ft.position), t.title
+        """, (folder_id,)).fetchall()
+    else:
+        tracks = conn.execute(f"""
+            SELECT t.id, t.title, t.artist, t.bpm, t.key, {TRACK_STATS_COLUMNS}
+            FROM tracks t
+            JOIN folder_tracks ft ON t.id = ft.track_id
+            LEFT JOIN track_stats ts ON ts.track_id = t.id
+            WHERE ft.folder_id = ?
+            ORDER BY ft.position, t.title
+        """, (folder_id,)).fetchall()
+
+    track_ids_sql = folder_track_ids_sql(recursive)
+    transitions = conn.execute(f"""
+        SELECT {EDGE_COLUMNS}
+        FROM transitions t
+        WHERE t.from_track_id IN ({track_ids_sql})
+          AND t.to_track_id IN ({track_ids_sql})
+        ORDER BY t.id
+    """, (folder_id, folder_id)).fetchall()
+    return tracks, transitions
+
+# A playlist's tracks and the transitions between them
+def playlist_graph(conn, playlist_id):
+    tracks = conn.execute(f"""
+        SELECT t.id, t.title, t.artist, t.bpm, t.key, {TRACK_STATS_COLUMNS}
+        FROM tracks t
+        JOIN playlist_tracks pt ON t.id = pt.track_id
+        LEFT JOIN track_stats ts ON ts.track_id = t.id
+        WHERE pt.playlist_id = ?
+        ORDER BY pt.position, t.title
+    """, (playlist_id,)).fetchall()
+    transitions = conn.execute(f"""
+        SELECT {EDGE_COLUMNS}
+        FROM transitions t
+        WHERE t.from_track_id IN (SELECT track_id FROM playlist_tracks WHERE playlist_id = ?)
+          AND t.to_track_id IN (SELECT track_id FROM playlist_tracks WHERE playlist_id = ?)
+        ORDER BY t.id
+    """, (playlist_id, playlist_id)).fetchall()
+    return tracks, transitions
+
+
+# ============================================================================
+# NEIGHBORHOODS
+# ============================================================================
+
+# Track ids reached by a bounded BFS from start_id
+def neighborhood_track_ids(conn, start_id, depth=1, direction="out", min_rating=None, limit=200):
+    """Return (ids in BFS order, whether the limit cut the search short)."""
+    rating_sql = " AND rating >= ?" if min_rating is not None else ""
+    rating_args = [min_rating] if min_rating is not None else []
+
+    # (column matched against the frontier, column giving the neighbour)
+    steps = []
+    if direction in ("out", "both"):
+        steps.append(("from_track_id", "to_track_id"))
+    if direction in ("in", "both"):
+        steps.append(("to_track_id", "from_track_id"))
+
+    visited = {start_id}
+    order = [start_id]
+    frontier = [start_id]
+
+    for _ in range(depth):
+        next_frontier = []
+        for start in range(0, len(frontier), SQL_BATCH_SIZE):
+            batch = frontier[start:start + SQL_BATCH_SIZE]
+            placeholders = ", ".join("?" * len(batch))
+            for match_col, other_col in steps:
+                rows = conn.execute(f"""
+                    SELECT {other_col} FROM transitions
+                    WHERE {match_col} IN ({placeholders}){rating_sql}
+                    ORDER BY rating DESC
+                """, batch + rating_args)
+                for (neighbour_id,) in rows:
+                    if neighbour_id in visited:
+                        continue
+                    if len(order) >= limit:
+                        return order, True
+                    visited.add(neighbour_id)
+                    order.append(neighbour_id)
+                    next_frontier.append(neighbour_id)
+        if not next_frontier:
+            break
+        frontier = next_frontier
+
+    return order, False
+
+# Node and edge rows for the subgraph induced by track_ids
+def subgraph_rows(conn, track_ids, min_rating=None):
+    id_set = set(track_ids)
+    rating_sql = " AND t.rating >= ?" if min_rating is not None else ""
+    rating_args = [min_rating] if min_rating is not None else []
+
+    tracks, transitions = [], []
+    for start in range(0, len(track_ids), SQL_BATCH_SIZE):
+        batch = track_ids[start:start + SQL_BATCH_SIZE]
+        placeholders = ", ".join("?" * len(batch))
+        tracks += conn.execute(f"""
+            SELECT t.id, t.title, t.artist, t.bpm, t.key, {TRACK_STATS_COLUMNS}
+            FROM tracks t
+            LEFT JOIN track_stats ts ON ts.track_id = t.id
+            WHERE t.id IN ({placeholders})
+        """, batch).fetchall()
+        rows = conn.execute(f"""
+            SELECT t.id, t.from_track_id, t.to_track_id, t.rating, t.transition_type
+            FROM transitions t
+            WHERE t.from_track_id IN ({placeholders}){rating_sql}
+        """, batch + rating_args).fetchall()
+        transitions += [row for row in rows if row["to_track_id"] in id_set]
+
+    # Keep BFS order for nodes so the start track comes first
+    position = {track_id: i for i, track_id in enumerate(track_ids)}
+    tracks.sort(key=lambda row: position[row["id"]])
+    transitions.sort(key=lambda row: row["id"])
+    return tracks, transitions
+
+
+# ============================================================================
+# MATRIX EXPORT
+# ============================================================================
+
+class TransitionMatrix(NamedTuple):
+    """Square CSR matrix over track_ids: row i holds transitions out of track_ids[i].
+
+    indices are column positions into track_ids (not track ids). Pass the
+    arrays to scipy.sparse.csr_matrix((data, indices, indptr)) if needed.
+    """
+    track_ids: np.ndarray   # int64, sorted
+    indptr: np.ndarray      # int64, len(track_ids) + 1
+    indices: np.ndarray     # int32
+    data: np.ndarray        # float32 weights
+
+    @property
+    def shape(self):
+        return (len(self.track_ids), len(self.track_ids))
+
+    # Dense copy; only sensible for small libraries
+    def toarray(self):
+        dense = np.zeros(self.shape, dtype=self.data.dtype)
+        rows = np.repeat(np.arange(len(self.track_ids)), np.diff(self.indptr))
+        dense[rows, self.indices] = self.data
+        return dense
+
+# The whole transition graph as CSR arrays
+def transition_matrix(conn, weight="rating", min_rating=None, unrated=0.0) -> TransitionMatrix:
+    """weight="rating" stores ratings (unrated transitions get `unrated`);
+    weight=None stores 1.0 for every transition. min_rating drops edges
+    rated below it (unrated ones too).
+    """
+    if weight not in ("rating", None):
+        raise ValueError(f"Unknown weight '{weight}'")
+
+    track_ids = np.array(
+        [row[0] for row in conn.execute("SELECT id FROM tracks ORDER BY id")], dtype=np.int64
+    )
+
+    sql = "SELECT from_track_id, to_track_id, COALESCE(rating, ?) FROM transitions"
+    params = [unrated]
+    if min_rating is not None:
+        sql += " WHERE rating >= ?"
+        params.append(min_rating)
+    edges = np.array(conn.execute(sql, params).fetchall(), dtype=np.float64).reshape(-1, 3)
+
+    src, dst = edges[:, 0].astype(np.int64), edges[:, 1].astype(np.int64)
+    data = edges[:, 2].astype(np.float32) if weight == "rating" else np.ones(len(edges), dtype=np.float32)
+
+    # Map ids to row/column positions; drop edges to tracks that no longer exist
+    rows = np.searchsorted(track_ids, src)
+    cols = np.searchsorted(track_ids, dst)
+    valid = (rows < len(track_ids)) & (cols < len(track_ids))
+    valid[valid] &= (track_ids[rows[valid]] == src[valid]) & (track_ids[cols[valid]] == dst[valid])
+    rows, cols, data = rows[valid], cols[valid], data[valid]
+
+    order = np.lexsort((cols, rows))
+    rows, cols, data = rows[order], cols[order], data[order]
+    indptr = np.zeros(len(track_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(track_ids)), out=indptr[1:])
+
+    return TransitionMatrix(track_ids, indptr, cols.astype(np.int32), data)
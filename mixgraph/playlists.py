@@ -0,0 +1,85 @@
+"""Playlists for DJ sets: ordered, and unlike folders a track may repeat."""
+from typing import Iterable, Optional, TypedDict
+
+
+class Playlist(TypedDict):
+    id: int
+    name: str
+    created_at: str
+    track_count: int
+    total_duration: int
+
+
+class PlaylistTrack(TypedDict):
+    id: int
+    title: str
+    artist: str
+    bpm: Optional[float]
+    key: Optional[str]
+    duration_seconds: Optional[int]
+    genre: Optional[str]
+    position: int
+
+
+# All playlists with their track counts and total duration
+def list_playlists(conn) -> list[Playlist]:
+    rows = conn.execute("SELECT * FROM playlists ORDER BY name").fetchall()
+    return [dict(row) for row in rows]
+
+def get_playlist(conn, playlist_id) -> Optional[Playlist]:
+    row = conn.execute("SELECT * FROM playlists WHERE id = ?", (playlist_id,)).fetchone()
+    return dict(row) if row else None
+
+def create_playlist(conn, name) -> int:
+    return conn.execute("INSERT INTO playlists (name) VALUES (?)", (name,)).lastrowid
+
+def rename_playlist(conn, playlist_id, name):
+    conn.execute("UPDATE playlists SET name = ? WHERE id = ?", (name, playlist_id))
+
+def delete_playlist(conn, playlist_id):
+    conn.execute("DELETE FROM playlist_tracks WHERE playlist_id = ?", (playlist_id,))
+    conn.execute("DELETE FROM playlists WHERE id = ?", (playlist_id,))
+
+def playlist_tracks(conn, playlist_id) -> list[PlaylistTrack]:
+    rows = conn.execute("""
+        SELECT t.id, t.title, t.artist, t.bpm, t.key, t.duration_seconds, t.genre, pt.position
+        FROM tracks t
+        JOIN playlist_tracks pt ON t.id = pt.track_id
+        WHERE pt.playlist_id = ?
+        ORDER BY pt.position, pt.id
+    """, (playlist_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+# Append tracks to the end of a playlist, in order
+def add_tracks_to_playlist(conn, playlist_id, track_ids: Iterable[int]):
+    position = conn.execute(
+        "SELECT COALESCE(MAX(position), 0) FROM playlist_tracks WHERE playlist_id = ?",
+        (playlist_id,)
+    ).fetchone()[0]
+    conn.executemany(
+        "INSERT INTO playlist_tracks (playlist_id, track_id, position) VALUES (?, ?, ?)",
+        [(playlist_id, track_id, position + i) for i, track_id in enumerate(track_ids, 1)]
+    )
+
+def remove_playlist_position(conn, playlist_id, position):
+    conn.execute(
+        "DELETE FROM playlist_tracks WHERE playlist_id = ? AND position = ?",
+        (playlist_id, position)
+    )
+
+# Swap the tracks at two positions; returns False if either is empty
+def swap_playlist_positions(conn, playlist_id, position1, position2) -> bool:
+    rows = [
+        conn.execute(
+            "SELECT id FROM playlist_tracks WHERE playlist_id = ? AND position = ?",
+            (playlist_id, position)
+        ).fetchone()
+        for position in (position1, position2)
+    ]
+    if None in rows:
+        return False
+    conn.executemany(
+        "UPDATE playlist_tracks SET position = ? WHERE id = ?",
+        [(position2, rows[0]["id"]), (position1, rows[1]["id"])]
+    )
+    return True
@@ -0,0 +1,159 @@
+"""Transition play log and its incremental per-transition statistics.
+
+Every played, skipped or aborted transition is appended to transition_events.
+Its counts are folded into transition_stats in the same transaction, so
+stats reads are a primary key lookup and never scan the log.
+"""
+from datetime import datetime, timezone
+from typing import Iterable, Optional, TypedDict
+
+from mixgraph.db import datetime_now
+
+EVENT_COUNTERS = {"played": "play_count", "skipped": "skip_count", "aborted": "abort_count"}
+
+# Folds a batch of stats deltas into transition_stats (VALUES or SELECT source)
+TRANSITION_STATS_UPSERT = """
+    ON CONFLICT (from_track_id, to_track_id) DO UPDATE SET
+        play_count = play_count + excluded.play_count,
+        skip_count = skip_count + excluded.skip_count,
+        abort_count = abort_count + excluded.abort_count,
+        last_played_at = COALESCE(MAX(last_played_at, excluded.last_played_at), last_played_at, excluded.last_played_at),
+        live_rating_sum = live_rating_sum + excluded.live_rating_sum,
+        live_rating_count = live_rating_count + excluded.live_rating_count
+"""
+
+
+class TransitionStats(TypedDict):
+    from_track_id: int
+    to_track_id: int
+    play_count: int
+    skip_count: int
+    abort_count: int
+    skip_rate: Optional[float]
+    last_played_at: Optional[str]
+    rating: Optional[int]
+    live_rating: Optional[float]
+    live_rating_count: int
+    rating_drift: Optional[float]
+
+
+def empty_stats():
+    return {
+        "play_count": 0, "skip_count": 0, "abort_count": 0, "last_played_at": None,
+        "live_rating_sum": 0, "live_rating_count": 0,
+    }
+
+# Add one event to an in-memory stats delta
+def apply_event(stats, outcome, rating, occurred_at):
+    stats[EVENT_COUNTERS[outcome]] += 1
+    if outcome == "played" and (stats["last_played_at"] is None or occurred_at > stats["last_played_at"]):
+        stats["last_played_at"] = occurred_at
+    if rating is not None:
+        stats["live_rating_sum"] += rating
+        stats["live_rating_count"] += 1
+
+# Combine two stats deltas into the first
+def merge_stats(stats, delta):
+    for name in ("play_count", "skip_count", "abort_count", "live_rating_sum", "live_rating_count"):
+        stats[name] += delta[name]
+    if delta["last_played_at"] and (stats["last_played_at"] is None or delta["last_played_at"] > stats["last_played_at"]):
+        stats["last_played_at"] = delta["last_played_at"]
+
+# Validate one event dict into a log tuple; raises ValueError
+def parse_event(event):
+    """Return (from_track_id, to_track_id, outcome, booth, rating, occurred_at)."""
+    try:
+        from_id, to_id = int(event["from_track_id"]), int(event["to_track_id"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("from_track_id and to_track_id are required")
+    if from_id == to_id:
+        raise ValueError("A transition needs two different tracks")
+
+    outcome = event.get("outcome", "played")
+    if outcome not in EVENT_COUNTERS:
+        raise ValueError(f"outcome must be one of {', '.join(EVENT_COUNTERS)}")
+
+    rating = event.get("rating")
+    if rating is not None and (not isinstance(rating, int) or not 1 <= rating <= 5):
+        raise ValueError("rating must be an integer from 1 to 5")
+
+    # Booths may send late; store their timestamp in CURRENT_TIMESTAMP format
+    occurred_at = datetime_now()
+    if event.get("occurred_at"):
+        try:
+            at = datetime.fromisoformat(str(event["occurred_at"]).replace("Z", "+00:00"))
+        except ValueError:
+            raise ValueError("occurred_at must be an ISO 8601 timestamp")
+        if at.tzinfo is not None:
+            at = at.astimezone(timezone.utc)
+        occurred_at = at.strftime("%Y-%m-%d %H:%M:%S")
+
+    return (from_id, to_id, outcome, event.get("booth"), rating, occurred_at)
+
+# Per-pair stats deltas for a batch of parsed events
+def summarize_events(events: Iterable[tuple]):
+    deltas = {}
+    for from_id, to_id, outcome, _, rating, occurred_at in events:
+        apply_event(deltas.setdefault((from_id, to_id), empty_stats()), outcome, rating, occurred_at)
+    return deltas
+
+# Append parsed events to the log and fold them into transition_stats
+def write_events(conn, events: list[tuple], deltas=None):
+    """Caller commits. Pass deltas if they were already summarized."""
+    if deltas is None:
+        deltas = summarize_events(events)
+    conn.executemany("""
+        INSERT INTO transition_events (from_track_id, to_track_id, outcome, booth, rating, occurred_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, events)
+    conn.executemany(f"""
+        INSERT INTO transition_stats (
+            from_track_id, to_track_id, play_count, skip_count, abort_count,
+            last_played_at, live_rating_sum, live_rating_count
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        {TRANSITION_STATS_UPSERT}
+    """, [
+        (from_id, to_id, d["play_count"], d["skip_count"], d["abort_count"],
+         d["last_played_at"], d["live_rating_sum"], d["live_rating_count"])
+        for (from_id, to_id), d in deltas.items()
+    ])
+
+# Stored aggregates for one (from, to) pair
+def read_stats(conn, from_id, to_id):
+    row = conn.execute("""
+        SELECT play_count, skip_count, abort_count, last_played_at, live_rating_sum, live_rating_count
+        FROM transition_stats
+        WHERE from_track_id = ? AND to_track_id = ?
+    """, (from_id, to_id)).fetchone()
+    return dict(row) if row else empty_stats()
+
+# Derived figures for a pair, from read_stats (plus any unflushed delta)
+def describe_stats(conn, from_id, to_id, stats) -> TransitionStats:
+    rating = conn.execute(
+        "SELECT rating FROM transitions WHERE from_track_id = ? AND to_track_id = ?",
+        (from_id, to_id)
+    ).fetchone()
+    rating = rating["rating"] if rating else None
+
+    events = stats["play_count"] + stats["skip_count"] + stats["abort_count"]
+    live_rating = (
+        round(stats["live_rating_sum"] / stats["live_rating_count"], 2)
+        if stats["live_rating_count"] else None
+    )
+    return {
+        "from_track_id": from_id,
+        "to_track_id": to_id,
+        "play_count": stats["play_count"],
+        "skip_count": stats["skip_count"],
+        "abort_count": stats["abort_count"],
+        "skip_rate": round(stats["skip_count"] / events, 3) if events else None,
+        "last_played_at": stats["last_played_at"],
+        "rating": rating,
+        "live_rating": live_rating,
+        "live_rating_count": stats["live_rating_count"],
+        # How far crowd ratings have moved from the hand-entered one
+        "rating_drift": round(live_rating - rating, 2) if live_rating is not None and rating is not None else None,
+    }
+
+def transition_stats(conn, from_id, to_id) -> TransitionStats:
+    return describe_stats(conn, from_id, to_id, read_stats(conn, from_id, to_id))
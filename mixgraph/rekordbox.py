@@ -0,0 +1,88 @@
+"""Rekordbox playlist exports (File > Export > .txt)."""
+from pathlib import Path
+from typing import Optional
+
+# Rekordbox writes UTF-16; hand-edited files tend to be UTF-8 or Windows-1252
+TXT_ENCODINGS = ["utf-16-le", "utf-16", "utf-8", "cp1252"]
+
+
+# Decode an exported file; None if no known encoding fits
+def decode_txt(raw_bytes: bytes) -> Optional[str]:
+    for encoding in TXT_ENCODINGS:
+        try:
+            content = raw_bytes.decode(encoding)
+        except (UnicodeDecodeError, UnicodeError):
+            continue
+        # Remove BOM if present
+        if content.startswith("\ufeff"):
+            content = content[1:]
+        return content
+    return None
+
+# Parse Rekordbox .txt content
+def parse_txt(content: str) -> list[dict]:
+    """Parse Rekordbox .txt content (tab-delimited format)."""
+    lines = content.split("\n")
+
+    if not lines:
+        return []
+
+    # First line is headers
+    headers = [h.strip() for h in lines[0].split("\t")]
+
+    tracks = []
+    for line in lines[1:]:
+        if not line.strip():
+            continue
+
+        fields = line.split("\t")
+        row = {}
+
+        for i, header in enumerate(headers):
+            value = fields[i].strip() if i < len(fields) else ""
+            row[header] = value
+
+        # Map common Rekordbox column names to our schema
+        # Swedish and English
+        # TODO handle more fields as needed
+        track = {
+            "title": row.get("Spårtitel") or row.get("Track Title") or row.get("Title") or row.get("Name") or "",
+            "artist": row.get("Artist") or "",
+            "bpm": None,
+            "key": row.get("Tonalitet") or row.get("Key") or None,
+            "duration_seconds": None,
+            "genre": row.get("Genre") or None,
+            "location": row.get("Location") or None
+        }
+
+        # Parse BPM
+        bpm_str = row.get("BPM") or row.get("Tempo") or ""
+        if bpm_str:
+            try:
+                track["bpm"] = float(bpm_str.replace(",", "."))
+            except ValueError:
+                pass
+
+        # Parse duration (format: MM:SS or HH:MM:SS)
+        time_str = row.get("Tid") or row.get("Time") or row.get("Duration") or ""
+        if time_str:
+            try:
+                parts = time_str.split(":")
+                if len(parts) == 2:
+                    track["duration_seconds"] = int(parts[0]) * 60 + int(parts[1])
+                elif len(parts) == 3:
+                    track["duration_seconds"] = int(parts[0]) * 3600 + int(parts[1]) * 60 + int(parts[2])
+            except (ValueError, IndexError):
+                pass
+
+        if track["title"]:  # Only add if we have at least a title
+            tracks.append(track)
+
+    return tracks
+
+# Tracks from an export file on disk
+def read_txt(path) -> list[dict]:
+    content = decode_txt(Path(path).read_bytes())
+    if content is None:
+        raise ValueError(f"Could not decode {path}")
+    return parse_txt(content)
@@ -0,0 +1,218 @@
+"""Library schema: tables, indexes, triggers and in-place migrations."""
+import sqlite3
+
+from mixgraph import suggestions
+from mixgraph.counters import create_counter_triggers, rebuild_counters
+from mixgraph.duplicates import backfill_match_keys, merge_exact_duplicates
+from mixgraph.folders import rebuild_folder_closure
+
+
+# Create or migrate every library table; safe to run on each open
+def init_db(conn):
+    """Caller commits."""
+    # WAL lets readers (including online backups) run alongside writers
+    conn.execute("PRAGMA journal_mode = WAL")
+
+    # Track library (also created by the Rekordbox import script)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tracks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            artist TEXT NOT NULL,
+            bpm REAL,
+            key TEXT,
+            duration_seconds INTEGER,
+            genre TEXT,
+            location TEXT
+        )
+    """)
+
+    # Directed, rated transitions between tracks
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS transitions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_track_id INTEGER NOT NULL,
+            to_track_id INTEGER NOT NULL,
+            rating INTEGER,
+            transition_type TEXT,
+            notes TEXT DEFAULT '',
+            FOREIGN KEY (from_track_id) REFERENCES tracks(id) ON DELETE CASCADE,
+            FOREIGN KEY (to_track_id) REFERENCES tracks(id) ON DELETE CASCADE,
+            UNIQUE(from_track_id, to_track_id)
+        )
+    """)
+    try:
+        conn.execute("ALTER TABLE transitions ADD COLUMN notes TEXT DEFAULT ''")
+    except sqlite3.OperationalError:
+        pass  # Column already exists
+
+    # UNIQUE(from_track_id, to_track_id) already indexes outgoing lookups
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transitions_to ON transitions (to_track_id)")
+
+    # Folders for organizing track library
+    # Folders can contain multiple tracks, and tracks can be in multiple folders.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS folders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            parent_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (parent_id) REFERENCES folders(id) ON DELETE CASCADE
+        )
+    """)
+
+    # Track-folder relationship (many-to-many) - for library organization
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS folder_tracks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            folder_id INTEGER NOT NULL,
+            track_id INTEGER NOT NULL,
+            position INTEGER DEFAULT 0,
+            FOREIGN KEY (folder_id) REFERENCES folders(id) ON DELETE CASCADE,
+            FOREIGN KEY (track_id) REFERENCES tracks(id) ON DELETE CASCADE,
+            UNIQUE(folder_id, track_id)
+        )
+    """)
+
+    # Playlists for DJ sets (separate from folders)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS playlists (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Playlist-track relationship (many-to-many) - for DJ set building
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS playlist_tracks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            playlist_id INTEGER NOT NULL,
+            track_id INTEGER NOT NULL,
+            position INTEGER DEFAULT 0,
+            FOREIGN KEY (playlist_id) REFERENCES playlists(id) ON DELETE CASCADE,
+            FOREIGN KEY (track_id) REFERENCES tracks(id) ON DELETE CASCADE
+        )
+    """)
+
+    # Folder closure table - one row per (ancestor, descendant) pair, including
+    # each folder paired with itself at depth 0. Lets subtree queries be a
+    # single indexed join instead of walking parent_id per folder.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS folder_closure (
+            ancestor_id INTEGER NOT NULL,
+            descendant_id INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            PRIMARY KEY (ancestor_id, descendant_id),
+            FOREIGN KEY (ancestor_id) REFERENCES folders(id) ON DELETE CASCADE,
+            FOREIGN KEY (descendant_id) REFERENCES folders(id) ON DELETE CASCADE
+        )
+    """)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_folder_closure_descendant ON folder_closure (descendant_id)"
+    )
+
+    # Backfill closure rows for databases created before the table existed
+    closure_missing = conn.execute("""
+        SELECT COUNT(*) FROM folders f
+        WHERE NOT EXISTS (
+            SELECT 1 FROM folder_closure fc
+            WHERE fc.ancestor_id = f.id AND fc.descendant_id = f.id
+        )
+    """).fetchone()[0]
+    if closure_missing:
+        rebuild_folder_closure(conn)
+
+    # Denormalized counters, kept current by the triggers below
+    counters_added = False
+    for table in ("folders", "playlists"):
+        for column in ("track_count", "total_duration"):
+            try:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+                counters_added = True
+            except sqlite3.OperationalError:
+                pass  # Column already exists
+
+    # Per-track degree and outgoing rating totals. Kept out of the tracks table
+    # so reindex_tracks can rebuild tracks without losing them.
+    has_track_stats = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'track_stats'"
+    ).fetchone()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS track_stats (
+            track_id INTEGER PRIMARY KEY,
+            out_degree INTEGER NOT NULL DEFAULT 0,
+            in_degree INTEGER NOT NULL DEFAULT 0,
+            rating_sum INTEGER NOT NULL DEFAULT 0,
+            rated_count INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    create_counter_triggers(conn)
+    if counters_added or not has_track_stats:
+        rebuild_counters(conn)
+
+    # Rating predictor state and precomputed top-k next tracks
+    suggestions.create_tables(conn)
+
+    # Raw transition play log (append-only, never read back) and the
+    # per-transition aggregates kept up to date as events are flushed
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS transition_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_track_id INTEGER NOT NULL,
+            to_track_id INTEGER NOT NULL,
+            outcome TEXT NOT NULL CHECK (outcome IN ('played', 'skipped', 'aborted')),
+            booth TEXT,
+            rating INTEGER,
+            occurred_at TIMESTAMP NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS transition_stats (
+            from_track_id INTEGER NOT NULL,
+            to_track_id INTEGER NOT NULL,
+            play_count INTEGER NOT NULL DEFAULT 0,
+            skip_count INTEGER NOT NULL DEFAULT 0,
+            abort_count INTEGER NOT NULL DEFAULT 0,
+            last_played_at TIMESTAMP,
+            live_rating_sum INTEGER NOT NULL DEFAULT 0,
+            live_rating_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (from_track_id, to_track_id)
+        ) WITHOUT ROWID
+    """)
+
+    # DJ sessions and their append-only play log
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS dj_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS session_plays (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            track_id INTEGER NOT NULL,
+            played_at TIMESTAMP NOT NULL,
+            FOREIGN KEY (session_id) REFERENCES dj_sessions(id) ON DELETE CASCADE,
+            UNIQUE(session_id, position)
+        )
+    """)
+
+    # Normalized title/artist key used to spot duplicate tracks
+    try:
+        conn.execute("ALTER TABLE tracks ADD COLUMN match_key TEXT")
+        match_key_added = True
+    except sqlite3.OperationalError:
+        match_key_added = False  # Column already exists
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tracks_match_key ON tracks (match_key)")
+    backfill_match_keys(conn)
+
+    # Reads used to hide exact title/artist duplicates with GROUP BY; fold
+    # them into one track the first time the match_key column appears (after
+    # every table merge_tracks touches exists)
+    if match_key_added:
+        merge_exact_duplicates(conn)
@@ -0,0 +1,116 @@
+"""DJ sessions: an append-only log of the tracks played during a set.
+
+Positions are numbered from 1 per session. The API buffers plays and writes
+them behind with write_plays; everything else here reads the log.
+"""
+from typing import Iterable, Optional, TypedDict
+
+from mixgraph import playlists
+
+
+class Session(TypedDict):
+    id: int
+    name: Optional[str]
+    started_at: str
+
+
+class SessionPlay(TypedDict):
+    position: int
+    played_at: str
+    id: int
+    title: str
+    artist: str
+    bpm: Optional[float]
+    key: Optional[str]
+
+
+class NextTrack(TypedDict):
+    to_track_id: int
+    to_title: str
+    to_artist: str
+    to_bpm: Optional[float]
+    to_key: Optional[str]
+    rating: Optional[float]
+    transition_type: Optional[str]
+
+
+def create_session(conn, name=None) -> int:
+    return conn.execute("INSERT INTO dj_sessions (name) VALUES (?)", (name,)).lastrowid
+
+def get_session(conn, session_id) -> Optional[Session]:
+    row = conn.execute("SELECT * FROM dj_sessions WHERE id = ?", (session_id,)).fetchone()
+    return dict(row) if row else None
+
+# Append (session_id, position, track_id, played_at) rows
+def write_plays(conn, plays: list[tuple]):
+    conn.executemany(
+        "INSERT INTO session_plays (session_id, position, track_id, played_at) VALUES (?, ?, ?, ?)",
+        plays
+    )
+
+# Highest stored position, 0 for an empty session
+def last_position(conn, session_id) -> int:
+    return conn.execute(
+        "SELECT COALESCE(MAX(position), 0) FROM session_plays WHERE session_id = ?",
+        (session_id,)
+    ).fetchone()[0]
+
+def played_track_ids(conn, session_id) -> set[int]:
+    return {row[0] for row in conn.execute(
+        "SELECT track_id FROM session_plays WHERE session_id = ?", (session_id,)
+    )}
+
+# Every play in order, with the track it played
+def session_history(conn, session_id) -> list[SessionPlay]:
+    rows = conn.execute("""
+        SELECT sp.position, sp.played_at, t.id, t.title, t.artist, t.bpm, t.key
+        FROM session_plays sp
+        JOIN tracks t ON t.id = sp.track_id
+        WHERE sp.session_id = ?
+        ORDER BY sp.position
+    """, (session_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+# Next-track candidates: hand-rated transitions first, then predicted ones
+def next_tracks(conn, track_id, exclude: Iterable[int] = (), limit=5) -> list[NextTrack]:
+    candidates = conn.execute("""
+        SELECT t.to_track_id, t2.title as to_title, t2.artist as to_artist,
+            t2.bpm as to_bpm, t2.key as to_key, t.rating, t.transition_type
+        FROM transitions t
+        JOIN tracks t2 ON t.to_track_id = t2.id
+        WHERE t.from_track_id = ?
+        ORDER BY t.rating DESC
+    """, (track_id,)).fetchall()
+    candidates += conn.execute("""
+        SELECT s.suggested_track_id as to_track_id, t2.title as to_title, t2.artist as to_artist,
+            t2.bpm as to_bpm, t2.key as to_key, s.score as rating, NULL as transition_type
+        FROM track_suggestions s
+        JOIN tracks t2 ON s.suggested_track_id = t2.id
+        WHERE s.track_id = ?
+        ORDER BY s.rank
+    """, (track_id,)).fetchall()
+
+    seen = set(exclude)
+    result = []
+    for row in candidates:
+        if row["to_track_id"] not in seen and len(result) < limit:
+            result.append(dict(row))
+            seen.add(row["to_track_id"])
+    return result
+
+# Copy a session's history into a new playlist; returns its id
+def session_to_playlist(conn, session_id, name=None) -> Optional[int]:
+    """None if the session doesn't exist. Caller commits."""
+    session = get_session(conn, session_id)
+    if session is None:
+        return None
+
+    name = name or session["name"] or f"Set {session['started_at']}"
+    playlist_id = playlists.create_playlist(conn, name)
+    conn.execute("""
+        INSERT INTO playlist_tracks (playlist_id, track_id, position)
+        SELECT ?, track_id, ROW_NUMBER() OVER (ORDER BY position)
+        FROM session_plays
+        WHERE session_id = ?
+    """, (playlist_id, session_id))
+    return playlist_id
@@ -0,0 +1,342 @@
+"""Transition rating predictor and precomputed next-track suggestions.
+
+Learns from hand-rated transitions to predict ratings for unrated
+(from, to) pairs, then stores the top-k suggestions per track in the
+track_suggestions table so the API only has to do an indexed lookup.
+
+Usage:
+    python -m mixgraph --db mixgraph.db suggestions --k 10
+"""
+import io
+import re
+from typing import Optional, TypedDict
+
+import numpy as np
+
+from mixgraph.db import batched
+
+DEFAULT_K = 10
+
+# Source tracks whose suggestions a full rebuild writes per transaction
+SUGGESTION_WRITE_BATCH = 200
+
+# Feature order: bpm distance, key compatibility, same genre
+FEATURE_COUNT = 3
+
+CAMELOT_RE = re.compile(r"^\s*(\d{1,2})\s*([AB])\s*$", re.IGNORECASE)
+
+
+class Suggestion(TypedDict):
+    to_track_id: int
+    to_title: str
+    to_artist: str
+    to_bpm: Optional[float]
+    to_key: Optional[str]
+    predicted_rating: float
+
+
+# ============================================================================
+# FEATURES
+# ============================================================================
+
+# Split a Camelot key like "8A" into (8, 0); None if not Camelot notation
+def parse_camelot(key):
+    match = CAMELOT_RE.match(key or "")
+    if not match or not 1 <= int(match.group(1)) <= 12:
+        return None
+    return int(match.group(1)), 0 if match.group(2).upper() == "A" else 1
+
+# Load tracks as column arrays, in id order
+def load_track_arrays(conn):
+    rows = conn.execute("SELECT id, bpm, key, genre FROM tracks ORDER BY id").fetchall()
+
+    genres = {}
+    ids, bpm, key_num, key_mode, genre = [], [], [], [], []
+    for row in rows:
+        ids.append(row[0])
+        bpm.append(row[1] if row[1] else np.nan)
+        camelot = parse_camelot(row[2])
+        key_num.append(camelot[0] if camelot else 0)
+        key_mode.append(camelot[1] if camelot else -1)
+        genre.append(genres.setdefault(row[3], len(genres)) if row[3] else -1)
+
+    return {
+        "ids": np.array(ids, dtype=np.int64),
+        "bpm": np.array(bpm, dtype=np.float64),
+        "key_num": np.array(key_num, dtype=np.int64),
+        "key_mode": np.array(key_mode, dtype=np.int64),
+        "genre": np.array(genre, dtype=np.int64),
+    }
+
+# Content features for (src, dst) index pairs; either side may be a scalar
+def pair_features(tracks, src, dst):
+    """Return an (n, FEATURE_COUNT) array of pair features."""
+    # Tempo gap in units of 10 BPM, unknown tempo counts as a moderate gap
+    bpm_gap = np.abs(tracks["bpm"][src] - tracks["bpm"][dst]) / 10.0
+    bpm_gap = np.clip(np.nan_to_num(bpm_gap, nan=1.0), 0.0, 3.0)
+
+    # Harmonic mixing: same key, adjacent number, or relative major/minor
+    num_a, num_b = tracks["key_num"][src], tracks["key_num"][dst]
+    mode_a, mode_b = tracks["key_mode"][src], tracks["key_mode"][dst]
+    step = (num_a - num_b) % 12
+    compatible = ((mode_a == mode_b) & ((step == 0) | (step == 1) | (step == 11))) | (
+        (num_a == num_b) & (mode_a != mode_b)
+    )
+    known = (mode_a >= 0) & (mode_b >= 0)
+    key_compat = np.where(known, compatible.astype(np.float64), 0.5)
+
+    genre_a, genre_b = tracks["genre"][src], tracks["genre"][dst]
+    same_genre = ((genre_a == genre_b) & (genre_a >= 0)).astype(np.float64)
+
+    bpm_gap, key_compat, same_genre = np.broadcast_arrays(bpm_gap, key_compat, same_genre)
+    return np.stack([bpm_gap, key_compat, same_genre], axis=-1)
+
+
+# ============================================================================
+# MODEL
+# ============================================================================
+
+# Predicted ratings for (src, dst) index pairs
+def predict(model, features, src, dst):
+    """Global mean + per-track biases + latent factors + feature weights."""
+    return (
+        model["mu"]
+        + model["b_out"][src]
+        + model["b_in"][dst]
+        + np.sum(model["P"][src] * model["Q"][dst], axis=-1)
+        + features @ model["w"]
+    )
+
+# Load rated transitions as index arrays aligned with tracks
+def load_ratings(conn, tracks, from_track_ids=None):
+    index = {int(track_id): i for i, track_id in enumerate(tracks["ids"])}
+    sql = "SELECT from_track_id, to_track_id, rating FROM transitions WHERE rating IS NOT NULL"
+    params = []
+    if from_track_ids is not None:
+        sql += f" AND from_track_id IN ({', '.join('?' * len(from_track_ids))})"
+        params = list(from_track_ids)
+
+    src, dst, rating = [], [], []
+    for from_id, to_id, value in conn.execute(sql, params):
+        if from_id in index and to_id in index:
+            src.append(index[from_id])
+            dst.append(index[to_id])
+            rating.append(float(value))
+    return np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64), np.array(rating)
+
+# SGD over minibatches; `update` selects which parameter groups move
+def fit(model, tracks, src, dst, rating, epochs, lr, reg, update=("mu", "b_out", "b_in", "P", "Q", "w"), seed=0):
+    rng = np.random.default_rng(seed)
+    features = pair_features(tracks, src, dst)
+    batch_size = 256
+
+    for _ in range(epochs):
+        order = rng.permutation(len(rating))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            s, d, f = src[batch], dst[batch], features[batch]
+            err = rating[batch] - predict(model, f, s, d)
+
+            # Per-track parameters take a step per rating, shared ones per batch
+            p_s, q_d = model["P"][s], model["Q"][d]
+            if "mu" in update:
+                model["mu"] += lr * err.mean()
+            if "b_out" in update:
+                np.add.at(model["b_out"], s, lr * (err - reg * model["b_out"][s]))
+            if "b_in" in update:
+                np.add.at(model["b_in"], d, lr * (err - reg * model["b_in"][d]))
+            if "P" in update:
+                np.add.at(model["P"], s, lr * (err[:, None] * q_d - reg * p_s))
+            if "Q" in update:
+                np.add.at(model["Q"], d, lr * (err[:, None] * p_s - reg * q_d))
+            if "w" in update:
+                model["w"] += lr * (err @ f / len(batch) - reg * model["w"])
+
+# Train a fresh model on every rated transition
+def train(conn, factors=16, epochs=200, lr=0.02, reg=0.05, seed=0):
+    tracks = load_track_arrays(conn)
+    src, dst, rating = load_ratings(conn, tracks)
+    n = len(tracks["ids"])
+    rng = np.random.default_rng(seed)
+
+    model = {
+        "track_ids": tracks["ids"],
+        "mu": float(rating.mean()) if len(rating) else 0.0,
+        "b_out": np.zeros(n),
+        "b_in": np.zeros(n),
+        "P": rng.normal(0, 0.1, (n, factors)),
+        "Q": rng.normal(0, 0.1, (n, factors)),
+        "w": np.zeros(FEATURE_COUNT),
+    }
+    if len(rating):
+        fit(model, tracks, src, dst, rating, epochs, lr, reg, seed=seed)
+    return model, tracks
+
+# Re-map model parameters onto the current track list; new tracks start at zero
+def align_model(model, tracks):
+    old_index = {int(track_id): i for i, track_id in enumerate(model["track_ids"])}
+    n, factors = len(tracks["ids"]), model["P"].shape[1]
+    aligned = {
+        "track_ids": tracks["ids"],
+        "mu": model["mu"],
+        "w": model["w"],
+        "b_out": np.zeros(n),
+        "b_in": np.zeros(n),
+        "P": np.zeros((n, factors)),
+        "Q": np.zeros((n, factors)),
+    }
+    for i, track_id in enumerate(tracks["ids"]):
+        j = old_index.get(int(track_id))
+        if j is not None:
+            for name in ("b_out", "b_in", "P", "Q"):
+                aligned[name][i] = model[name][j]
+    return aligned
+
+
+# ============================================================================
+# STORAGE
+# ============================================================================
+
+# Model parameters and the precomputed suggestion table
+def create_tables(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS suggestion_model (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            trained_at TIMESTAMP,
+            params BLOB NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS track_suggestions (
+            track_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            suggested_track_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (track_id, rank)
+        )
+    """)
+
+# Drop the model and all suggestions (e.g. after track ids were renumbered)
+def clear_suggestions(conn):
+    conn.execute("DELETE FROM suggestion_model")
+    conn.execute("DELETE FROM track_suggestions")
+
+def save_model(conn, model):
+    buffer = io.BytesIO()
+    np.savez(buffer, **{name: np.asarray(value) for name, value in model.items()})
+    conn.execute(
+        "INSERT OR REPLACE INTO suggestion_model (id, trained_at, params) VALUES (1, CURRENT_TIMESTAMP, ?)",
+        (buffer.getvalue(),)
+    )
+
+def load_model(conn):
+    row = conn.execute("SELECT params FROM suggestion_model WHERE id = 1").fetchone()
+    if row is None:
+        return None
+    with np.load(io.BytesIO(row[0])) as data:
+        model = {name: data[name] for name in data.files}
+    model["mu"] = float(model["mu"])
+    return model
+
+# Score every candidate for the given source tracks; track_id -> [(rank, suggested, score)]
+def score_suggestions(conn, model, tracks, source_track_ids, k=DEFAULT_K):
+    """Read-only, so a full rebuild can score outside any write transaction."""
+    index = {int(track_id): i for i, track_id in enumerate(tracks["ids"])}
+    n = len(tracks["ids"])
+    all_dst = np.arange(n)
+
+    suggestions = {}
+    for track_id in source_track_ids:
+        suggestions[track_id] = []
+        src = index.get(track_id)
+        if src is None or n < 2:
+            continue
+
+        scores = predict(model, pair_features(tracks, src, all_dst), src, all_dst)
+
+        # Existing transitions are already known to the DJ
+        scores[src] = -np.inf
+        known = [
+            index[row[0]] for row in conn.execute(
+                "SELECT to_track_id FROM transitions WHERE from_track_id = ?", (track_id,)
+            ) if row[0] in index
+        ]
+        scores[known] = -np.inf
+
+        count = min(k, int(np.isfinite(scores).sum()))
+        if count == 0:
+            continue
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top])]
+        suggestions[track_id] = [
+            (rank, int(tracks["ids"][i]), round(float(scores[i]), 3)) for rank, i in enumerate(top, 1)
+        ]
+    return suggestions
+
+# Replace the stored top-k of the given source tracks
+def store_suggestions(conn, suggestions):
+    conn.executemany(
+        "DELETE FROM track_suggestions WHERE track_id = ?", [(track_id,) for track_id in suggestions]
+    )
+    conn.executemany(
+        "INSERT INTO track_suggestions (track_id, rank, suggested_track_id, score) VALUES (?, ?, ?, ?)",
+        [(track_id, *row) for track_id, rows in suggestions.items() for row in rows]
+    )
+
+# Score and store the best k for the given source tracks
+def write_suggestions(conn, model, tracks, source_track_ids, k=DEFAULT_K):
+    store_suggestions(conn, score_suggestions(conn, model, tracks, source_track_ids, k))
+
+# Full offline rebuild: train, store the model and every track's top-k
+def rebuild_suggestions(conn, k=DEFAULT_K, batch_size=SUGGESTION_WRITE_BATCH, **train_args):
+    """Commits. Training and scoring run outside any transaction; the results
+    are written in one short transaction per batch of source tracks, so
+    other writers are never locked out for long."""
+    model, tracks = train(conn, **train_args)
+    save_model(conn, model)
+    conn.commit()
+    for batch in batched([int(i) for i in tracks["ids"]], batch_size):
+        suggestions = score_suggestions(conn, model, tracks, batch, k)
+        store_suggestions(conn, suggestions)
+        conn.commit()
+    return len(tracks["ids"])
+
+# Incremental refresh after ratings from these tracks changed
+def refresh_suggestions(conn, track_ids, k=DEFAULT_K, epochs=20, lr=0.02, reg=0.05):
+    """Fold the tracks' current ratings into the stored model and rewrite their top-k.
+
+    Only the affected tracks' outgoing parameters move, so this is cheap enough
+    to run inline after a rating edit. Returns False if no model is trained yet.
+    Caller commits.
+    """
+    model = load_model(conn)
+    if model is None:
+        return False
+
+    tracks = load_track_arrays(conn)
+    model = align_model(model, tracks)
+    src, dst, rating = load_ratings(conn, tracks, track_ids)
+    if len(rating):
+        fit(model, tracks, src, dst, rating, epochs, lr, reg, update=("b_out", "P"))
+
+    save_model(conn, model)
+    write_suggestions(conn, model, tracks, track_ids, k)
+    return True
+
+# Stored top suggestions for a track, best first
+def get_suggestions(conn, track_id, limit=DEFAULT_K) -> list[Suggestion]:
+    rows = conn.execute("""
+        SELECT
+            s.suggested_track_id as to_track_id,
+            t2.title as to_title,
+            t2.artist as to_artist,
+            t2.bpm as to_bpm,
+            t2.key as to_key,
+            s.score as predicted_rating
+        FROM track_suggestions s
+        JOIN tracks t2 ON s.suggested_track_id = t2.id
+        WHERE s.track_id = ?
+        ORDER BY s.rank
+        LIMIT ?
+    """, (track_id, limit)).fetchall()
+    return [dict(row) for row in rows]
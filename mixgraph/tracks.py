@@ -0,0 +1,287 @@
+"""Tracks: typed reads, bulk iteration and batched writes."""
+from typing import Callable, Iterable, Iterator, Optional, TypedDict
+
+from mixgraph import suggestions
+from mixgraph.counters import rebuild_counters
+from mixgraph.db import batched, placeholders
+from mixgraph.duplicates import normalize_track_key
+from mixgraph.folders import add_tracks_to_folder
+
+TRACK_COLUMNS = "id, title, artist, bpm, key, duration_seconds, genre, location"
+
+# Fields update_track may change; durations feed folder/playlist counters
+TRACK_EDITABLE_FIELDS = ("title", "artist", "bpm", "key", "genre")
+
+
+class Track(TypedDict):
+    id: int
+    title: str
+    artist: str
+    bpm: Optional[float]
+    key: Optional[str]
+    duration_seconds: Optional[int]
+    genre: Optional[str]
+    location: Optional[str]
+
+
+class StoredTrack(Track):
+    match_key: str
+
+
+# ============================================================================
+# READS
+# ============================================================================
+
+def list_tracks(conn) -> list[Track]:
+    rows = conn.execute(f"SELECT {TRACK_COLUMNS} FROM tracks ORDER BY id").fetchall()
+    return [dict(row) for row in rows]
+
+# Every track in id order, fetched batch_size rows at a time
+def iter_tracks(conn, batch_size=1000) -> Iterator[Track]:
+    """Keyset pagination, so no cursor stays open while the caller writes."""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT {TRACK_COLUMNS} FROM tracks WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield dict(row)
+        last_id = rows[-1]["id"]
+
+def get_track(conn, track_id) -> Optional[StoredTrack]:
+    row = conn.execute("SELECT * FROM tracks WHERE id = ?", (track_id,)).fetchone()
+    return dict(row) if row else None
+
+# Tracks whose title or artist contains query
+def search_tracks(conn, query) -> list[dict]:
+    rows = conn.execute("""
+        SELECT id, title, artist, bpm, key
+        FROM tracks
+        WHERE title LIKE ? OR artist LIKE ?
+        ORDER BY id
+    """, (f"%{query}%", f"%{query}%")).fetchall()
+    return [dict(row) for row in rows]
+
+# Ids of the given tracks that exist
+def existing_track_ids(conn, track_ids: Iterable[int]) -> set[int]:
+    found = set()
+    for batch in batched(set(track_ids)):
+        found.update(
+            row[0] for row in conn.execute(
+                f"SELECT id FROM tracks WHERE id IN ({placeholders(len(batch))})", batch
+            )
+        )
+    return found
+
+
+# ============================================================================
+# WRITES
+# ============================================================================
+
+def insert_track(conn, track) -> int:
+    cursor = conn.execute("""
+        INSERT INTO tracks (title, artist, bpm, key, duration_seconds, genre, location, match_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        track["title"],
+        track["artist"],
+        track.get("bpm"),
+        track.get("key"),
+        track.get("duration_seconds"),
+        track.get("genre"),
+        track.get("location"),
+        normalize_track_key(track["title"], track["artist"])
+    ))
+    return cursor.lastrowid
+
+# Insert tracks; returns their new ids in order
+def add_tracks(conn, tracks: Iterable[dict]) -> list[int]:
+    """Each track needs title and artist; raises ValueError otherwise. Caller commits."""
+    tracks = list(tracks)
+    if any(not track.get("title") or not track.get("artist") for track in tracks):
+        raise ValueError("Title and artist are required")
+    return [insert_track(conn, track) for track in tracks]
+
+# Change the given fields of one track; returns False if it doesn't exist
+def update_track(conn, track_id, fields: dict) -> bool:
+    updates = {name: fields[name] for name in TRACK_EDITABLE_FIELDS if name in fields}
+    if updates:
+        conn.execute(
+            f"UPDATE tracks SET {', '.join(f'{name} = ?' for name in updates)} WHERE id = ?",
+            (*updates.values(), track_id)
+        )
+    row = conn.execute("SELECT title, artist FROM tracks WHERE id = ?", (track_id,)).fetchone()
+    if row is None:
+        return False
+    if "title" in updates or "artist" in updates:
+        conn.execute(
+            "UPDATE tracks SET match_key = ? WHERE id = ?",
+            (normalize_track_key(row["title"], row["artist"]), track_id)
+        )
+    return True
+
+# Apply many {"id": ..., field: value} edits; returns how many tracks existed
+def update_tracks(conn, updates: Iterable[dict]) -> int:
+    """Caller commits."""
+    return sum(update_track(conn, update["id"], update) for update in updates)
+
+# Delete tracks with their transitions and folder/playlist memberships
+def delete_tracks(conn, track_ids: Iterable[int]):
+    """Ids are left with gaps; run reindex_tracks to close them. Caller commits.
+
+    Memberships are deleted explicitly rather than by ON DELETE CASCADE,
+    which needs foreign_keys on, so the counter triggers see every row go.
+    """
+    for batch in batched(track_ids):
+        marks = placeholders(len(batch))
+        conn.execute(
+            f"DELETE FROM transitions WHERE from_track_id IN ({marks}) OR to_track_id IN ({marks})",
+            batch + batch
+        )
+        conn.execute(f"DELETE FROM folder_tracks WHERE track_id IN ({marks})", batch)
+        conn.execute(f"DELETE FROM playlist_tracks WHERE track_id IN ({marks})", batch)
+        conn.execute(f"DELETE FROM tracks WHERE id IN ({marks})", batch)
+
+# Add parsed tracks to a folder, reusing tracks already in the library
+def import_tracks(conn, folder_id, tracks: list[dict], progress: Optional[Callable[[int, int], None]] = None):
+    """Match tracks by match_key, insert the rest and file them all in the folder.
+
+    progress(done, total) is called as tracks are matched; raising from it
+    aborts the import. Caller commits (or rolls back).
+    """
+    if progress:
+        progress(0, len(tracks))
+
+    track_ids = []
+    for i, track in enumerate(tracks, 1):
+        # Check if track already exists (under any trivially different spelling)
+        existing = conn.execute(
+            "SELECT id FROM tracks WHERE match_key = ? ORDER BY id LIMIT 1",
+            (normalize_track_key(track["title"], track["artist"]),)
+        ).fetchone()
+        if existing:
+            track_ids.append(existing["id"])
+        else:
+            track_ids.append(insert_track(conn, track))
+
+        if progress:
+            progress(i, len(tracks))
+
+    return {
+        "imported": add_tracks_to_folder(conn, folder_id, track_ids),
+        "total_in_file": len(tracks)
+    }
+
+# Renumber tracks from 1 with no gaps
+def reindex_tracks(conn):
+    """Rewrite track ids (and everything keyed by them) densely. Commits."""
+    tracks = conn.execute(
+        "SELECT id, title, artist, bpm, key, duration_seconds, genre, location, match_key FROM tracks ORDER BY id"
+    ).fetchall()
+
+    if not tracks:
+        return
+
+    id_mapping = {row["id"]: new_id for new_id, row in enumerate(tracks, 1)}
+
+    conn.execute("PRAGMA foreign_keys = OFF")
+
+    conn.execute("""
+        CREATE TABLE tracks_new (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            artist TEXT NOT NULL,
+            bpm REAL,
+            key TEXT,
+            duration_seconds INTEGER,
+            genre TEXT,
+            location TEXT,
+            match_key TEXT
+        )
+    """)
+
+    for row in tracks:
+        new_id = id_mapping[row["id"]]
+        conn.execute(
+            "INSERT INTO tracks_new VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (new_id, row["title"], row["artist"], row["bpm"], row["key"], 
+             row["duration_seconds"], row["genre"], row["location"], row["match_key"])
+        )
+
+    transitions = conn.execute(
+        "SELECT id, from_track_id, to_track_id, rating, transition_type, notes FROM transitions"
+    ).fetchall()
+
+    conn.execute("DELETE FROM transitions")
+
+    for t in transitions:
+        if t["from_track_id"] in id_mapping and t["to_track_id"] in id_mapping:
+            conn.execute(
+                "INSERT INTO transitions (from_track_id, to_track_id, rating, transition_type, notes) VALUES (?, ?, ?, ?, ?)",
+                (id_mapping[t["from_track_id"]], id_mapping[t["to_track_id"]], t["rating"], t["transition_type"], t["notes"])
+            )
+
+    # Memberships, play logs and stats follow the new ids; rows for deleted tracks are dropped
+    conn.execute("CREATE TEMP TABLE track_id_map (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL)")
+    conn.executemany("INSERT INTO track_id_map VALUES (?, ?)", id_mapping.items())
+    # Rewritten via a copy, since renumbering in place can collide on UNIQUE(folder_id, track_id)
+    for table, owner_col in (("folder_tracks", "folder_id"), ("playlist_tracks", "playlist_id")):
+        conn.execute(f"CREATE TEMP TABLE {table}_old AS SELECT * FROM {table}")
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"""
+            INSERT INTO {table} (id, {owner_col}, track_id, position)
+            SELECT x.id, x.{owner_col}, m.new_id, x.position
+            FROM {table}_old x
+            JOIN track_id_map m ON m.old_id = x.track_id
+        """)
+        conn.execute(f"DROP TABLE temp.{table}_old")
+    conn.execute("DELETE FROM session_plays WHERE track_id NOT IN (SELECT old_id FROM track_id_map)")
+    conn.execute("""
+        UPDATE session_plays SET
+            track_id = (SELECT new_id FROM track_id_map WHERE old_id = track_id)
+    """)
+    conn.execute("""
+        DELETE FROM transition_events
+        WHERE from_track_id NOT IN (SELECT old_id FROM track_id_map)
+           OR to_track_id NOT IN (SELECT old_id FROM track_id_map)
+    """)
+    conn.execute("""
+        UPDATE transition_events SET
+            from_track_id = (SELECT new_id FROM track_id_map WHERE old_id = from_track_id),
+            to_track_id = (SELECT new_id FROM track_id_map WHERE old_id = to_track_id)
+    """)
+    # Also copied, for the same reason
+    conn.execute("CREATE TEMP TABLE transition_stats_old AS SELECT * FROM transition_stats")
+    conn.execute("DELETE FROM transition_stats")
+    conn.execute("""
+        INSERT INTO transition_stats
+        SELECT f.new_id, t.new_id, s.play_count, s.skip_count, s.abort_count,
+               s.last_played_at, s.live_rating_sum, s.live_rating_count
+        FROM transition_stats_old s
+        JOIN track_id_map f ON f.old_id = s.from_track_id
+        JOIN track_id_map t ON t.old_id = s.to_track_id
+    """)
+    conn.execute("DROP TABLE temp.transition_stats_old")
+    conn.execute("DROP TABLE temp.track_id_map")
+
+    # Counter triggers reference tracks by name; legacy rename skips
+    # re-validating them while the table is briefly missing
+    conn.execute("PRAGMA legacy_alter_table = ON")
+    conn.execute("DROP TABLE tracks")
+    conn.execute("ALTER TABLE tracks_new RENAME TO tracks")
+    conn.execute("PRAGMA legacy_alter_table = OFF")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tracks_match_key ON tracks (match_key)")
+    conn.execute("DELETE FROM sqlite_sequence WHERE name='tracks'")
+
+    if len(tracks) > 0:
+        conn.execute(f"INSERT INTO sqlite_sequence (name, seq) VALUES ('tracks', {len(tracks)})")
+
+    conn.execute("PRAGMA foreign_keys = ON")
+    rebuild_counters(conn)
+
+    # Suggestions are keyed by the old ids
+    suggestions.clear_suggestions(conn)
+    conn.commit()
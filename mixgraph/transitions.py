@@ -0,0 +1,191 @@
+"""Directed, rated transitions between tracks."""
+from typing import Iterable, Iterator, Optional, TypedDict
+
+from mixgraph import suggestions
+from mixgraph.db import batched, placeholders
+from mixgraph.folders import folder_track_ids_sql
+
+
+class Transition(TypedDict):
+    id: int
+    from_track_id: int
+    to_track_id: int
+    rating: Optional[int]
+    transition_type: Optional[str]
+    notes: str
+
+
+# Transition with both tracks' display fields
+class TransitionDetail(Transition):
+    from_title: str
+    from_artist: str
+    from_bpm: Optional[float]
+    from_key: Optional[str]
+    to_title: str
+    to_artist: str
+    to_bpm: Optional[float]
+    to_key: Optional[str]
+
+
+TRANSITION_DETAIL_COLUMNS = """
+    t.id,
+    t.from_track_id,
+    t1.title as from_title,
+    t1.artist as from_artist,
+    t1.bpm as from_bpm,
+    t1.key as from_key,
+    t.to_track_id,
+    t2.title as to_title,
+    t2.artist as to_artist,
+    t2.bpm as to_bpm,
+    t2.key as to_key,
+    t.rating,
+    t.transition_type,
+    COALESCE(t.notes, '') as notes
+"""
+
+
+# ============================================================================
+# READS
+# ============================================================================
+
+def list_transitions(conn) -> list[TransitionDetail]:
+    rows = conn.execute(f"""
+        SELECT {TRANSITION_DETAIL_COLUMNS}
+        FROM transitions t
+        JOIN tracks t1 ON t.from_track_id = t1.id
+        JOIN tracks t2 ON t.to_track_id = t2.id
+        ORDER BY t.id
+    """).fetchall()
+    return [dict(row) for row in rows]
+
+# Every transition in id order, fetched batch_size rows at a time
+def iter_transitions(conn, batch_size=5000) -> Iterator[Transition]:
+    last_id = 0
+    while True:
+        rows = conn.execute("""
+            SELECT id, from_track_id, to_track_id, rating, transition_type, COALESCE(notes, '') as notes
+            FROM transitions
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (last_id, batch_size)).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield dict(row)
+        last_id = rows[-1]["id"]
+
+def get_transition(conn, transition_id) -> Optional[Transition]:
+    row = conn.execute("SELECT * FROM transitions WHERE id = ?", (transition_id,)).fetchone()
+    return dict(row) if row else None
+
+# Outgoing transitions of a track, best rated first
+def track_transitions(conn, track_id) -> list[dict]:
+    rows = conn.execute("""
+        SELECT
+            t.id,
+            t.to_track_id,
+            t2.title as to_title,
+            t2.artist as to_artist,
+            t2.bpm as to_bpm,
+            t2.key as to_key,
+            t.rating,
+            t.transition_type,
+            COALESCE(t.notes, '') as notes
+        FROM transitions t
+        JOIN tracks t2 ON t.to_track_id = t2.id
+        WHERE t.from_track_id = ?
+        ORDER BY t.rating DESC
+    """, (track_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+# Transitions where both tracks are in the folder (or its subtree)
+def folder_transitions(conn, folder_id, recursive=False) -> list[TransitionDetail]:
+    track_ids_sql = folder_track_ids_sql(recursive)
+    rows = conn.execute(f"""
+        SELECT {TRANSITION_DETAIL_COLUMNS}
+        FROM transitions t
+        JOIN tracks t1 ON t.from_track_id = t1.id
+        JOIN tracks t2 ON t.to_track_id = t2.id
+        WHERE t.from_track_id IN ({track_ids_sql})
+          AND t.to_track_id IN ({track_ids_sql})
+        ORDER BY t1.title, t.rating DESC
+    """, (folder_id, folder_id)).fetchall()
+    return [dict(row) for row in rows]
+
+
+# ============================================================================
+# WRITES
+# ============================================================================
+
+# Insert transitions; returns their new ids in order
+def add_transitions(conn, transitions: Iterable[dict], refresh=True) -> list[int]:
+    """Raises sqlite3.IntegrityError if a (from, to) pair already exists.
+
+    Suggestions of the affected source tracks are refreshed once for the
+    whole batch. Caller commits.
+    """
+    transition_ids, from_ids = [], set()
+    for transition in transitions:
+        cursor = conn.execute("""
+            INSERT INTO transitions (from_track_id, to_track_id, rating, transition_type, notes)
+            VALUES (?, ?, ?, ?, ?)
+        """, (
+            transition["from_track_id"],
+            transition["to_track_id"],
+            transition["rating"],
+            transition["transition_type"],
+            transition.get("notes", "")
+        ))
+        transition_ids.append(cursor.lastrowid)
+        from_ids.add(transition["from_track_id"])
+    if refresh and from_ids:
+        suggestions.refresh_suggestions(conn, sorted(from_ids))
+    return transition_ids
+
+# Replace a transition's rating, type and notes
+def update_transition(conn, transition_id, rating, transition_type, notes="") -> bool:
+    """Returns False if the transition doesn't exist. Caller commits."""
+    conn.execute("""
+        UPDATE transitions
+        SET rating = ?, transition_type = ?, notes = ?
+        WHERE id = ?
+    """, (rating, transition_type, notes, transition_id))
+    row = conn.execute(
+        "SELECT from_track_id FROM transitions WHERE id = ?", (transition_id,)
+    ).fetchone()
+    if row is None:
+        return False
+    suggestions.refresh_suggestions(conn, [row["from_track_id"]])
+    return True
+
+# Bulk rating edit from (from_track_id, to_track_id, rating) rows
+def set_ratings(conn, ratings: Iterable[tuple]) -> int:
+    """Only existing transitions change; returns how many did. Caller commits."""
+    changed, from_ids = 0, set()
+    for from_id, to_id, rating in ratings:
+        cursor = conn.execute(
+            "UPDATE transitions SET rating = ? WHERE from_track_id = ? AND to_track_id = ?",
+            (rating, from_id, to_id)
+        )
+        if cursor.rowcount:
+            changed += 1
+            from_ids.add(from_id)
+    if from_ids:
+        suggestions.refresh_suggestions(conn, sorted(from_ids))
+    return changed
+
+def delete_transitions(conn, transition_ids: Iterable[int]):
+    """Caller commits."""
+    from_ids = set()
+    for batch in batched(transition_ids):
+        marks = placeholders(len(batch))
+        from_ids.update(
+            row[0] for row in conn.execute(
+                f"SELECT from_track_id FROM transitions WHERE id IN ({marks})", batch
+            )
+        )
+        conn.execute(f"DELETE FROM transitions WHERE id IN ({marks})", batch)
+    if from_ids:
+        suggestions.refresh_suggestions(conn, sorted(from_ids))
@@ -0,0 +1,69 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import mixgraph
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = mixgraph.connect(tmp_path / "library.db")
+    yield conn
+    conn.close()
+
+
+# Insert tracks T0..Tn-1 by artist A; returns their ids
+def add_tracks(conn, count, **fields):
+    ids = mixgraph.tracks.add_tracks(
+        conn, [{"title": f"T{i}", "artist": "A", "bpm": 120 + i, **fields} for i in range(count)]
+    )
+    conn.commit()
+    return ids
+
+# Insert (from, to, rating) transitions
+def add_transitions(conn, edges):
+    ids = mixgraph.transitions.add_transitions(conn, [
+        {"from_track_id": a, "to_track_id": b, "rating": rating, "transition_type": "blend"}
+        for a, b, rating in edges
+    ])
+    conn.commit()
+    return ids
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """The Flask app against libraries in a fresh directory."""
+    monkeypatch.chdir(tmp_path)
+    import api
+
+    def close_libraries():
+        with api.libraries_lock:
+            libraries = list(api.open_libraries.values())
+            api.open_libraries.clear()
+            api.initialized_libraries.clear()
+        for library in libraries:
+            library.close()
+
+    close_libraries()
+    yield api
+    close_libraries()
+
+
+@pytest.fixture
+def client(api):
+    return api.app.test_client()
+
+
+# Poll a job until it leaves queued/running
+def wait_for_job(client, job_id, prefix="/api", timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"{prefix}/jobs/{job_id}").get_json()
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish")
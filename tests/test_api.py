@@ -0,0 +1,229 @@
+import json
+import sqlite3
+import struct
+
+import numpy as np
+
+from conftest import wait_for_job
+
+
+def create_tracks(client, count, prefix="/api"):
+    return [
+        client.post(f"{prefix}/tracks", json={"title": f"T{i}", "artist": "A", "bpm": 120 + i}).get_json()["id"]
+        for i in range(count)
+    ]
+
+def history(client, session_id):
+    return [play["title"] for play in client.get(f"/api/sessions/{session_id}").get_json()["history"]]
+
+
+def test_folder_move_errors_are_400s(client):
+    folder = client.post("/api/folders", json={"name": "a"}).get_json()["id"]
+    response = client.put(f"/api/folders/{folder}", json={"parent_id": 77})
+    assert response.status_code == 400
+    assert client.get("/api/folders").get_json()[0]["parent_id"] is None
+    assert client.post("/api/folders", json={"name": "b", "parent_id": 77}).status_code == 400
+    assert client.post("/api/folders", json={"name": "b", "parent_id": "x"}).status_code == 400
+    assert len(client.get("/api/folders").get_json()) == 1
+
+
+def test_merge_rejects_unknown_keep_id(client):
+    ids = create_tracks(client, 2)
+    response = client.post("/api/tracks/merge", json={"keep_id": 99, "merge_ids": [ids[1]]})
+    assert response.status_code == 400
+    assert len(client.get("/api/tracks").get_json()) == 2
+
+
+def test_session_history_survives_delete_and_reindex(client):
+    ids = create_tracks(client, 6)
+    session = client.post("/api/sessions", json={"name": "s"}).get_json()["id"]
+    for track_id in (ids[0], ids[1], ids[2], ids[5]):
+        client.post(f"/api/sessions/{session}/play", json={"track_id": track_id})
+
+    job = client.delete(f"/api/tracks/{ids[1]}").get_json()
+    assert wait_for_job(client, job["job_id"])["status"] == "succeeded"
+    assert history(client, session) == ["T0", "T2", "T5"]
+
+
+def test_play_requires_a_known_track(client):
+    track_id, = create_tracks(client, 1)
+    session = client.post("/api/sessions", json={"name": "s"}).get_json()["id"]
+    for body in ({}, {"track_id": None}, {"track_id": "x"}, [track_id]):
+        assert client.post(f"/api/sessions/{session}/play", json=body).status_code == 400, body
+    response = client.post(f"/api/sessions/{session}/play", json={"track_id": 99})
+    assert response.status_code == 404
+    assert response.get_json()["track_ids"] == [99]
+    assert client.post(f"/api/sessions/{session}/play", json={"track_id": track_id}).get_json()["position"] == 1
+    assert history(client, session) == ["T0"]
+
+
+def test_failed_play_flush_keeps_the_plays(api, client, monkeypatch):
+    track_id, = create_tracks(client, 1)
+    session = client.post("/api/sessions", json={"name": "s"}).get_json()["id"]
+    positions = [
+        client.post(f"/api/sessions/{session}/play", json={"track_id": track_id}).get_json()["position"]
+        for _ in range(2)
+    ]
+    assert positions == [1, 2]
+
+    library = api.open_library(api.DEFAULT_LIBRARY)
+    connect = library.connect
+
+    class LockedConnection:
+        def __init__(self):
+            self.conn = connect()
+
+        def executemany(self, *args):
+            raise sqlite3.OperationalError("database is locked")
+
+        def rollback(self):
+            self.conn.rollback()
+
+        def close(self):
+            self.conn.close()
+
+    monkeypatch.setattr(library, "connect", LockedConnection)
+    api.flush_write_behind()
+    assert [play[1] for play in library.session_buffer] == [1, 2]
+
+    monkeypatch.setattr(library, "connect", connect)
+    assert history(client, session) == ["T0", "T0"]
+
+
+def test_transition_events_accept_a_list_body(client):
+    a, b = create_tracks(client, 2)
+    response = client.post("/api/transitions/events", json=[
+        {"from_track_id": a, "to_track_id": b, "rating": 4},
+        {"from_track_id": a, "to_track_id": b, "outcome": "skipped"},
+    ])
+    assert response.status_code == 202
+    assert client.post("/api/transitions/events", json=5).status_code == 400
+    assert client.post("/api/transitions/events", json=[{"from_track_id": a, "to_track_id": 99}]).status_code == 404
+
+    # Unflushed events already count
+    stats = client.get(f"/api/transitions/stats?from_track_id={a}&to_track_id={b}").get_json()
+    assert (stats["play_count"], stats["skip_count"], stats["live_rating"]) == (1, 1, 4.0)
+
+
+def test_neighborhood_format_errors(client):
+    a, b = create_tracks(client, 2)
+    client.post("/api/transitions", json={"from_track_id": a, "to_track_id": b, "rating": 3, "transition_type": "blend"})
+    response = client.get(f"/api/tracks/{a}/neighborhood?format=bogus")
+    assert response.status_code == 400
+    response = client.get(f"/api/tracks/{a}/neighborhood")
+    assert response.headers["X-Neighborhood-Truncated"] == "false"
+    assert [node["id"] for node in response.get_json()["nodes"]] == [a, b]
+
+
+def unpack_graph_binary(data):
+    assert data[:4] == b"MXG1"
+    header_length, = struct.unpack("<I", data[4:8])
+    header = json.loads(data[8:8 + header_length])
+    body = data[8 + header_length:]
+    columns = {"nodes": {}, "edges": {}}
+    for column in header["columns"]:
+        dtype = np.dtype(column["dtype"])
+        columns[column["part"]][column["name"]] = np.frombuffer(
+            body, dtype=dtype, count=column["length"], offset=column["offset"]
+        )
+    return header, columns
+
+
+def test_binary_graph_matches_json(client):
+    a, b, c = create_tracks(client, 3)
+    for from_id, to_id, rating, kind in ((a, b, 5, "blend"), (b, c, None, "cut")):
+        client.post("/api/transitions", json={
+            "from_track_id": from_id, "to_track_id": to_id, "rating": rating, "transition_type": kind
+        })
+    plain = client.get("/api/graph").get_json()
+    header, columns = unpack_graph_binary(client.get("/api/graph?format=binary").data)
+
+    assert header["node_count"] == 3 and header["edge_count"] == 2
+    assert columns["nodes"]["id"].tolist() == [node["id"] for node in plain["nodes"]]
+    assert header["strings"]["title"] == [node["title"] for node in plain["nodes"]]
+    assert columns["nodes"]["out_degree"].tolist() == [node["out_degree"] for node in plain["nodes"]]
+    assert columns["edges"]["rating"].tolist() == [edge["rating"] or 0 for edge in plain["edges"]]
+    kinds = [header["dicts"]["transition_type"][code - 1] for code in columns["edges"]["transition_type"]]
+    assert kinds == [edge["transition_type"] for edge in plain["edges"]]
+
+
+def test_libraries_are_isolated(client):
+    assert client.post("/api/libraries", json={"name": "anna"}).status_code == 201
+    assert client.post("/api/libraries", json={"name": "anna"}).status_code == 400
+    create_tracks(client, 2, prefix="/api/libraries/anna")
+    create_tracks(client, 1)
+
+    assert len(client.get("/api/libraries/anna/tracks").get_json()) == 2
+    assert len(client.get("/api/tracks", headers={"X-Mixgraph-Library": "anna"}).get_json()) == 2
+    assert len(client.get("/api/tracks").get_json()) == 1
+    assert client.get("/api/libraries/nobody/tracks").status_code == 404
+
+    # Jobs run against the library they were submitted to
+    job = client.post("/api/libraries/anna/admin/backup").get_json()
+    assert wait_for_job(client, job["job_id"], prefix="/api/libraries/anna")["status"] == "succeeded"
+    assert client.get("/api/jobs").get_json() == []
+
+
+def test_restore_keeps_live_jobs(api, client):
+    create_tracks(client, 1)
+    first = client.post("/api/admin/backup").get_json()["job_id"]
+    wait_for_job(client, first)
+    snapshot = client.get("/api/admin/backups").get_json()[0]["name"]
+    create_tracks(client, 1)
+    second = client.post("/api/admin/backup").get_json()["job_id"]
+    wait_for_job(client, second)
+
+    response = client.post("/api/admin/restore", json={"name": snapshot})
+    assert response.get_json()["success"]
+    assert len(client.get("/api/tracks").get_json()) == 1
+
+    # The snapshot saw its own job as running; the live row wins
+    assert {job["id"]: job["status"] for job in client.get("/api/jobs").get_json()} == {
+        first: "succeeded", second: "succeeded",
+    }
+    assert client.post("/api/admin/backup").get_json()["job_id"] == second + 1
+    assert client.post("/api/admin/restore", json={"name": "missing.db"}).status_code == 404
+
+
+def test_backup_scheduler_starts_with_the_first_library(api, client):
+    client.get("/api/tracks")
+    assert api.backup_scheduler is not None and api.backup_scheduler.is_alive()
+
+
+def test_merge_rejects_malformed_bodies(client):
+    ids = create_tracks(client, 4)
+    for body in (
+        {"keep_id": ids[0], "merge_ids": "23"},
+        {"keep_id": str(ids[0]), "merge_ids": [ids[1]]},
+        {"keep_id": ids[0], "merge_ids": []},
+        {"keep_id": True, "merge_ids": [ids[1]]},
+        {"groups": {"keep_id": ids[0], "merge_ids": [ids[1]]}},
+        [ids[0], ids[1]],
+        "merge",
+    ):
+        assert client.post("/api/tracks/merge", json=body).status_code == 400, body
+    assert len(client.get("/api/tracks").get_json()) == 4
+
+    response = client.post("/api/tracks/merge", json=[{"keep_id": ids[0], "merge_ids": [ids[1], 99, ids[1]]}])
+    assert response.get_json() == {"success": True, "merged": 1}
+
+
+def test_scheduled_backups_leave_closed_libraries_closed(api, client):
+    client.get("/api/tracks")
+    client.post("/api/libraries", json={"name": "anna"})
+    create_tracks(client, 1, prefix="/api/libraries/anna")
+    with api.libraries_lock:
+        anna = api.open_libraries.pop("anna")
+    anna.close()
+
+    api.run_scheduled_backups()
+    assert "anna" not in api.open_libraries
+    assert len(list((api.BACKUP_DIR / "anna").glob("anna-*.db"))) == 1
+    job, = client.get("/api/jobs").get_json()
+    assert wait_for_job(client, job["id"])["status"] == "succeeded"
+
+    # Unchanged since its snapshot, so it isn't copied again
+    api.run_scheduled_backups()
+    assert len(list((api.BACKUP_DIR / "anna").glob("anna-*.db"))) == 1
+    for job in client.get("/api/jobs").get_json():
+        wait_for_job(client, job["id"])
@@ -0,0 +1,54 @@
+import json
+
+import numpy as np
+
+import mixgraph
+from mixgraph.cli import main
+
+from conftest import add_transitions
+
+
+def make_library(path):
+    conn = mixgraph.connect(path)
+    ids = mixgraph.tracks.add_tracks(conn, [
+        {"title": title, "artist": "A"} for title in ("Strobe", "Strobbe", "Song", "Song (Original Mix)")
+    ])
+    conn.commit()
+    return conn, ids
+
+
+def test_dedupe_merges_only_exact_duplicates_by_default(tmp_path, capsys):
+    db = tmp_path / "library.db"
+    conn, ids = make_library(db)
+    conn.close()
+
+    main(["--db", str(db), "dedupe"])
+    listed = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(listed) == 2
+
+    main(["--db", str(db), "dedupe", "--merge"])
+    conn = mixgraph.connect(db)
+    assert [t["id"] for t in mixgraph.tracks.list_tracks(conn)] == ids[:3]
+    conn.close()
+
+    main(["--db", str(db), "dedupe", "--merge", "--fuzzy"])
+    conn = mixgraph.connect(db)
+    assert [t["id"] for t in mixgraph.tracks.list_tracks(conn)] == [ids[0], ids[2]]
+    conn.close()
+
+
+def test_rate_and_matrix(tmp_path):
+    db = tmp_path / "library.db"
+    conn, ids = make_library(db)
+    add_transitions(conn, [(ids[0], ids[1], 1), (ids[1], ids[2], 1)])
+    conn.close()
+
+    ratings = tmp_path / "ratings.csv"
+    ratings.write_text(f"from_track_id,to_track_id,rating\n{ids[0]},{ids[1]},5\n{ids[2]},{ids[0]},4\n")
+    main(["--db", str(db), "rate", str(ratings)])
+    main(["--db", str(db), "matrix", str(tmp_path / "graph.npz")])
+
+    arrays = np.load(tmp_path / "graph.npz")
+    assert arrays["track_ids"].tolist() == ids
+    assert arrays["indptr"].tolist() == [0, 1, 2, 2, 2]
+    assert arrays["data"].tolist() == [5.0, 1.0]
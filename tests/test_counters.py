@@ -0,0 +1,52 @@
+from mixgraph import counters, folders, playlists, tracks, transitions
+
+from conftest import add_tracks, add_transitions
+
+
+def track_stats(conn):
+    return {
+        row["track_id"]: (row["out_degree"], row["in_degree"], row["rating_sum"], row["rated_count"])
+        for row in conn.execute("SELECT * FROM track_stats")
+        if row["out_degree"] or row["in_degree"]
+    }
+
+
+def test_triggers_match_a_full_rebuild(conn):
+    a, b, c = add_tracks(conn, 3)
+    ab, bc, ca = add_transitions(conn, [(a, b, 5), (b, c, None), (c, a, 2)])
+    assert track_stats(conn) == {a: (1, 1, 5, 1), b: (1, 1, 0, 0), c: (1, 1, 2, 1)}
+
+    transitions.update_transition(conn, bc, 4, "cut")
+    transitions.delete_transitions(conn, [ca])
+    conn.execute("UPDATE transitions SET to_track_id = ? WHERE id = ?", (c, ab))
+    expected = {a: (1, 0, 5, 1), b: (1, 0, 4, 1), c: (0, 2, 0, 0)}
+    assert track_stats(conn) == expected
+
+    counters.rebuild_counters(conn)
+    assert track_stats(conn) == expected
+
+
+def owner_counts(conn):
+    return [
+        tuple(row) for table in ("folders", "playlists")
+        for row in conn.execute(f"SELECT id, track_count, total_duration FROM {table} ORDER BY id")
+    ]
+
+
+def test_deleting_a_track_keeps_folder_and_playlist_counters(conn):
+    short, long = tracks.add_tracks(conn, [
+        {"title": "Short", "artist": "A", "duration_seconds": 50},
+        {"title": "Long", "artist": "A", "duration_seconds": 100},
+    ])
+    folder = folders.create_folder(conn, "f")
+    folders.add_tracks_to_folder(conn, folder, [short, long])
+    playlist = playlists.create_playlist(conn, "p")
+    playlists.add_tracks_to_playlist(conn, playlist, [short, long, short])
+
+    tracks.delete_tracks(conn, [short])
+    assert owner_counts(conn) == [(folder, 1, 100), (playlist, 1, 100)]
+    assert [t["id"] for t in folders.folder_tracks(conn, folder)] == [long]
+    assert [t["id"] for t in playlists.playlist_tracks(conn, playlist)] == [long]
+
+    counters.rebuild_counters(conn)
+    assert owner_counts(conn) == [(folder, 1, 100), (playlist, 1, 100)]
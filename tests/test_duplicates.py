@@ -0,0 +1,85 @@
+import pytest
+
+from mixgraph import duplicates, folders, playlists, playlog, tracks, transitions
+
+from conftest import add_tracks, add_transitions
+
+
+def track(title, artist="Artist", bpm=None):
+    return {
+        "title": title, "artist": artist, "bpm": bpm, "duration_seconds": None,
+        "match_key": duplicates.normalize_track_key(title, artist),
+    }
+
+
+def duplicate_score(a, b, bpm_b=None):
+    return duplicates.duplicate_score(track(a, bpm=128), track(b, bpm=bpm_b or 128))
+
+
+def test_match_key_ignores_trivial_differences():
+    key = duplicates.normalize_track_key
+    assert key("Strobe (Original Mix)", "deadmau5") == key("strobe", "Deadmau5")
+    assert key("Song (feat. B)", "A") == key("Song", "B & A")
+    assert key("Song [X Remix]", "A") == key("Song - X Remix", "A")
+    assert key("Song (X Remix)", "A") != key("Song", "A")
+
+
+@pytest.mark.parametrize("a, b", [
+    ("Strobe (Part 1)", "Strobe (Part 2)"),
+    ("Levels (Edit)", "Levels (Dub)"),
+    ("T199", "T1999"),
+])
+def test_different_versions_are_not_fuzzy_duplicates(a, b):
+    assert duplicate_score(a, b) == 0.0
+
+
+def test_typos_are_fuzzy_duplicates():
+    assert duplicate_score("Strobe", "Strobbe") >= 0.9
+    assert duplicate_score("Strobe", "Strobbe", bpm_b=140) < 0.9
+
+
+def test_find_groups_exact_and_fuzzy(conn):
+    ids = tracks.add_tracks(conn, [{"title": t, "artist": "A"} for t in ("Strobe", "Strobbe", "Song", "Song (Original Mix)")])
+
+    groups = duplicates.find_duplicate_groups(conn)
+    assert [(g["keep_id"], [t["id"] for t in g["tracks"]], g["score"] == 1.0) for g in groups] == [
+        (ids[0], ids[:2], False), (ids[2], ids[2:], True),
+    ]
+    exact = duplicates.find_duplicate_groups(conn, fuzzy=False)
+    assert [g["keep_id"] for g in exact] == [ids[2]]
+
+
+def test_merge_repoints_everything(conn):
+    keep, dup, other = add_tracks(conn, 3)
+    add_transitions(conn, [(dup, other, 4), (keep, other, 2), (other, dup, 3), (keep, dup, 5)])
+    folder = folders.create_folder(conn, "f")
+    folders.add_tracks_to_folder(conn, folder, [keep, dup])
+    playlist = playlists.create_playlist(conn, "p")
+    playlists.add_tracks_to_playlist(conn, playlist, [dup, other, dup])
+    session = conn.execute("INSERT INTO dj_sessions (name) VALUES ('s')").lastrowid
+    conn.execute("INSERT INTO session_plays (session_id, position, track_id, played_at) VALUES (?, 1, ?, 'now')", (session, dup))
+    events = [(dup, other, "played", None, None, "2024-01-01 00:00:00"), (keep, other, "skipped", None, None, "2024-01-02 00:00:00")]
+    playlog.write_events(conn, events)
+
+    duplicates.merge_tracks(conn, keep, [dup])
+    conn.commit()
+
+    edges = {(t["from_track_id"], t["to_track_id"]): t["rating"] for t in transitions.list_transitions(conn)}
+    # Better rated duplicate edge wins; the keep->dup edge would be a self-loop
+    assert edges == {(keep, other): 4, (other, keep): 3}
+    assert [t["id"] for t in folders.folder_tracks(conn, folder)] == [keep]
+    assert [t["id"] for t in playlists.playlist_tracks(conn, playlist)] == [keep, other, keep]
+    assert conn.execute("SELECT track_id FROM session_plays").fetchone()[0] == keep
+    stats = playlog.transition_stats(conn, keep, other)
+    assert (stats["play_count"], stats["skip_count"]) == (1, 1)
+    assert conn.execute("SELECT COUNT(*) FROM tracks WHERE id = ?", (dup,)).fetchone()[0] == 0
+
+
+def test_merge_validates_keep_ids(conn):
+    a, b, c = add_tracks(conn, 3)
+    with pytest.raises(ValueError, match="not found"):
+        duplicates.merge_groups(conn, [{"keep_id": 99, "merge_ids": [a]}])
+    with pytest.raises(ValueError, match="merged in another"):
+        duplicates.merge_groups(conn, [{"keep_id": a, "merge_ids": [b]}, {"keep_id": b, "merge_ids": [c]}])
+    conn.rollback()
+    assert conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0] == 3
@@ -0,0 +1,65 @@
+import pytest
+
+from mixgraph import folders
+
+from conftest import add_tracks
+
+
+def closure(conn):
+    return {tuple(row) for row in conn.execute("SELECT ancestor_id, descendant_id, depth FROM folder_closure")}
+
+
+def test_closure_follows_create_move_and_delete(conn):
+    root = folders.create_folder(conn, "root")
+    house = folders.create_folder(conn, "house", root)
+    deep = folders.create_folder(conn, "deep", house)
+    other = folders.create_folder(conn, "other")
+    assert sorted(folders.get_subtree_folder_ids(conn, root)) == [root, house, deep]
+
+    folders.move_folder(conn, house, other)
+    assert sorted(folders.get_subtree_folder_ids(conn, root)) == [root]
+    assert sorted(folders.get_subtree_folder_ids(conn, other)) == [house, deep, other]
+
+    # The incremental closure matches one rebuilt from parent_id
+    incremental = closure(conn)
+    folders.rebuild_folder_closure(conn)
+    assert closure(conn) == incremental
+
+    folders.delete_folder(conn, other)
+    assert [f["id"] for f in folders.list_folders(conn)] == [root]
+    assert closure(conn) == {(root, root, 0)}
+
+
+@pytest.mark.parametrize("parent_id, message", [
+    (77, "Parent folder not found"),
+    ("x", "parent_id must be a folder id"),
+])
+def test_move_folder_rejects_bad_parents(conn, parent_id, message):
+    folder = folders.create_folder(conn, "a")
+    with pytest.raises(ValueError, match=message):
+        folders.move_folder(conn, folder, parent_id)
+    assert folders.list_folders(conn)[0]["parent_id"] is None
+
+
+def test_move_folder_rejects_cycles_given_a_string_id(conn):
+    parent = folders.create_folder(conn, "a")
+    child = folders.create_folder(conn, "b", parent)
+    with pytest.raises(ValueError, match="own subtree"):
+        folders.move_folder(conn, parent, str(child))
+
+
+def test_recursive_folder_tracks_and_counters(conn):
+    parent = folders.create_folder(conn, "a")
+    child = folders.create_folder(conn, "b", parent)
+    t0, t1, t2 = add_tracks(conn, 3, duration_seconds=60)
+    assert folders.add_tracks_to_folder(conn, parent, [t0, t1]) == 2
+    assert folders.add_tracks_to_folder(conn, child, [t1, t2, t2]) == 2
+
+    assert [t["id"] for t in folders.folder_tracks(conn, parent)] == [t0, t1]
+    assert sorted(t["id"] for t in folders.folder_tracks(conn, parent, recursive=True)) == [t0, t1, t2]
+
+    counts = {f["id"]: (f["track_count"], f["total_duration"]) for f in folders.list_folders(conn)}
+    assert counts == {parent: (2, 120), child: (2, 120)}
+    folders.remove_tracks_from_folder(conn, child, [t2])
+    counts = {f["id"]: f["track_count"] for f in folders.list_folders(conn)}
+    assert counts == {parent: 2, child: 1}
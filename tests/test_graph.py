@@ -0,0 +1,46 @@
+import numpy as np
+
+from mixgraph import graph, tracks
+
+from conftest import add_tracks, add_transitions
+
+
+def test_transition_matrix_is_csr(conn):
+    a, b, c = add_tracks(conn, 3)
+    add_transitions(conn, [(c, a, 2), (a, c, 5), (a, b, None)])
+
+    matrix = graph.transition_matrix(conn)
+    assert matrix.track_ids.tolist() == [a, b, c]
+    assert matrix.indptr.tolist() == [0, 2, 2, 3]
+    assert matrix.indices.tolist() == [1, 2, 0]
+    assert matrix.data.tolist() == [0.0, 5.0, 2.0]
+    assert matrix.toarray()[0, 2] == 5.0
+
+    assert graph.transition_matrix(conn, weight=None).data.tolist() == [1.0, 1.0, 1.0]
+    assert graph.transition_matrix(conn, min_rating=3).indptr.tolist() == [0, 1, 1, 1]
+
+
+def test_transition_matrix_skips_missing_tracks(conn):
+    a, b = add_tracks(conn, 2)
+    add_transitions(conn, [(a, b, 4)])
+    conn.execute("DELETE FROM tracks WHERE id = ?", (b,))
+    matrix = graph.transition_matrix(conn)
+    assert matrix.shape == (1, 1)
+    assert len(matrix.data) == 0
+    assert isinstance(matrix.toarray(), np.ndarray)
+
+
+def test_neighborhood_is_bounded(conn):
+    ids = add_tracks(conn, 5)
+    add_transitions(conn, [(ids[i], ids[i + 1], 3) for i in range(4)])
+
+    nodes, truncated = graph.neighborhood_track_ids(conn, ids[0], depth=2)
+    assert sorted(nodes) == ids[:3] and not truncated
+    nodes, truncated = graph.neighborhood_track_ids(conn, ids[2], depth=1, direction="both")
+    assert sorted(nodes) == ids[1:4]
+    nodes, truncated = graph.neighborhood_track_ids(conn, ids[0], depth=5, limit=2)
+    assert len(nodes) == 2 and truncated
+
+    track_rows, edge_rows = graph.subgraph_rows(conn, ids[:3])
+    assert [row["id"] for row in track_rows] == ids[:3]
+    assert len(edge_rows) == 2
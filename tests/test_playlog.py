@@ -0,0 +1,49 @@
+import pytest
+
+from mixgraph import playlog
+
+from conftest import add_tracks, add_transitions
+
+
+@pytest.mark.parametrize("event, message", [
+    ({"from_track_id": 1}, "required"),
+    ({"from_track_id": 1, "to_track_id": 1}, "two different tracks"),
+    ({"from_track_id": 1, "to_track_id": 2, "outcome": "loved"}, "outcome"),
+    ({"from_track_id": 1, "to_track_id": 2, "rating": 6}, "rating"),
+    ({"from_track_id": 1, "to_track_id": 2, "occurred_at": "yesterday"}, "ISO 8601"),
+])
+def test_parse_event_rejects_bad_events(event, message):
+    with pytest.raises(ValueError, match=message):
+        playlog.parse_event(event)
+
+
+def test_parse_event_normalizes_timestamps():
+    event = playlog.parse_event({"from_track_id": "1", "to_track_id": 2, "occurred_at": "2024-05-01T22:00:00+02:00"})
+    assert event == (1, 2, "played", None, None, "2024-05-01 20:00:00")
+
+
+def test_stats_are_folded_incrementally(conn):
+    a, b = add_tracks(conn, 2)
+    add_transitions(conn, [(a, b, 3)])
+    playlog.write_events(conn, [
+        playlog.parse_event({"from_track_id": a, "to_track_id": b, "rating": 5, "occurred_at": "2024-01-02T00:00:00"}),
+        playlog.parse_event({"from_track_id": a, "to_track_id": b, "outcome": "skipped"}),
+    ])
+    playlog.write_events(conn, [
+        playlog.parse_event({"from_track_id": a, "to_track_id": b, "rating": 4, "occurred_at": "2024-01-01T00:00:00"}),
+    ])
+
+    stats = playlog.transition_stats(conn, a, b)
+    assert stats["play_count"] == 2
+    assert stats["skip_count"] == 1
+    assert stats["skip_rate"] == 0.333
+    assert stats["last_played_at"] == "2024-01-02 00:00:00"
+    assert stats["live_rating"] == 4.5
+    assert stats["rating_drift"] == 1.5
+    assert conn.execute("SELECT COUNT(*) FROM transition_events").fetchone()[0] == 3
+
+    # The pending delta a server holds in memory merges the same way
+    stored = playlog.read_stats(conn, a, b)
+    delta = playlog.summarize_events([(a, b, "aborted", None, None, "2024-01-03 00:00:00")])[(a, b)]
+    playlog.merge_stats(stored, delta)
+    assert playlog.describe_stats(conn, a, b, stored)["abort_count"] == 1
@@ -0,0 +1,26 @@
+from mixgraph import playlists, sessions
+
+from conftest import add_tracks, add_transitions
+
+
+def test_session_history_and_playlist(conn):
+    t0, t1, t2 = add_tracks(conn, 3)
+    session = sessions.create_session(conn, "Friday")
+    assert sessions.last_position(conn, session) == 0
+    sessions.write_plays(conn, [(session, 2, t2, "2024-01-01 22:05:00"), (session, 1, t0, "2024-01-01 22:00:00")])
+
+    assert sessions.last_position(conn, session) == 2
+    assert sessions.played_track_ids(conn, session) == {t0, t2}
+    assert [play["title"] for play in sessions.session_history(conn, session)] == ["T0", "T2"]
+
+    playlist = sessions.session_to_playlist(conn, session)
+    assert playlists.get_playlist(conn, playlist)["name"] == "Friday"
+    assert [t["id"] for t in playlists.playlist_tracks(conn, playlist)] == [t0, t2]
+    assert sessions.session_to_playlist(conn, 99) is None
+
+
+def test_next_tracks_skip_excluded(conn):
+    t0, t1, t2, t3 = add_tracks(conn, 4)
+    add_transitions(conn, [(t0, t1, 3), (t0, t2, 5), (t0, t3, 4)])
+    assert [t["to_track_id"] for t in sessions.next_tracks(conn, t0)] == [t2, t3, t1]
+    assert [t["to_track_id"] for t in sessions.next_tracks(conn, t0, exclude={t2}, limit=1)] == [t3]
@@ -0,0 +1,49 @@
+import mixgraph
+
+from mixgraph import suggestions, transitions
+
+from conftest import add_tracks, add_transitions
+
+
+def test_rebuild_and_refresh_suggestions(conn):
+    ids = add_tracks(conn, 6, key="8A")
+    add_transitions(conn, [(ids[0], ids[1], 5), (ids[1], ids[2], 4), (ids[2], ids[3], 1), (ids[3], ids[4], 2)])
+
+    assert suggestions.rebuild_suggestions(conn, k=3, epochs=20) == 6
+    rows = suggestions.get_suggestions(conn, ids[0])
+    assert len(rows) == 3
+    assert ids[0] not in [row["to_track_id"] for row in rows]
+    # Already rated transitions aren't suggested
+    assert ids[1] not in [row["to_track_id"] for row in rows]
+    assert [row["predicted_rating"] for row in rows] == sorted((row["predicted_rating"] for row in rows), reverse=True)
+
+    # Rating a suggestion removes it from the source track's list
+    suggested = rows[0]["to_track_id"]
+    add_transitions(conn, [(ids[0], suggested, 3)])
+    assert suggested not in [row["to_track_id"] for row in suggestions.get_suggestions(conn, ids[0])]
+
+    transitions.delete_transitions(conn, [t["id"] for t in transitions.list_transitions(conn)])
+    assert len(suggestions.get_suggestions(conn, ids[0], limit=10)) == 5
+
+
+def test_rebuild_commits_in_batches(conn, tmp_path, monkeypatch):
+    ids = add_tracks(conn, 5)
+    add_transitions(conn, [(ids[0], ids[1], 5), (ids[1], ids[2], 4)])
+    other = mixgraph.connect(tmp_path / "library.db")
+    other.execute("PRAGMA busy_timeout = 0")
+    store = suggestions.store_suggestions
+
+    # Another writer gets in between batches
+    def store_then_write(conn, rows):
+        store(conn, rows)
+        assert conn.in_transaction
+        conn.commit()
+        mixgraph.tracks.add_tracks(other, [{"title": f"Late {min(rows)}", "artist": "B"}])
+        other.commit()
+
+    monkeypatch.setattr(suggestions, "store_suggestions", store_then_write)
+    assert suggestions.rebuild_suggestions(conn, k=2, batch_size=2, epochs=5) == 5
+    assert not conn.in_transaction
+    assert conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0] == 8
+    assert {row[0] for row in conn.execute("SELECT track_id FROM track_suggestions")} == set(ids)
+    other.close()
@@ -0,0 +1,78 @@
+import pytest
+
+from mixgraph import folders, playlists, playlog, tracks, transitions
+from mixgraph.counters import rebuild_counters
+
+from conftest import add_tracks, add_transitions
+
+
+def test_add_tracks_requires_title_and_artist(conn):
+    with pytest.raises(ValueError):
+        tracks.add_tracks(conn, [{"title": "No artist"}])
+
+
+def test_iter_tracks_pages_through_everything(conn):
+    ids = add_tracks(conn, 7)
+    assert [t["id"] for t in tracks.iter_tracks(conn, batch_size=3)] == ids
+
+
+def test_update_track_recomputes_match_key(conn):
+    track_id, = add_tracks(conn, 1)
+    assert tracks.update_track(conn, track_id, {"title": "New (Original Mix)"})
+    assert tracks.get_track(conn, track_id)["match_key"] == "a|new"
+    assert not tracks.update_track(conn, 99, {"title": "x"})
+
+
+def test_reindex_remaps_everything_keyed_by_track(conn):
+    t0, t1, t2, t3 = add_tracks(conn, 4, duration_seconds=60)
+    add_transitions(conn, [(t0, t2, 5), (t2, t3, 4), (t1, t2, 3)])
+    conn.execute("UPDATE transitions SET notes = 'loop the intro' WHERE from_track_id = ?", (t2,))
+    folder = folders.create_folder(conn, "f")
+    folders.add_tracks_to_folder(conn, folder, [t3, t2, t0])
+    playlist = playlists.create_playlist(conn, "p")
+    playlists.add_tracks_to_playlist(conn, playlist, [t1, t3, t0])
+    session = conn.execute("INSERT INTO dj_sessions (name) VALUES ('s')").lastrowid
+    conn.executemany(
+        "INSERT INTO session_plays (session_id, position, track_id, played_at) VALUES (?, ?, ?, 'now')",
+        [(session, i, track_id) for i, track_id in enumerate((t0, t1, t2, t3), 1)]
+    )
+    playlog.write_events(conn, [(t2, t3, "played", None, 4, "2024-01-01 00:00:00")])
+    tracks.delete_tracks(conn, [t1])
+    conn.commit()
+
+    tracks.reindex_tracks(conn)
+
+    titles = {t["id"]: t["title"] for t in tracks.list_tracks(conn)}
+    assert titles == {1: "T0", 2: "T2", 3: "T3"}
+    edges = {(t["from_title"], t["to_title"]) for t in transitions.list_transitions(conn)}
+    assert edges == {("T0", "T2"), ("T2", "T3")}
+    assert conn.execute("SELECT notes FROM transitions WHERE from_track_id = 2").fetchone()[0] == "loop the intro"
+    assert sorted(t["title"] for t in folders.folder_tracks(conn, folder)) == ["T0", "T2", "T3"]
+    assert [t["title"] for t in playlists.playlist_tracks(conn, playlist)] == ["T3", "T0"]
+
+    # Counters match a full recount
+    counters = "SELECT track_count, total_duration FROM folders UNION ALL SELECT track_count, total_duration FROM playlists"
+    before = [tuple(row) for row in conn.execute(counters)]
+    assert before == [(3, 180), (2, 120)]
+    rebuild_counters(conn)
+    assert [tuple(row) for row in conn.execute(counters)] == before
+    history = conn.execute("""
+        SELECT t.title FROM session_plays sp JOIN tracks t ON t.id = sp.track_id ORDER BY sp.position
+    """).fetchall()
+    assert [row[0] for row in history] == ["T0", "T2", "T3"]
+    assert conn.execute("SELECT COUNT(*) FROM session_plays").fetchone()[0] == 3
+    assert playlog.transition_stats(conn, 2, 3)["play_count"] == 1
+    assert [tuple(row) for row in conn.execute("SELECT from_track_id, to_track_id FROM transition_events")] == [(2, 3)]
+
+
+def test_import_reuses_existing_tracks(conn):
+    existing, = tracks.add_tracks(conn, [{"title": "Song", "artist": "A"}])
+    folder = folders.create_folder(conn, "f")
+    progress = []
+    result = tracks.import_tracks(
+        conn, folder, [{"title": "Song (Original Mix)", "artist": "A"}, {"title": "New", "artist": ""}],
+        lambda done, total: progress.append(done)
+    )
+    assert result == {"imported": 2, "total_in_file": 2}
+    assert progress == [0, 1, 2]
+    assert folders.folder_tracks(conn, folder)[0]["id"] == existing